@@ -0,0 +1,82 @@
+# benchmarks/bench_features.py
+"""
+Compares PartFeatures.feature_frame (vectorized) with the row-by-row
+feature_dict loop on a synthetic catalog.
+
+    python benchmarks/bench_features.py --rows 1000000 --scalar-rows 100000
+
+The scalar loop is timed on `--scalar-rows` rows and extrapolated linearly,
+since running it on a million rows takes minutes.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from src.features import PartFeatures  # noqa: E402
+
+SIZE_FORMATS = [
+    "{a}x{b}x{c}", "{a}x{b}x{c} mm", "{a} x {b} x {c} mm", "{a}x{b}x{c}cm",
+    "{a}x{b}x{c} in", "{a}mm x {b}mm x {c}mm",
+]
+
+
+def make_catalog(rows, seed=0, size_pool=None):
+    """
+    Synthetic catalog. By default nearly every size string is distinct (worst
+    case); `size_pool` draws sizes from that many distinct dimension triples.
+    """
+    rng = np.random.default_rng(seed)
+    dims = rng.integers(1, 300, size=(size_pool or rows, 3))
+    if size_pool:
+        dims = dims[rng.integers(0, size_pool, size=rows)]
+    formats = rng.choice(SIZE_FORMATS, size=rows)
+    sizes = [f.format(a=a, b=b, c=c) for f, (a, b, c) in zip(formats, dims)]
+    return pd.DataFrame({
+        "Material": rng.choice(["aluminum", "Steel", " Brass", "ABS", "Stainless Steel"], size=rows),
+        "Size": sizes,
+        "Operations": rng.choice(["Drilling", "Milling, Drilling", "Turning, , Tapping", "none"], size=rows),
+        "Finish": rng.choice(["Anodized", "Raw", "Painted ", "Polished"], size=rows),
+        "Target Price (CHF)": rng.integers(5, 500, size=rows),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--scalar-rows", type=int, default=100_000)
+    parser.add_argument("--size-pool", type=int, default=None,
+                        help="number of distinct sizes (default: all distinct)")
+    args = parser.parse_args()
+
+    df = make_catalog(args.rows, size_pool=args.size_pool)
+
+    start = time.perf_counter()
+    frame = PartFeatures.feature_frame(df)
+    vectorized_s = time.perf_counter() - start
+
+    sample = df.head(args.scalar_rows)
+    start = time.perf_counter()
+    rows = [PartFeatures.feature_dict(row) for _, row in sample.iterrows()]
+    scalar_s = (time.perf_counter() - start) * len(df) / len(sample)
+
+    expected = pd.DataFrame(rows, index=sample.index)
+    pd.testing.assert_frame_equal(
+        frame.head(len(sample)).astype({"Volume_mm3": float}),
+        expected.astype({"Volume_mm3": float}),
+        check_dtype=False,
+    )
+
+    print(f"rows:               {len(df):,}")
+    print(f"feature_frame:      {vectorized_s:8.2f} s")
+    print(f"feature_dict loop:  {scalar_s:8.2f} s (extrapolated from {len(sample):,} rows)")
+    print(f"speedup:            {scalar_s / vectorized_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
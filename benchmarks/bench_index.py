@@ -0,0 +1,132 @@
+# benchmarks/bench_index.py
+"""
+Compares the Chroma collection with the in-process NumpyIndex on random
+embeddings: build time, peak memory, disk size and query latency.
+
+    python benchmarks/bench_index.py --rows 200000 --dim 1536
+
+Each backend runs in its own subprocess so peak memory (ru_maxrss) is measured
+per backend. Latencies are for single-vector queries (p50/p99) and for one
+batched query of `--batch` vectors.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+BACKENDS = ["chroma", "numpy-float32", "numpy-float16"]
+
+
+def open_index(backend, path):
+    if backend == "chroma":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=path)
+        return client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+    from src.numpy_index import NumpyIndex
+
+    return NumpyIndex(os.path.join(path, "bench"), dtype=backend.split("-")[1])
+
+
+def dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def run_backend(backend, rows, dim, queries, batch, upsert_batch):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+    query_vectors = rng.normal(size=(queries, dim)).astype(np.float32)
+    ids = [f"part-{i}" for i in range(rows)]
+    metadatas = [{"Material_Norm": m} for m in rng.choice(["steel", "aluminum", "brass"], size=rows)]
+    path = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        index = open_index(backend, path)
+        for i in range(0, rows, upsert_batch):
+            index.upsert(
+                ids=ids[i:i + upsert_batch],
+                embeddings=vectors[i:i + upsert_batch],
+                documents=ids[i:i + upsert_batch],
+                metadatas=metadatas[i:i + upsert_batch]
+            )
+        build_seconds = time.perf_counter() - start
+
+        del index
+        start = time.perf_counter()
+        index = open_index(backend, path)
+        open_seconds = time.perf_counter() - start
+
+        index.query(query_embeddings=query_vectors[:1], n_results=5)  # warm up
+        latencies = []
+        for q in query_vectors:
+            start = time.perf_counter()
+            index.query(query_embeddings=[q], n_results=5)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        index.query(query_embeddings=query_vectors[:batch], n_results=5)
+        batch_seconds = time.perf_counter() - start
+        filtered = []
+        for q in query_vectors[:50]:
+            start = time.perf_counter()
+            index.query(query_embeddings=[q], n_results=5, where={"Material_Norm": {"$eq": "steel"}})
+            filtered.append(time.perf_counter() - start)
+
+        return {
+            "backend": backend,
+            "rows": rows,
+            "dim": dim,
+            "build_seconds": round(build_seconds, 2),
+            "open_seconds": round(open_seconds, 3),
+            "disk_mb": round(dir_size(path) / 1e6, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+            "query_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+            "filtered_p50_ms": round(float(np.percentile(filtered, 50)) * 1000, 2),
+            f"batch_{batch}_ms": round(batch_seconds * 1000, 2),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--upsert-batch", type=int, default=5_000)
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="run only this backend in the current process")
+    args = parser.parse_args()
+
+    if args.backend:
+        result = run_backend(args.backend, args.rows, args.dim, args.queries, args.batch, args.upsert_batch)
+        print(json.dumps(result))
+        return
+
+    for backend in BACKENDS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--backend", backend, "--rows", str(args.rows),
+             "--dim", str(args.dim), "--queries", str(args.queries), "--batch", str(args.batch),
+             "--upsert-batch", str(args.upsert_batch)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print("  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
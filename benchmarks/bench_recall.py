@@ -0,0 +1,207 @@
+# benchmarks/bench_recall.py
+"""
+Recall of compressed embeddings against full-precision retrieval on a catalog.
+
+    python benchmarks/bench_recall.py --rows 20000
+    python benchmarks/bench_recall.py --backend openai --dimensions 1536 512 256 \\
+        --quantization none int8 binary --k 1 5 10
+
+The catalog (Data/sample_data.csv, plus `--rows` synthetic parts) is indexed
+once per (dimensions, quantization) setting in a NumpyIndex. Queries are
+catalog parts with their sizes changed by up to ±10%, searched by
+description as a quote does. Every setting is compared with full-dimension
+float32 search: recall@k is the share of the exact top k it returns, and
+"same reference" the share of queries whose top match is unchanged, i.e. that
+quote against the same part. The report also lists the bytes scanned per
+query, the index size and query latency, and picks the smallest setting whose
+"same reference" share reaches `--target`.
+
+OpenAI vectors are embedded once at full length and shortened by truncating
+and re-normalizing, which is what the API's `dimensions` parameter returns for
+text-embedding-3 models. Hashing vectors are re-embedded with that many features.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_suite import dir_size, make_catalog, percentiles_ms  # noqa: E402
+from src.embed_parts import PartEmbedder  # noqa: E402
+from src.embedding_backends import HashingEmbeddingBackend, OpenAIEmbeddingBackend  # noqa: E402
+from src.numpy_index import NumpyIndex  # noqa: E402
+
+EMBED_BATCH = 512
+SIZE = re.compile(r"(\d+)x(\d+)x(\d+)")
+
+
+def load_catalog(path, rows=0, seed=0):
+    frames = [pd.read_csv(path)] if path else []
+    if rows:
+        frames.append(make_catalog(rows, seed=seed))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_queries(catalog, count, seed=0):
+    """
+    Descriptions of `count` catalog parts with every dimension changed by up
+    to ±10%, so no query is an exact copy of an indexed part.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(catalog), size=min(count, len(catalog)), replace=False)
+
+    def jitter(match):
+        return "x".join(str(max(1, round(int(d) * rng.uniform(0.9, 1.1)))) for d in match.groups())
+
+    return [SIZE.sub(jitter, catalog["Part Description"].iloc[r], count=1) for r in rows]
+
+
+def embed(backend, texts):
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH):
+        vectors.extend(backend.embed(texts[start:start + EMBED_BATCH]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def embeddings_by_dimension(backend_name, documents, queries, dimensions):
+    """
+    {dimensions: (document vectors, query vectors)}; the full length is
+    max(dimensions).
+    """
+    if backend_name == "hashing":
+        result = {}
+        for d in dimensions:
+            backend = HashingEmbeddingBackend(n_features=d)
+            result[d] = (embed(backend, documents), embed(backend, queries))
+        return result
+    backend = OpenAIEmbeddingBackend()
+    full_docs, full_queries = embed(backend, documents), embed(backend, queries)
+    return {d: (_shorten(full_docs, d), _shorten(full_queries, d)) for d in dimensions}
+
+
+def _shorten(vectors, dimensions):
+    vectors = vectors[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def recall_at_k(truth, found, k):
+    """
+    Mean share of each query's exact top k that the compressed search also returned in its top k.
+    """
+    return float(np.mean([len(set(t[:k]) & set(f[:k])) / min(k, len(t)) for t, f in zip(truth, found) if t]))
+
+
+def search(index, query_vectors, k):
+    latencies, ids = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        ids.append(index.query([vector], n_results=k, include=())["ids"][0])
+        latencies.append(time.perf_counter() - start)
+    return ids, np.array(latencies)
+
+
+def scanned_bytes(rows, dimensions, quantization):
+    if quantization == "int8":
+        return rows * (dimensions + 4)
+    if quantization == "binary":
+        return rows * ((dimensions + 7) // 8)
+    return rows * dimensions * 4
+
+
+def evaluate(catalog, queries, backend="hashing", dimensions=(1024, 256), quantizations=(None, "int8", "binary"),
+             rerank=10, ks=(1, 5, 10), workdir=None):
+    """
+    Returns one result dict per (dimensions, quantization) setting, the
+    full-dimension float32 baseline first.
+    """
+    # The same text the catalog is indexed with (the method does not use the embedder)
+    documents = [PartEmbedder.row_to_embedding_text(None, row) for _, row in catalog.iterrows()]
+    ids = [str(i) for i in range(len(documents))]
+    dimensions = sorted(set(dimensions), reverse=True)
+    vectors = embeddings_by_dimension(backend, documents, queries, dimensions)
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp()
+    try:
+        results = _evaluate_settings(ids, vectors, dimensions, quantizations, rerank, ks, workdir)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _evaluate_settings(ids, vectors, dimensions, quantizations, rerank, ks, workdir):
+    k = max(ks)
+    truth = None
+    results = []
+    for d in dimensions:
+        for quantization in quantizations:
+            path = os.path.join(workdir, f"d{d}_{quantization or 'float32'}")
+            index = NumpyIndex(path, quantization=quantization, rerank=rerank)
+            index.upsert(ids, vectors[d][0])
+            found, latencies = search(index, vectors[d][1], k)
+            if truth is None:
+                truth = found
+            p50, p99 = percentiles_ms(latencies)
+            result = {
+                "dimensions": d,
+                "quantization": quantization or "none",
+                "rerank": rerank if quantization else None,
+                "same_reference": float(np.mean([t[:1] == f[:1] for t, f in zip(truth, found)])),
+                "scanned_bytes": scanned_bytes(len(ids), d, quantization),
+                "disk_bytes": dir_size(path),
+                "query_p50_ms": p50,
+                "query_p99_ms": p99,
+            }
+            result.update({f"recall@{kk}": round(recall_at_k(truth, found, kk), 4) for kk in ks})
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--catalog", default="Data/sample_data.csv", help="CSV catalog ('' for none)")
+    parser.add_argument("--rows", type=int, default=5000, help="synthetic parts added to the catalog")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--backend", choices=["hashing", "openai"], default="hashing")
+    parser.add_argument("--dimensions", type=int, nargs="+",
+                        help="vector lengths to compare (default: 1536 512 256 for openai, 1024 512 256 for hashing)")
+    parser.add_argument("--quantization", nargs="+", choices=["none", "int8", "binary"],
+                        default=["none", "int8", "binary"])
+    parser.add_argument("--rerank", type=int, default=10, help="quantized scans re-rank rerank x k rows")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--target", type=float, default=0.99,
+                        help="share of queries that must keep the same reference part")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog, rows=args.rows)
+    queries = make_queries(catalog, args.queries)
+    dimensions = args.dimensions or ([1536, 512, 256] if args.backend == "openai" else [1024, 512, 256])
+    quantizations = [None if q == "none" else q for q in args.quantization]
+    results = evaluate(catalog, queries, backend=args.backend, dimensions=dimensions,
+                       quantizations=quantizations, rerank=args.rerank, ks=args.k)
+    print(f"{len(catalog):,} parts, {len(queries):,} queries, {args.backend} embeddings")
+    print(pd.DataFrame(results).to_string(index=False))
+    passing = [r for r in results if r["same_reference"] >= args.target]
+    if passing:
+        best = min(passing, key=lambda r: r["scanned_bytes"])
+        print(f"Smallest setting with the same reference for >= {args.target:.0%} of queries: "
+              f"dimensions={best['dimensions']}, quantization={best['quantization']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# benchmarks/bench_suite.py
+"""
+End-to-end indexing and quoting benchmark on synthetic catalogs, fully offline.
+
+    python benchmarks/bench_suite.py --rows 1000 10000 100000 --output bench.json
+    python benchmarks/bench_suite.py --rows 1000000 --index-backend numpy
+    python benchmarks/bench_suite.py --rows 200000 --index-backend chroma --layout inline store
+
+Catalogs follow the Data/sample_data.csv schema. The OpenAI calls are replaced
+by deterministic stand-ins: PartEmbedder.get_embeddings returns a fixed
+pseudo-random vector per text, and the chat client streams a fixed breakdown,
+so the batching, indexing and quoting code runs unchanged without a network.
+
+The "inline" layout keeps documents and metadata in the index; "store" keeps
+them in the columnar PartStore sidecar. Every (rows, index backend, layout)
+combination runs in its own subprocess so peak memory (ru_maxrss) is per run.
+Results are written as JSON, tagged with the git commit, so runs can be
+compared across commits.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+INDEX_BACKENDS = ["chroma", "numpy"]
+LAYOUTS = ["inline", "store"]
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSION = 1536
+
+PARTS = {
+    "Aluminum": ["bracket", "profile", "heatsink", "housing", "plate"],
+    "Steel": ["gear", "shaft", "clamp", "mounting plate", "bracket"],
+    "Stainless Steel": ["plate", "tube", "flange", "bracket"],
+    "Brass": ["bushing", "nut", "fitting", "insert"],
+    "Bronze": ["gear", "bearing", "bushing"],
+    "Copper": ["connector", "plate", "busbar"],
+    "Titanium": ["spacer", "bolt", "implant plate"],
+    "ABS": ["housing", "cover", "knob"],
+    "Plastic": ["cover", "clip", "cap"],
+    "Delrin": ["washer", "gear", "roller"],
+    "Nylon": ["bushing", "spacer", "guide"],
+    "PVC": ["cap", "pipe", "gasket"],
+}
+OPERATIONS = {
+    "Drilling": "drilling", "Milling": "milling", "Turning": "turning",
+    "Laser Cutting": "laser cut", "Injection Molding": "injection molding",
+    "Punching": "punching", "Extrusion": "extrusion", "Hobbing": "hobbing",
+    "Bending": "bending", "Threading": "threading", "CNC": "CNC",
+    "Plasma Cutting": "plasma cut", "Grinding": "grinding", "Stamping": "stamping",
+}
+FINISHES = ["Anodized", "Painted", "Brushed", "Polished", "Smooth", "Tin Plated",
+            "Raw", "Ground", "Textured", "Galvanized", "Tinned", "Clear"]
+MATERIAL_RATES = {m: r for m, r in zip(PARTS, np.linspace(0.6, 2.4, len(PARTS)))}
+
+FAKE_REPLY = json.dumps({
+    "Base Material": 20, "Size Adjustment": 10, "Operations Fee": 20, "Finish Fee": 10,
+    "Total Quote": 60, "Explanation": "Same material and operations as the reference part."
+})
+
+
+def make_catalog(rows, seed=0):
+    """
+    Synthetic catalog with the columns of Data/sample_data.csv. Descriptions
+    carry a part number, so every row gets its own id.
+    """
+    rng = np.random.default_rng(seed)
+    materials = rng.choice(list(PARTS), size=rows)
+    kinds = [PARTS[m][k % len(PARTS[m])] for m, k in zip(materials, rng.integers(0, 6, size=rows))]
+    operations = rng.choice(list(OPERATIONS), size=rows)
+    finishes = rng.choice(FINISHES, size=rows)
+    dims = rng.integers(1, 500, size=(rows, 3))
+    sizes = [f"{a}x{b}x{c}" for a, b, c in dims]
+    rates = np.array([MATERIAL_RATES[m] for m in materials])
+    prices = np.maximum(10, np.round(15 + rates * np.cbrt(dims.prod(axis=1)) + rng.normal(0, 5, size=rows)))
+    descriptions = [
+        f"{m} {kind} PN-{seed}-{i:07d}, {size} mm, {OPERATIONS[op]}, {finish.lower()}"
+        for i, (m, kind, size, op, finish) in enumerate(zip(materials, kinds, sizes, operations, finishes))
+    ]
+    return pd.DataFrame({
+        "Part Description": descriptions,
+        "Material": materials,
+        "Size": sizes,
+        "Operations": operations,
+        "Finish": finishes,
+        "Target Price (CHF)": prices.astype(int),
+    })
+
+
+def fake_embeddings(texts, model=EMBEDDING_MODEL):
+    """
+    Stand-in for PartEmbedder.get_embeddings: a unit vector seeded by the
+    text's hash, so the same text always gets the same embedding.
+    """
+    vectors = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSION, dtype=np.float32)
+        vectors.append((vector / np.linalg.norm(vector)).tolist())
+    return vectors
+
+
+class FakeChatClient:
+    """
+    Stand-in for openai.OpenAI that streams FAKE_REPLY a few characters at a
+    time, with usage in the last chunk like the real API.
+    """
+
+    def __init__(self, reply=FAKE_REPLY, piece=4):
+        self.reply = reply
+        self.piece = piece
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages=None, **kwargs):
+        prompt_tokens = sum(len(m["content"]) for m in messages or []) // 4
+        pieces = [self.reply[i:i + self.piece] for i in range(0, len(self.reply), self.piece)]
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=p))], usage=None)
+            for p in pieces
+        ]
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(pieces),
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=0))
+        return iter(chunks + [SimpleNamespace(choices=[], usage=usage)])
+
+
+def dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def percentiles_ms(latencies):
+    return (
+        round(float(np.percentile(latencies, 50)) * 1000, 2),
+        round(float(np.percentile(latencies, 99)) * 1000, 2),
+    )
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run(rows, index_backend, layout, queries, quotes):
+    from src import quoting
+    from src.embed_parts import PartEmbedder
+
+    catalog = make_catalog(rows)
+    probes = make_catalog(max(queries, quotes), seed=1)
+    catalog_rss_mb = peak_rss_mb()
+    path = tempfile.mkdtemp()
+    try:
+        with patch.object(PartEmbedder, "get_embeddings", staticmethod(fake_embeddings)), \
+                patch.object(quoting, "get_openai_client", FakeChatClient):
+            options = dict(chroma_dir=path, collection_name="bench", model=EMBEDDING_MODEL,
+                           index_backend=index_backend, part_store=layout == "store")
+            embedder = PartEmbedder(**options)
+            start = time.perf_counter()
+            embedder.process_dataframe(catalog)
+            ingest_seconds = time.perf_counter() - start
+
+            texts = [embedder.row_to_embedding_text(row) for _, row in probes.iterrows()]
+            # Load time: reopen the index and answer a first query
+            del embedder
+            start = time.perf_counter()
+            embedder = PartEmbedder(**options)
+            embedder.query(texts[0], n_results=1)
+            open_seconds = time.perf_counter() - start
+
+            embedder.query(texts[0], n_results=1)  # warm up
+            latencies, matches = [], []
+            for text in texts[:queries]:
+                start = time.perf_counter()
+                result = embedder.query(text, n_results=1)
+                latencies.append(time.perf_counter() - start)
+                matches.append((result["documents"][0][0], result["metadatas"][0][0]))
+            query_p50_ms, query_p99_ms = percentiles_ms(latencies)
+
+            quote_ms = {}
+            for engine in (quoting.RULES_ENGINE, quoting.LLM_ENGINE):
+                latencies = []
+                for (_, row), (document, meta) in zip(probes.head(quotes).iterrows(), matches):
+                    start = time.perf_counter()
+                    quoting.quote_part(row.to_dict(), document, meta, engine=engine)
+                    latencies.append(time.perf_counter() - start)
+                quote_ms[engine] = percentiles_ms(latencies)
+
+        return {
+            "rows": rows,
+            "index_backend": index_backend,
+            "layout": layout,
+            "ingest_seconds": round(ingest_seconds, 2),
+            "ingest_rows_per_second": round(rows / ingest_seconds, 1),
+            "open_seconds": round(open_seconds, 3),
+            "query_p50_ms": query_p50_ms,
+            "query_p99_ms": query_p99_ms,
+            "quote_rules_p50_ms": quote_ms[quoting.RULES_ENGINE][0],
+            "quote_rules_p99_ms": quote_ms[quoting.RULES_ENGINE][1],
+            "quote_llm_p50_ms": quote_ms[quoting.LLM_ENGINE][0],
+            "quote_llm_p99_ms": quote_ms[quoting.LLM_ENGINE][1],
+            "catalog_rss_mb": catalog_rss_mb,
+            "peak_rss_mb": peak_rss_mb(),
+            "disk_mb": round(dir_size(path) / 1e6, 1),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--index-backend", choices=INDEX_BACKENDS, nargs="+", default=INDEX_BACKENDS)
+    parser.add_argument("--layout", choices=LAYOUTS, nargs="+", default=LAYOUTS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--quotes", type=int, default=100)
+    parser.add_argument("--output", default="bench_suite.json", help="JSON results file")
+    parser.add_argument("--single", action="store_true",
+                        help="run one rows/backend pair in the current process and print its JSON")
+    args = parser.parse_args()
+    args.quotes = min(args.quotes, args.queries)
+
+    if args.single:
+        print(json.dumps(run(args.rows[0], args.index_backend[0], args.layout[0], args.queries, args.quotes)))
+        return
+
+    results = []
+    runs = [(r, b, layout) for r in args.rows for b in args.index_backend for layout in args.layout]
+    for rows, index_backend, layout in runs:
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", "--rows", str(rows),
+             "--index-backend", index_backend, "--layout", layout,
+             "--queries", str(args.queries), "--quotes", str(args.quotes)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print("  ".join(f"{k}={v}" for k, v in result.items()), flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "embedding_dimension": EMBEDDING_DIMENSION,
+        "queries": args.queries,
+        "quotes": args.quotes,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
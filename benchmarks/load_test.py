@@ -0,0 +1,113 @@
+# benchmarks/load_test.py
+"""
+Load test for the HTTP quoting service: many concurrent POST /quote requests
+over keep-alive connections, reporting throughput and latency percentiles.
+
+    python benchmarks/stub_openai.py --port 8001 --latency-ms 300 &
+    export OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub
+    python -m src.cli --data-dir /tmp/load index Data/sample_data.csv
+    python -m src.cli --data-dir /tmp/load serve --port 8000 --max-concurrency 16 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --requests 2000 --connections 64
+
+Requests cycle through `--distinct` different parts, so with fewer distinct
+parts than connections, identical requests overlap and are coalesced by the
+service. `--engine llm` makes every quote a (stubbed) chat completion.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_suite import make_catalog, percentiles_ms  # noqa: E402
+
+PART_COLUMNS = ["Part Description", "Material", "Size", "Operations", "Finish"]
+
+
+async def request(reader, writer, host, path, payload):
+    """
+    Sends one request on an open keep-alive connection; returns (status, JSON body).
+    """
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run(url, total, connections, parts, options):
+    target = urlparse(url)
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(parts[i % len(parts)])
+    latencies, statuses = [], {}
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(target.hostname, target.port or 80)
+        try:
+            while not queue.empty():
+                part = queue.get_nowait()
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, target.hostname, "/quote", dict(part, **options))
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_connection(target.hostname, target.port or 80)
+    writer.write(f"GET /health HTTP/1.1\r\nHost: {target.hostname}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    health = (await reader.read()).split(b"\r\n\r\n", 1)[1]
+    writer.close()
+    p50, p99 = percentiles_ms(np.array(latencies))
+    return {
+        "requests": total,
+        "connections": connections,
+        "distinct_parts": len(parts),
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(total / elapsed, 1),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "statuses": statuses,
+        "service": json.loads(health),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=200, help="number of different parts to quote")
+    parser.add_argument("--engine", choices=["rules", "llm"], default="rules")
+    args = parser.parse_args()
+
+    parts = make_catalog(args.distinct, seed=1)[PART_COLUMNS].to_dict(orient="records")
+    options = {"engine": args.engine, "use_price_model": False}
+    report = asyncio.run(run(args.url, args.requests, args.connections, parts, options))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
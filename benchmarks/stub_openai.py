@@ -0,0 +1,145 @@
+# benchmarks/stub_openai.py
+"""
+Local stand-in for the OpenAI embeddings and chat completions endpoints, for
+load-testing the quoting service without a network or an API key.
+
+    python benchmarks/stub_openai.py --port 8001 --latency-ms 300
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python -m src.cli serve
+
+Embeddings are the deterministic vectors of bench_suite.fake_embeddings; chat
+completions stream bench_suite.FAKE_REPLY a few characters at a time, with a
+usage chunk at the end when the client asks for one. `--latency-ms` delays
+every response, as a real API round trip would.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_suite import EMBEDDING_MODEL, FAKE_REPLY, fake_embeddings  # noqa: E402
+from src.batching import estimate_tokens  # noqa: E402
+from src.service import HTTPError, read_request, write_response  # noqa: E402
+
+
+def start_chunked(writer, content_type="text/event-stream"):
+    writer.write(
+        f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+        f"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n".encode("latin-1")
+    )
+
+
+def write_chunk(writer, data):
+    """
+    Writes one chunk of a chunked response; empty `data` ends the response.
+    """
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+
+class StubOpenAI:
+    def __init__(self, latency_ms=0.0, chunk_chars=4, reply=FAKE_REPLY):
+        self.latency = latency_ms / 1000
+        self.chunk_chars = chunk_chars
+        self.reply = reply
+        self.calls = {"embeddings": 0, "chat": 0}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    write_response(writer, e.status, {"error": {"message": e.message}}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, _, body = request
+                await self.respond(writer, method, path, json.loads(body or b"{}"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method, path, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "POST" and path.endswith("/embeddings"):
+            self.calls["embeddings"] += 1
+            texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            tokens = sum(estimate_tokens(t) for t in texts)
+            write_response(writer, 200, {
+                "object": "list",
+                "model": request.get("model", EMBEDDING_MODEL),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": vector}
+                    for i, vector in enumerate(fake_embeddings(texts))
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        elif method == "POST" and path.endswith("/chat/completions"):
+            self.calls["chat"] += 1
+            await self.complete(writer, request)
+        else:
+            write_response(writer, 404, {"error": {"message": f"No route {method} {path}"}})
+
+    async def complete(self, writer, request):
+        model = request.get("model", "gpt-4o")
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in request.get("messages", []))
+        pieces = [self.reply[i:i + self.chunk_chars] for i in range(0, len(self.reply), self.chunk_chars)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                 "total_tokens": prompt_tokens + len(pieces),
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+
+        def chunk(choices, usage=None):
+            return {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": choices, "usage": usage}
+
+        if not request.get("stream"):
+            write_response(writer, 200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": model, "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.reply}}],
+            })
+            return
+        start_chunked(writer)
+        events = [chunk([{"index": 0, "delta": {"role": "assistant", "content": p}, "finish_reason": None}])
+                  for p in pieces]
+        events.append(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append(chunk([], usage))
+        for event in events:
+            write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        write_chunk(writer, b"data: [DONE]\n\n")
+        write_chunk(writer, b"")
+
+    async def start(self, host="127.0.0.1", port=8001):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(host, port, latency_ms):
+    server = await StubOpenAI(latency_ms=latency_ms).start(host, port)
+    print(f"Stub OpenAI API on http://{host}:{port}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before every response")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
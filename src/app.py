@@ -1,10 +1,9 @@
 import streamlit as st
-import pandas as pd
-from embed_parts import PartEmbedder
+import resources
+import tracing
+from engine import NoReferenceError, QuotingEngine
 import json
-import openai
-from training_prompt import cnc_training_prompt
-from features import PartFeatures
+import time
 
 st.set_page_config(page_title="Quoting Assistant", layout="centered")
 
@@ -16,23 +15,80 @@ st.write(
 
 uploaded_file = st.file_uploader("Upload your manufacturing parts CSV", type=["csv"])
 
-# Directory to store ChromaDB files
-CHROMA_DIR = "data/chroma_db"
-COLLECTION_NAME = "parts_db"
+# Index location, embedding/index backends, sharding, dedup and caches come
+# from the environment (EMBEDDING_BACKEND, EMBEDDING_DIMENSIONS, INDEX_BACKEND,
+# INDEX_QUANTIZATION, SHARD_BY, PART_STORE, DEDUP, BREAKDOWN_RULES,
+# QUOTING_DATA_DIR); see src/engine.py
+engine = QuotingEngine.from_env()
+PREVIEW_ROWS = 50
+# Rendering a multi-GB table on every rerun is slow; show this many rows at most
+MAX_TABLE_ROWS = 1_000
+
+
+# Exporters named in TRACE_EXPORTER ("log", "jsonl", "otel"); traces of every request
+tracing.configure_from_env()
+
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    st.success("CSV uploaded successfully! Here is a preview of your data:")
-    st.dataframe(df)
+    streaming = st.checkbox(
+        "Large file: stream in chunks (bounded memory, resumable)",
+        help="Reads, embeds and indexes the CSV chunk by chunk instead of loading it all at once."
+    )
+    if streaming:
+        import pandas as pd
+
+        df = None
+        preview = pd.read_csv(uploaded_file, nrows=PREVIEW_ROWS)
+        uploaded_file.seek(0)
+        st.success(f"CSV uploaded successfully! Here are the first {PREVIEW_ROWS} rows:")
+        st.dataframe(preview)
+    else:
+        # Parsed once per distinct upload, not on every widget interaction
+        df = resources.load_csv(uploaded_file.getvalue())
+        st.success("CSV uploaded successfully! Here is a preview of your data:")
+        st.dataframe(df.head(MAX_TABLE_ROWS))
+        if len(df) > MAX_TABLE_ROWS:
+            st.caption(f"Showing the first {MAX_TABLE_ROWS:,} of {len(df):,} rows.")
+    incremental = not streaming and st.checkbox(
+        "Incremental sync: only re-embed new or changed rows, remove parts missing from this file"
+    )
 
     if st.button("Embed & Index All Parts"):
-        with st.spinner("Indexing and embedding parts..."):
-            embedder = PartEmbedder(
-                chroma_dir=CHROMA_DIR,
-                collection_name=COLLECTION_NAME
+        # One warm embedder and cache per process, re-used across reruns
+        cache = engine.embedder().embedding_cache
+        hits_before, misses_before = cache.hits, cache.misses
+        if streaming:
+            progress = st.progress(0.0, text="Starting ingest...")
+
+            def show_progress(rows_done, rows_total, rows_per_sec):
+                progress.progress(
+                    min(rows_done / rows_total, 1.0) if rows_total else 1.0,
+                    text=f"{rows_done:,} / {rows_total:,} rows ({rows_per_sec:,.0f} rows/s)"
+                )
+
+            summary = engine.index(uploaded_file, mode="stream", on_progress=show_progress)
+            if summary["resumed_from"]:
+                st.info(f"Resumed from row {summary['resumed_from']:,} of a previous run.")
+        elif incremental:
+            with st.spinner("Syncing changed parts and updating the price model..."):
+                summary = engine.index(df, mode="sync")
+            st.info(
+                f"{summary['added']} added, {summary['updated']} updated, "
+                f"{summary['unchanged']} unchanged, {summary['deleted']} deleted."
             )
-            embedder.process_dataframe(df)
+        else:
+            with st.spinner("Indexing and embedding parts, updating the price model..."):
+                summary = engine.index(df)
         st.success("All parts have been embedded and indexed!")
+        st.caption(
+            f"Embedding cache: {cache.hits - hits_before} hits, {cache.misses - misses_before} misses "
+            f"({len(cache)} entries stored)"
+        )
+        if summary["price_model_version"] is not None:
+            st.caption(
+                f"Price model v{summary['price_model_version']}, "
+                f"trained on {summary['price_model_rows']:,} parts."
+            )
     
  # ---------  QUERY UI ---------
 
@@ -43,73 +99,155 @@ if uploaded_file:
     user_operations = st.text_input("Operations (comma-separated, e.g., drilling, milling)")
     user_finish = st.text_input("Finish (e.g., anodized)")
     query = st.text_input("Part Description (free text, optional)", value="")
+    same_material = st.checkbox("Only compare against parts of the same material")
+    use_price_model = st.checkbox(
+        "Answer from the price model when it is confident", value=True
+    )
+    ai_explanation = st.checkbox("Ask the AI for a one-line explanation of the breakdown")
+    ai_breakdown = st.checkbox("Let the AI compute the whole breakdown (slower, streamed as it arrives)")
+    volume_tolerance = st.slider(
+        "Only compare against parts with a volume within ±% (0 = any size)",
+        min_value=0, max_value=200, value=0, step=10
+    )
+    # With SHARD_BY set, the search can be limited to some shards (e.g. customers)
+    selected_shards = st.multiselect(
+        f"Only search these {engine.shard_by} shards (empty = all)", engine.embedder().shard_names()
+    ) if engine.shard_by else []
 
     if st.button("Get Quote"):
         if query.strip() == "":
             st.warning("Please enter a part description to quote.")
         else:
-            with st.spinner("Searching for the most similar part..."):
-                embedder = PartEmbedder(
-                    chroma_dir=CHROMA_DIR,
-                    collection_name=COLLECTION_NAME
-                )
-                result = embedder.query(query, n_results=1)
-                if not result["documents"][0]:
-                    st.error("No similar parts found. Try indexing data or refining your query.")
-                else:
-                    doc = result["documents"][0][0]
-                    meta = result["metadatas"][0][0]
-                    ref_features = PartFeatures.feature_dict(meta)
-                    similar_price = ref_features.get("Target Price (CHF)", "")
-
-                    user_row = {
-                        "Material": user_material,
-                        "Size": user_size,
-                        "Operations": user_operations,
-                        "Finish": user_finish,
-                        "Part Description": query
-                    }
-                    query_features = PartFeatures.feature_dict(user_row)
-
-
-                    # Build AI prompt for LLM agent
-                    prompt = cnc_training_prompt(
-                            query=query_features,
-                            similar_price=similar_price,
-                            similar_part=doc,
-                            similar_features=ref_features
-                        )
+            user_row = {
+                "Material": user_material,
+                "Size": user_size,
+                "Operations": user_operations,
+                "Finish": user_finish,
+                "Part Description": query
+            }
+            live = st.empty()
+            started = time.perf_counter()
 
+            def show_fields(fields):
+                # Streamed replies: render each field as soon as it is complete
+                if "quote.first_result" not in resources.timings:
+                    resources.timings["quote.first_result"] = time.perf_counter() - started
+                live.json(fields)
 
-                    with st.spinner("Letting the AI agent calculate your quote..."):
-                        try:
-                            response = openai.chat.completions.create(
-                                model="gpt-4o",
-                                messages=[{"role": "system", "content": prompt}],
-                                temperature=0
+            resources.timings.pop("quote.first_result", None)
+            usage = {}
+            with st.spinner("Calculating your quote..."):
+                try:
+                    # Rule-based breakdown (or a confident price-model estimate) unless
+                    # the AI breakdown is requested; the AI otherwise only writes the explanation
+                    quote = engine.quote(
+                        user_row,
+                        engine="llm" if ai_breakdown else "rules",
+                        explain=ai_explanation,
+                        same_material=same_material,
+                        volume_tolerance=volume_tolerance / 100 if volume_tolerance else None,
+                        use_price_model=use_price_model,
+                        shards=selected_shards or None,
+                        on_update=show_fields,
+                        usage=usage
+                    )
+                    live.empty()
+                    for warning in quote["warnings"]:
+                        st.warning(warning)
+                    result_json = quote["breakdown"]
+                    if quote["source"] == "price_model":
+                        st.success("⚡ Price model estimate:")
+                    elif quote["source"] == "cache":
+                        st.success("⚡ Cached AI quote breakdown (same part and reference as an earlier quote):")
+                    elif quote["source"] == "llm":
+                        st.success("AI-generated quote breakdown:")
+                    else:
+                        st.success("Quote breakdown:")
+                    st.json(result_json)
+                    st.caption(result_json.get("Explanation", ""))
+                    st.subheader("Reference Part Features:")
+                    st.json(quote["reference"]["features"])
+                    if quote["reference"]["price_range"] is not None:
+                        st.caption(f"Reference price: {quote['reference']['price_range']}.")
+                    st.subheader("Queried Part Features:")
+                    st.json(quote["query_features"])
+                    stages = ["quote.embedder", "quote.retrieval", "quote.first_result", "quote.completion"]
+                    st.caption(
+                        "Latency: " + ", ".join(
+                            f"{stage.split('.')[1]} {resources.timings[stage] * 1000:.0f} ms"
+                            for stage in stages if stage in resources.timings
+                        )
+                    )
+                    if "static_tokens" in usage:
+                        tokens = (
+                            f"Prompt: {usage['static_tokens']:,} static tokens (cacheable prefix) "
+                            f"+ {usage['dynamic_tokens']:,} part-specific tokens"
+                        )
+                        if "prompt_tokens" in usage:
+                            tokens += (
+                                f"; API billed {usage['prompt_tokens']:,} input tokens, "
+                                f"{usage['cached_tokens']:,} served from the prompt cache"
                             )
-                            ai_output = response.choices[0].message.content.strip()
-
-                            # Clean code fencing if present
-                            if ai_output.startswith("```"):
-                                ai_output = ai_output.split("```")[-2] if "```" in ai_output else ai_output
-                            ai_output = ai_output.strip()
-                            if ai_output.startswith("json"):
-                                ai_output = ai_output[4:].strip()
-                            # Now try to parse
-                            try:
-                                result_json = json.loads(ai_output)
-                                print(result_json)
-                                query_features["Target Price (CHF)"] = result_json.get("Total Quote")
-                                st.success("AI-generated quote breakdown:")
-                                st.json(result_json)
-                                st.caption(result_json.get("Explanation", ""))
-                                st.subheader("Reference Part Features:")
-                                st.json(ref_features)
-                                st.subheader("Queried Part Features:")
-                                st.json(query_features)
-                            except json.JSONDecodeError:
-                                st.error("AI response could not be parsed as JSON. Showing raw output:")
-                                st.code(ai_output)
-                        except Exception as e:
-                            st.error(f"OpenAI API call failed: {e}")
+                        st.caption(tokens)
+                except NoReferenceError as e:
+                    st.error(str(e))
+                except json.JSONDecodeError as e:
+                    st.error("AI response could not be parsed as JSON. Showing raw output:")
+                    st.code(e.doc)
+                except ValueError as e:
+                    st.error(f"Could not quote this part: {e}")
+                except Exception as e:
+                    st.error(f"OpenAI API call failed: {e}")
+
+    # ---------  BATCH QUOTE UI ---------
+
+    st.header("Batch Quote a Bill of Materials")
+    bom_file = st.file_uploader(
+        "Upload a CSV of new parts (Part Description, Material, Size, Operations, Finish)",
+        type=["csv"],
+        key="bom_file"
+    )
+    if bom_file and st.button("Quote All Parts"):
+        import pandas as pd
+
+        bom_df = resources.load_csv(bom_file.getvalue())
+        progress = st.progress(0.0, text="Quoting parts...")
+        live_table = st.empty()
+        quoted = [None] * len(bom_df)
+        done = 0
+        quoted_parts = engine.quote_many(bom_df)
+        with tracing.span("batch_quote", parts=len(bom_df)):
+            for position, row in quoted_parts:
+                quoted[position] = row
+                done += 1
+                progress.progress(done / len(bom_df), text=f"Quoted {done} / {len(bom_df)} parts")
+                live_table.dataframe(pd.DataFrame([r for r in quoted if r is not None]))
+        if quoted:
+            quoted_df = pd.DataFrame(quoted)
+            live_table.dataframe(quoted_df)
+            if "Error" in quoted_df.columns and quoted_df["Error"].notna().any():
+                st.warning(f"{quoted_df['Error'].notna().sum()} parts could not be quoted.")
+            st.download_button(
+                "Download quoted CSV",
+                data=quoted_df.to_csv(index=False).encode("utf-8"),
+                file_name="quoted_parts.csv",
+                mime="text/csv"
+            )
+
+# ---------  DEBUG PANEL ---------
+
+if st.sidebar.checkbox("Show trace of the last request"):
+    trace = tracing.last_trace()
+    if trace is None:
+        st.sidebar.info("No request has been traced yet.")
+    else:
+        totals = trace.get("totals", {})
+        st.sidebar.subheader(f"{trace['name']}: {trace['duration_ms']:.0f} ms")
+        st.sidebar.caption(
+            f"{totals.get('api_calls', 0)} API calls, {totals.get('tokens_in', 0):,} tokens in, "
+            f"{totals.get('tokens_out', 0):,} tokens out, "
+            f"~${totals.get('cost_usd', 0.0):.4f} (CHF {totals.get('cost_chf', 0.0):.4f})"
+        )
+        import pandas as pd
+
+        st.sidebar.dataframe(pd.DataFrame(tracing.span_rows(trace)), hide_index=True)
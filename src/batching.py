@@ -0,0 +1,137 @@
+# src/batching.py
+
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_token_encoder = None
+
+
+def estimate_tokens(text):
+    """
+    Returns the number of tokens in `text`. Uses tiktoken when it is installed,
+    otherwise the usual ~4 characters per token approximation.
+    """
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False
+    if _token_encoder:
+        return len(_token_encoder.encode(text))
+    return len(text) // 4 + 1
+
+
+def token_batches(texts, max_tokens=50_000, max_items=512, count_tokens=estimate_tokens):
+    """
+    Splits `texts` into batches that stay under both the token budget and the
+    per-request input limit. Yields lists of indices into `texts`.
+    A single text larger than the budget gets a batch of its own.
+    """
+    batch, batch_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def is_retryable(exc):
+    """
+    True for rate-limit and transient connection/server errors.
+    """
+    try:
+        import openai
+        if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError,
+                            openai.APIConnectionError, openai.InternalServerError)):
+            return True
+    except ImportError:
+        pass
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class RateLimiter:
+    """
+    Thread-safe pacer: spaces out calls to `wait()` so that at most
+    `per_minute` of them start in any minute. None or 0 disables the limit.
+    """
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def call_with_retries(fn, *args, max_retries=5, base_delay=1.0, max_delay=30.0,
+                      retry_on=is_retryable, sleep=None):
+    """
+    Calls fn(*args), retrying with exponential backoff and jitter when
+    `retry_on(exc)` says the error is transient.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt >= max_retries or not retry_on(e):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            (sleep or time.sleep)(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+
+
+def embed_in_batches(texts, embed_fn, on_batch, max_concurrency=4, max_tokens=50_000,
+                     max_items=512, max_retries=5, base_delay=1.0, sleep=None):
+    """
+    Embeds `texts` in token-budgeted batches, running up to `max_concurrency`
+    requests at once. `embed_fn(batch_texts)` returns one vector per text.
+
+    `on_batch(indices, embeddings)` is called from the calling thread as each
+    batch completes, so callers can write results (e.g. upsert into Chroma)
+    without waiting for the whole run or sharing their client across threads.
+    Requests run in a copy of the caller's context, so they are traced under
+    the caller's current span.
+    """
+    batches = list(token_batches(texts, max_tokens=max_tokens, max_items=max_items))
+    if not batches:
+        return
+
+    def run(indices):
+        return call_with_retries(
+            embed_fn, [texts[i] for i in indices],
+            max_retries=max_retries, base_delay=base_delay, sleep=sleep,
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, run, indices): indices
+            for indices in batches
+        }
+        try:
+            for future in as_completed(futures):
+                on_batch(futures[future], future.result())
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
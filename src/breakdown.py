@@ -0,0 +1,233 @@
+# src/breakdown.py
+"""
+Deterministic quote breakdowns that follow the rules of cnc_training_prompt:
+
+- the total is anchored to the reference part's price and never exceeds it,
+- Base Material + Size Adjustment + Operations Fee + Finish Fee == Total Quote,
+- no category gets more than 60% of the total,
+- a CHF 10 minimum charge applies, even when the reference part itself is
+  priced below it (the explanation then says the quote is above the reference),
+- operations or finish of "none"/"raw" cost nothing.
+
+Each part gets points per category from configurable weight tables; the
+total is the reference price scaled by (new part points / reference points),
+and it is split across the categories in proportion to the new part's points.
+"""
+
+import json
+import math
+
+try:
+    from .features import PartFeatures
+except ImportError:
+    from features import PartFeatures
+
+CATEGORIES = ["Base Material", "Size Adjustment", "Operations Fee", "Finish Fee"]
+MIN_CHARGE = 10
+MAX_CATEGORY_SHARE = 0.6
+# Operations and finishes that carry no fee
+NO_FEE_VALUES = {"", "none", "raw", "n/a", "-"}
+
+# Points for Base Material, by material (Steel > Aluminum > Plastic > ABS > Brass > Copper > Bronze)
+MATERIAL_WEIGHTS = {
+    "stainless steel": 2.6,
+    "steel": 2.4,
+    "aluminum": 2.0,
+    "aluminium": 2.0,
+    "plastic": 1.6,
+    "abs": 1.4,
+    "brass": 1.2,
+    "copper": 1.1,
+    "bronze": 1.0,
+}
+# Points for Size Adjustment, by PartFeatures.size_label
+SIZE_WEIGHTS = {"Small": 0.5, "Medium": 1.0, "Large": 1.5, "Unknown": 1.0}
+# Points per machining operation
+OPERATION_WEIGHTS = {
+    "drilling": 2.0,
+    "tapping": 1.5,
+    "punching": 1.5,
+    "turning": 2.5,
+    "laser cut": 2.5,
+    "laser cutting": 2.5,
+    "milling": 3.0,
+    "injection molding": 3.0,
+    "cnc machining": 3.5,
+    "hobbing": 4.0,
+}
+# Points per finishing process
+FINISH_WEIGHTS = {
+    "brushed": 0.8,
+    "anodized": 1.0,
+    "painted": 1.0,
+    "polished": 1.0,
+    "tin plated": 1.2,
+    "powder coated": 1.2,
+}
+DEFAULT_MATERIAL_WEIGHT = 2.0
+DEFAULT_OPERATION_WEIGHT = 2.5
+DEFAULT_FINISH_WEIGHT = 1.0
+
+
+def _lookup(label, table, default):
+    """
+    Weight of `label` in `table`: an exact match, else the longest table entry
+    contained in it as whole words ("stainless steel 316" -> "stainless steel").
+    """
+    if label in table:
+        return table[label]
+    padded = f" {label} "
+    matches = [key for key in table if f" {key} " in padded]
+    return table[max(matches, key=len)] if matches else default
+
+
+def _tokens(value):
+    return [PartFeatures.normalize_label(token) for token in str(value or "").split(",")]
+
+
+class BreakdownRules:
+    """
+    The weight tables and limits used to price a part against its reference.
+    Tables passed in are merged over the defaults, so a config only needs the
+    entries it changes.
+    """
+
+    def __init__(self, material_weights=None, size_weights=None, operation_weights=None,
+                 finish_weights=None, min_charge=MIN_CHARGE, max_share=MAX_CATEGORY_SHARE):
+        self.material_weights = {**MATERIAL_WEIGHTS, **_normalized(material_weights)}
+        self.size_weights = {**SIZE_WEIGHTS, **(size_weights or {})}
+        self.operation_weights = {**OPERATION_WEIGHTS, **_normalized(operation_weights)}
+        self.finish_weights = {**FINISH_WEIGHTS, **_normalized(finish_weights)}
+        self.min_charge = min_charge
+        self.max_share = max_share
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads rules from a JSON file with any of the keys material_weights,
+        size_weights, operation_weights, finish_weights, min_charge and max_share.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def points(self, features, volume_scale=1.0):
+        """
+        Points per category for a feature_dict. `volume_scale` (the part's size
+        relative to the reference) scales Base Material and Size Adjustment.
+        """
+        material = PartFeatures.normalize_label(features.get("Material"))
+        operations = [t for t in _tokens(features.get("Operations")) if t not in NO_FEE_VALUES]
+        finishes = [t for t in _tokens(features.get("Finish")) if t not in NO_FEE_VALUES]
+        return {
+            "Base Material": _lookup(material, self.material_weights, DEFAULT_MATERIAL_WEIGHT) * volume_scale,
+            "Size Adjustment": self.size_weights.get(features.get("Size_Label"), 1.0) * volume_scale,
+            "Operations Fee": sum(
+                _lookup(op, self.operation_weights, DEFAULT_OPERATION_WEIGHT) for op in operations
+            ),
+            "Finish Fee": sum(
+                _lookup(finish, self.finish_weights, DEFAULT_FINISH_WEIGHT) for finish in finishes
+            ),
+        }
+
+    def split(self, total, points):
+        """
+        Splits a whole-CHF `total` across the categories in proportion to
+        `points`: categories without points get 0, none gets more than
+        max_share of the total (unless too few categories have points for that),
+        and the parts sum exactly to the total.
+        """
+        positive = [c for c in CATEGORIES if points.get(c, 0) > 0] or ["Base Material"]
+        cap = max(math.floor(self.max_share * total), math.ceil(total / len(positive)))
+
+        # Proportional shares, with any share above the cap fixed at the cap and
+        # the rest re-spread over the remaining categories
+        shares, remaining, active = {}, total, list(positive)
+        while active:
+            weight = sum(points.get(c, 0) for c in active) or len(active)
+            proposed = {c: remaining * (points.get(c, 0) or 1) / weight for c in active}
+            over = [c for c in active if proposed[c] > cap]
+            if not over:
+                shares.update(proposed)
+                break
+            for c in over:
+                shares[c] = cap
+                remaining -= cap
+                active.remove(c)
+
+        amounts = {c: math.floor(shares.get(c, 0)) for c in CATEGORIES}
+        leftover = total - sum(amounts.values())
+        by_remainder = sorted(positive, key=lambda c: shares[c] - amounts[c], reverse=True)
+        while leftover > 0:
+            for c in by_remainder:
+                if leftover and amounts[c] < cap:
+                    amounts[c] += 1
+                    leftover -= 1
+        return amounts
+
+    def breakdown(self, query_features, reference_features, reference_price):
+        """
+        Breakdown dict (the same keys the LLM returns) for a part quoted against
+        its reference. Raises ValueError when the reference has no usable price.
+        """
+        try:
+            reference_price = float(reference_price)
+        except (TypeError, ValueError):
+            raise ValueError(f"Reference part has no usable price: {reference_price!r}") from None
+        if math.isnan(reference_price) or reference_price <= 0:
+            raise ValueError(f"Reference part has no usable price: {reference_price!r}")
+
+        scale = volume_scale(query_features.get("Volume_mm3"), reference_features.get("Volume_mm3"))
+        query_points = self.points(query_features, scale)
+        reference_points = self.points(reference_features)
+        ratio = sum(query_points.values()) / (sum(reference_points.values()) or 1.0)
+
+        scaled = reference_price * min(ratio, 1.0)
+        # Whole CHF, never rounded up past a fractional reference price (e.g. a
+        # deduplicated group's median of 61.5)
+        total = max(self.min_charge, min(round(scaled), math.floor(reference_price)))
+        amounts = self.split(total, query_points)
+
+        if reference_price < self.min_charge:
+            explanation = (
+                f"Minimum charge of CHF {self.min_charge} applies, above the reference part's "
+                f"price of CHF {reference_price:g}."
+            )
+        elif scaled < self.min_charge:
+            explanation = (
+                f"Part is much smaller or simpler than the reference; "
+                f"minimum charge of CHF {self.min_charge} applies."
+            )
+        elif ratio > 1.0:
+            explanation = (
+                f"More complex than the reference, mostly in {_largest(query_points, reference_points)}, "
+                f"but the total is held at the reference price."
+            )
+        else:
+            top = max(CATEGORIES, key=lambda c: amounts[c])
+            explanation = f"Price is driven mainly by {top.lower()} (CHF {amounts[top]} of {total})."
+
+        result = dict(amounts)
+        result["Total Quote"] = total
+        result["Explanation"] = explanation
+        return result
+
+
+def volume_scale(query_volume, reference_volume, low=0.05, high=20.0):
+    """
+    Linear size of the part relative to the reference (cube root of the
+    volume ratio), clipped to [low, high]; 1.0 when either volume is unknown.
+    """
+    if not query_volume or not reference_volume:
+        return 1.0
+    if math.isnan(query_volume) or math.isnan(reference_volume):
+        return 1.0
+    return min(high, max(low, (query_volume / reference_volume) ** (1 / 3)))
+
+
+def _normalized(table):
+    return {PartFeatures.normalize_label(k): v for k, v in (table or {}).items()}
+
+
+def _largest(query_points, reference_points):
+    extra = {c: query_points[c] - reference_points[c] for c in CATEGORIES}
+    return max(CATEGORIES, key=lambda c: extra[c]).lower()
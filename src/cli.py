@@ -0,0 +1,173 @@
+# src/cli.py
+"""
+Command-line interface to the quoting engine, for batch jobs and the ERP.
+
+    python -m src.cli index Data/sample_data.csv [--sync | --stream]
+    python -m src.cli quote --description "Aluminum bracket" --material Aluminum \\
+        --size 100x50x5 --operations Drilling --finish Anodized
+    python -m src.cli batch-quote bom.csv --output quoted.csv
+    python -m src.cli serve --port 8000 --max-concurrency 16
+
+Settings default to the same environment variables as the app
+(EMBEDDING_BACKEND, EMBEDDING_DIMENSIONS, INDEX_BACKEND, INDEX_QUANTIZATION,
+SHARD_BY, PART_STORE, DEDUP, BREAKDOWN_RULES); the options below override them.
+"""
+
+import argparse
+import json
+import sys
+
+try:
+    from . import tracing
+    from .engine import NoReferenceError, QuotingEngine
+    from .quoting import LLM_ENGINE, RULES_ENGINE
+except ImportError:
+    import tracing
+    from engine import NoReferenceError, QuotingEngine
+    from quoting import LLM_ENGINE, RULES_ENGINE
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="quoting", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", help="where the index and caches live (default: data)")
+    parser.add_argument("--embedding-backend", choices=["openai", "hashing"])
+    parser.add_argument("--index-backend", choices=["chroma", "numpy"])
+    parser.add_argument("--shard-by", help="column whose values split the catalog into shards")
+    parser.add_argument("--no-part-store", action="store_true", help="keep documents in the index")
+    parser.add_argument("--no-dedup", action="store_true", help="index every row on its own")
+    parser.add_argument("--dimensions", type=int, help="embedding length (e.g. 512; default: the model's)")
+    parser.add_argument("--quantization", choices=["int8", "binary", "none"],
+                        help="scan compact codes in the numpy index, re-ranking with float vectors")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="embed and index a catalog CSV")
+    index.add_argument("catalog", help="CSV with Part Description, Material, Size, Operations, Finish, Target Price (CHF)")
+    mode = index.add_mutually_exclusive_group()
+    mode.add_argument("--sync", dest="mode", action="store_const", const="sync",
+                      help="only re-embed new or changed rows, remove parts missing from the file")
+    mode.add_argument("--stream", dest="mode", action="store_const", const="stream",
+                      help="read the file chunk by chunk (bounded memory, resumable)")
+
+    quote = commands.add_parser("quote", help="quote one part")
+    quote.add_argument("--description", required=True)
+    quote.add_argument("--material", default="")
+    quote.add_argument("--size", default="")
+    quote.add_argument("--operations", default="")
+    quote.add_argument("--finish", default="")
+    quote.add_argument("--same-material", action="store_true",
+                       help="only compare against parts of the same material")
+    quote.add_argument("--volume-tolerance", type=float, default=0,
+                       help="only compare against parts with a volume within ±this percent")
+    quote.add_argument("--shard", action="append", dest="shards", help="only search this shard (repeatable)")
+    add_quote_options(quote)
+
+    batch = commands.add_parser("batch-quote", help="quote every part of a bill-of-materials CSV")
+    batch.add_argument("bom", help="CSV with Part Description, Material, Size, Operations, Finish")
+    batch.add_argument("--output", "-o", help="write the quoted CSV here (default: stdout)")
+    add_quote_options(batch)
+
+    serve = commands.add_parser("serve", help="run the HTTP quoting service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-concurrency", type=int, default=8,
+                       help="quotes computed at the same time")
+    serve.add_argument("--max-pending", type=int, default=256,
+                       help="requests allowed to wait; more are answered 503")
+    return parser
+
+
+def add_quote_options(parser):
+    parser.add_argument("--engine", choices=[RULES_ENGINE, LLM_ENGINE], default=RULES_ENGINE,
+                        help="rules: local breakdown rules; llm: the AI computes the breakdown")
+    parser.add_argument("--explain", action="store_true", help="ask the AI for a one-line explanation")
+    parser.add_argument("--no-price-model", action="store_true",
+                        help="never answer from the price model")
+
+
+def engine_from_args(args):
+    """
+    QuotingEngine from the environment, with the command-line options applied.
+    """
+    env = QuotingEngine.from_env(data_dir=args.data_dir)
+    quantization = env.quantization
+    if args.quantization:
+        quantization = None if args.quantization == "none" else args.quantization
+    return QuotingEngine(
+        data_dir=env.data_dir,
+        embedding_backend=args.embedding_backend or env.embedding_backend,
+        index_backend=args.index_backend or env.index_backend,
+        shard_by=args.shard_by or env.shard_by,
+        part_store=env.part_store and not args.no_part_store,
+        dedup=env.dedup and not args.no_dedup,
+        breakdown_rules_path=env.breakdown_rules_path,
+        embedding_dimensions=args.dimensions or env.embedding_dimensions,
+        quantization=quantization
+    )
+
+
+def main(argv=None):
+    import pandas as pd
+
+    args = build_parser().parse_args(argv)
+    engine = engine_from_args(args)
+    tracing.configure_from_env()
+
+    if args.command == "serve":
+        try:
+            from .service import serve
+        except ImportError:
+            from service import serve
+        serve(engine, host=args.host, port=args.port,
+              max_concurrency=args.max_concurrency, max_pending=args.max_pending)
+        return 0
+
+    if args.command == "index":
+        mode = args.mode or "full"
+        if mode == "stream":
+            def show_progress(rows_done, rows_total, rows_per_sec):
+                print(f"{rows_done:,} / {rows_total:,} rows ({rows_per_sec:,.0f} rows/s)", file=sys.stderr)
+
+            summary = engine.index(args.catalog, mode="stream", on_progress=show_progress)
+        else:
+            summary = engine.index(pd.read_csv(args.catalog), mode=mode)
+        print(json.dumps(summary, default=str, indent=2))
+        return 0
+
+    quote_options = {
+        "engine": args.engine,
+        "explain": args.explain,
+        "use_price_model": not args.no_price_model,
+    }
+    if args.command == "quote":
+        part = {
+            "Part Description": args.description,
+            "Material": args.material,
+            "Size": args.size,
+            "Operations": args.operations,
+            "Finish": args.finish,
+        }
+        try:
+            result = engine.quote(
+                part, same_material=args.same_material,
+                volume_tolerance=args.volume_tolerance / 100 if args.volume_tolerance else None,
+                shards=args.shards, **quote_options
+            )
+        except NoReferenceError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        except ValueError as e:
+            print(f"Error: could not quote this part: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(result, default=str, indent=2))
+        return 0
+
+    rows = engine.quote_table(pd.read_csv(args.bom), **quote_options)
+    quoted = pd.DataFrame(rows)
+    quoted.to_csv(args.output or sys.stdout, index=False)
+    failed = int(quoted["Error"].notna().sum()) if "Error" in quoted.columns else 0
+    print(f"Quoted {len(quoted) - failed} parts; {failed} could not be quoted.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# src/dedup.py
+"""
+Ingest-time collapsing of duplicate catalog rows.
+
+ERP exports list the same part many times: identical rows, and near-identical
+ones whose sizes differ by a fraction of a millimetre. Rows are only compared
+within a bucket of the same normalized material, operations and finish. Two
+rows are near duplicates when every dimension is within the size tolerance
+and the embeddings of their descriptions, with sizes and other numbers
+masked, are within `max_distance` (cosine). Each group is indexed as one
+entry priced at the group's median, with the min/median/max of its prices and
+the number of rows it stands for.
+"""
+
+import hashlib
+import json
+import math
+import re
+import statistics
+
+try:
+    from .features import PartFeatures
+except ImportError:
+    from features import PartFeatures
+
+PRICE_COLUMN = "Target Price (CHF)"
+# Metadata of an entry that stands for several catalog rows
+GROUP_SIZE_KEY = "Group Size"
+PRICE_MIN_KEY = "Price Min (CHF)"
+PRICE_MEDIAN_KEY = "Price Median (CHF)"
+PRICE_MAX_KEY = "Price Max (CHF)"
+GROUP_KEYS = [GROUP_SIZE_KEY, PRICE_MIN_KEY, PRICE_MEDIAN_KEY, PRICE_MAX_KEY]
+
+_NUMBER = r'\d+(?:[.,]\d+)?'
+_UNIT = r'(?:\s*(?:mm|cm|m|inches|inch|in|")(?![a-z]))?'
+# A number or a size like "100 x 50 x 5 mm", with its unit
+_MEASURE = re.compile(rf'{_NUMBER}{_UNIT}(?:\s*[xX*×]\s*{_NUMBER}{_UNIT})*', re.IGNORECASE)
+
+
+class Deduplicator:
+    """
+    Groups the rows of a catalog into exact and near duplicates.
+
+    Dimensions match when they differ by at most max(min_size_tolerance_mm,
+    size_tolerance × the larger one); dimensions are compared sorted, so
+    "100x50x5" and "50x100x5" are the same part turned around.
+    """
+
+    def __init__(self, size_tolerance=0.01, min_size_tolerance_mm=0.5, max_distance=0.1):
+        self.size_tolerance = size_tolerance
+        self.min_size_tolerance_mm = min_size_tolerance_mm
+        self.max_distance = max_distance
+
+    @staticmethod
+    def bucket_key(row):
+        """
+        Normalized (material, operations, finish) of a row; only rows with the
+        same key can be near duplicates.
+        """
+        operations = sorted(
+            PartFeatures.normalize_label(op) for op in str(row.get("Operations") or "").split(",")
+            if op.strip()
+        )
+        return (
+            PartFeatures.normalize_label(row.get("Material")),
+            tuple(operations),
+            PartFeatures.normalize_label(row.get("Finish")),
+        )
+
+    @staticmethod
+    def comparison_text(description):
+        """
+        Description with sizes and other numbers masked and punctuation
+        spacing normalized, so only what the part is gets compared:
+        "Aluminum bracket, 100.2 x 50 x 5 mm" -> "aluminum bracket #".
+        """
+        masked = _MEASURE.sub("#", str(description or "").lower())
+        return " ".join(masked.replace(",", " ").replace(";", " ").split())
+
+    def close_sizes(self, a, b):
+        return all(self._within(x, y) for x, y in zip(a, b))
+
+    def groups(self, rows, ids, embed):
+        """
+        Groups `rows` (dicts with the part columns), where rows sharing an id
+        are exact duplicates, and returns lists of row positions, each led by
+        the group's representative. `embed(texts)` is called once, with the
+        distinct comparison texts of the rows that have a near-duplicate candidate.
+        """
+        # Exact duplicates: every position of an id; the latest row represents it
+        positions = {}
+        for position, id_ in enumerate(ids):
+            positions.setdefault(id_, []).append(position)
+        buckets = {}
+        singles = []
+        for id_, members in positions.items():
+            row = rows[members[-1]]
+            dims = PartFeatures.parse_dimensions(str(row.get("Size") or "").strip())
+            if dims is None:
+                singles.append([id_])
+            else:
+                buckets.setdefault(self.bucket_key(row), []).append((tuple(sorted(dims)), id_))
+
+        candidates = [entries for entries in buckets.values() if len(entries) > 1]
+        singles.extend([entries[0][1]] for entries in buckets.values() if len(entries) == 1)
+        texts = {
+            id_: self.comparison_text(rows[positions[id_][-1]].get("Part Description"))
+            for entries in candidates for _, id_ in entries
+        }
+        distinct = list(dict.fromkeys(texts.values()))
+        vectors = dict(zip(distinct, embed(distinct))) if distinct else {}
+
+        clusters = list(singles)
+        for entries in candidates:
+            clusters.extend(self._cluster(sorted(entries), {id_: vectors[texts[id_]] for _, id_ in entries}))
+        return [
+            [position for id_ in cluster for position in reversed(positions[id_])]
+            for cluster in clusters
+        ]
+
+    def _cluster(self, entries, vectors):
+        """
+        Leader clustering of (sorted dimensions, id) entries sorted by size: an
+        entry joins the first cluster whose leader is close enough in size and
+        embedding, else it leads a new one. Leaders are kept in size order, so
+        only those whose smallest dimension is within tolerance are compared.
+        """
+        import numpy as np
+
+        leaders, clusters = [], []
+        unit = {id_: _unit(vector) for id_, vector in vectors.items()}
+        start = 0
+        for dims, id_ in entries:
+            while start < len(leaders) and not self._within(leaders[start][0][0], dims[0]):
+                start += 1
+            for index in range(start, len(leaders)):
+                leader_dims, leader_id = leaders[index]
+                if self.close_sizes(leader_dims, dims) and \
+                        1.0 - float(np.dot(unit[leader_id], unit[id_])) <= self.max_distance:
+                    clusters[index].append(id_)
+                    break
+            else:
+                leaders.append((dims, id_))
+                clusters.append([id_])
+        return clusters
+
+    def _within(self, a, b):
+        return abs(a - b) <= max(self.min_size_tolerance_mm, self.size_tolerance * max(a, b))
+
+
+def price_stats(prices):
+    """
+    {"min", "median", "max"} of the numeric, positive prices, or None when there are none.
+    """
+    values = []
+    for price in prices:
+        try:
+            value = float(price)
+        except (TypeError, ValueError):
+            continue
+        if not math.isnan(value) and value > 0:
+            values.append(value)
+    if not values:
+        return None
+    return {
+        "min": _number(min(values)),
+        "median": _number(statistics.median(values)),
+        "max": _number(max(values)),
+    }
+
+
+def group_metadata(metadatas, fingerprint_key):
+    """
+    Metadata for a group of duplicate rows: the representative's (the first),
+    priced at the group's median, with the price statistics and group size,
+    and a fingerprint covering every member row.
+    """
+    if len(metadatas) == 1:
+        return dict(metadatas[0])
+    metadata = dict(metadatas[0])
+    stats = price_stats([meta.get(PRICE_COLUMN) for meta in metadatas])
+    if stats is not None:
+        metadata[PRICE_COLUMN] = stats["median"]
+        metadata[PRICE_MIN_KEY] = stats["min"]
+        metadata[PRICE_MEDIAN_KEY] = stats["median"]
+        metadata[PRICE_MAX_KEY] = stats["max"]
+    metadata[GROUP_SIZE_KEY] = len(metadatas)
+    payload = json.dumps(sorted(str(meta.get(fingerprint_key)) for meta in metadatas))
+    metadata[fingerprint_key] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return metadata
+
+
+def describe_group(metadata):
+    """
+    One-line summary of the prices behind a collapsed entry, e.g.
+    "Median of 3 near-identical parts (CHF 58–64)", or None for a single row.
+    """
+    size = metadata.get(GROUP_SIZE_KEY) or 1
+    if size <= 1:
+        return None
+    if PRICE_MIN_KEY not in metadata:
+        return f"{size} near-identical parts, none priced"
+    return f"Median of {size} near-identical parts (CHF {metadata[PRICE_MIN_KEY]}–{metadata[PRICE_MAX_KEY]})"
+
+
+def _unit(vector):
+    import numpy as np
+
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _number(value):
+    """
+    Whole prices stay ints, as in the source catalog.
+    """
+    return int(value) if float(value).is_integer() else round(float(value), 2)
@@ -1,19 +1,177 @@
 # src/embed_parts.py
 
-import chromadb
+import contextvars
 import hashlib
-import openai
+import heapq
+import json
 import os
-from dotenv import load_dotenv
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import tracing
+    from .batching import embed_in_batches
+    from .dedup import Deduplicator, group_metadata
+    from .embedding_backends import OpenAIEmbeddingBackend, get_backend
+    from .features import PartFeatures
+except ImportError:
+    import tracing
+    from batching import embed_in_batches
+    from dedup import Deduplicator, group_metadata
+    from embedding_backends import OpenAIEmbeddingBackend, get_backend
+    from features import PartFeatures
+
+
+# Metadata key holding a hash of the full source row, used by sync_dataframe
+FINGERPRINT_KEY = "row_fingerprint"
+# Bump when the stored metadata layout changes, so sync_dataframe rewrites old rows
+METADATA_VERSION = 2
+# Collection metadata recording which embedding backend produced the vectors
+BACKEND_KEY = "embedding_backend"
+DIMENSION_KEY = "embedding_dimension"
+# Collection metadata recording how the NumPy index compresses its vectors
+QUANTIZATION_KEY = "index_quantization"
+RERANK_KEY = "index_rerank"
+INDEX_BACKENDS = ("chroma", "numpy")
+# Shard collections are named "<collection_name>__<shard>"
+SHARD_SEPARATOR = "__"
+# Directory suffix of the PartStore kept next to a collection
+PART_STORE_SUFFIX = ".parts"
+# Columns that, with the description, identify a part (a price change keeps its id)
+ID_COLUMNS = ["Material", "Size", "Operations", "Finish"]
+
+
+# chromadb, numpy and pyarrow are imported when an index or store is opened,
+# not when this module is, so importing it (e.g. for FINGERPRINT_KEY) stays cheap
+
+def _chroma_client(chroma_dir):
+    import chromadb
+
+    return chromadb.PersistentClient(path=chroma_dir)
+
+
+def _numpy_index():
+    try:
+        from .numpy_index import NumpyIndex
+    except ImportError:
+        from numpy_index import NumpyIndex
+    return NumpyIndex
+
+
+def _part_store():
+    try:
+        from .part_store import PartStore
+    except ImportError:
+        from part_store import PartStore
+    return PartStore
 
-load_dotenv() 
 
 class PartEmbedder:
-    def __init__(self, chroma_dir, collection_name):
+    def __init__(self, chroma_dir, collection_name, embedding_cache=None,
+                 model="text-embedding-3-small", max_concurrency=4,
+                 max_batch_tokens=50_000, max_batch_size=512, max_retries=5,
+                 backend=None, client=None, index_backend="chroma", index_dtype="float32",
+                 part_store=False, dedup=None, dimensions=None, quantization=None, rerank=10):
         self.chroma_dir = chroma_dir
         self.collection_name = collection_name
-        self.client = chromadb.PersistentClient(path=chroma_dir)
-        self.collection = self.client.get_or_create_collection(collection_name)
+        # Embedding backend: an EmbeddingBackend, a registered name, or None for OpenAI.
+        # `dimensions` asks OpenAI for shortened vectors (or sets the hashing width)
+        if backend is None:
+            backend = OpenAIEmbeddingBackend(model, dimensions=dimensions)
+        elif isinstance(backend, str):
+            options = {"model": model} if backend == "openai" else {}
+            if dimensions:
+                options["dimensions" if backend == "openai" else "n_features"] = dimensions
+            backend = get_backend(backend, **options)
+        self.backend = backend
+        self.model = backend.model_id
+        # Optional EmbeddingCache; when set, only uncached texts hit the API
+        self.embedding_cache = embedding_cache
+        # Embedding requests are split into token-budgeted batches sent concurrently
+        self.max_concurrency = max_concurrency
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        # Vector index: a Chroma collection, or a memory-mapped NumpyIndex stored
+        # under chroma_dir/<collection_name>.npindex with vectors in `index_dtype`
+        if index_backend not in INDEX_BACKENDS:
+            raise ValueError(
+                f"Unknown index backend '{index_backend}'. Available: {', '.join(INDEX_BACKENDS)}"
+            )
+        self.index_backend = index_backend
+        # With `quantization` ("int8" or "binary"), the NumPy index scans compact
+        # codes and re-ranks the best rerank x k rows with their float vectors
+        if quantization and index_backend != "numpy":
+            raise ValueError("Quantized vectors need index_backend='numpy'.")
+        self.quantization = quantization or None
+        self.rerank = rerank
+        if index_backend == "numpy":
+            NumpyIndex = _numpy_index()
+            self.client = None
+            self.collection = NumpyIndex(
+                os.path.join(chroma_dir, f"{collection_name}.npindex"),
+                metadata=self.backend_metadata(),
+                dtype=index_dtype,
+                quantization=self.quantization,
+                rerank=rerank
+            )
+        else:
+            # Pass a shared `client` to re-use an already open Chroma database
+            self.client = client if client is not None else _chroma_client(chroma_dir)
+            self.collection = self.client.get_or_create_collection(
+                collection_name,
+                metadata=self.backend_metadata()
+            )
+        self.check_backend()
+        # With `part_store`, documents and full metadata go to a columnar PartStore
+        # (see part_store_path) and the index only keeps ids, vectors and the
+        # filter keys; query results are filled in from the store
+        self.store = (
+            _part_store()(part_store_path(chroma_dir, collection_name, index_backend))
+            if part_store else None
+        )
+        # With `dedup` (a Deduplicator, or True for the default thresholds), exact
+        # and near-duplicate rows are collapsed into one entry at ingest
+        self.dedup = Deduplicator() if dedup is True else dedup or None
+
+    def backend_metadata(self):
+        metadata = {BACKEND_KEY: self.backend.model_id}
+        if self.backend.dimension:
+            metadata[DIMENSION_KEY] = self.backend.dimension
+        if self.quantization:
+            metadata[QUANTIZATION_KEY] = self.quantization
+            metadata[RERANK_KEY] = self.rerank
+        return metadata
+
+    def check_backend(self):
+        """
+        Refuses to mix vectors from different backends in one collection.
+        Collections created before backends were recorded are tagged on first use.
+        The quantization can change freely (codes are rebuilt from the float
+        vectors), so it is only brought up to date.
+        """
+        stored = dict(self.collection.metadata or {})
+        if BACKEND_KEY not in stored:
+            stored.update(self.backend_metadata())
+            self.collection.modify(metadata=stored)
+            return
+        expected = self.backend_metadata()
+        for key in (BACKEND_KEY, DIMENSION_KEY):
+            if key in stored and key in expected and stored[key] != expected[key]:
+                raise ValueError(
+                    f"Collection '{self.collection_name}' was built with embedding backend "
+                    f"{stored.get(BACKEND_KEY)} (dimension {stored.get(DIMENSION_KEY)}), "
+                    f"but this embedder uses {expected.get(BACKEND_KEY)} "
+                    f"(dimension {expected.get(DIMENSION_KEY)})."
+                )
+        if any(stored.get(key) != expected.get(key) for key in (QUANTIZATION_KEY, RERANK_KEY)):
+            for key in (QUANTIZATION_KEY, RERANK_KEY):
+                stored.pop(key, None)
+                if key in expected:
+                    stored[key] = expected[key]
+            self.collection.modify(metadata=stored)
     
     def row_to_embedding_text(self,row):
     # Join with clear labels for each field for LLM-style embeddings
@@ -26,50 +184,603 @@ class PartEmbedder:
         )
 
     @staticmethod
-    def get_embeddings(texts, model="text-embedding-3-small"):
+    def get_embeddings(texts, model="text-embedding-3-small", dimensions=None):
         """
-        Get embeddings for a list of texts (batch mode).
+        Get embeddings for a list of texts (batch mode) from the OpenAI API.
         """
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        if not openai.api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set!")
+        return OpenAIEmbeddingBackend(model, dimensions=dimensions).embed(texts)
 
-        try:
-            response = openai.embeddings.create(
-                input=texts,
-                model=model
-            )
-            return [item.embedding for item in response.data]
-        except Exception as e:
-            print(f"Error generating batch embeddings.\nError: {e}")
-            raise
+    def embed_uncached(self, texts):
+        """
+        Embeds texts with the configured backend, bypassing the cache.
+        """
+        if isinstance(self.backend, OpenAIEmbeddingBackend):
+            # Routed through get_embeddings so the remote call can be swapped out
+            if self.backend.dimensions:
+                return self.get_embeddings(texts, model=self.backend.model, dimensions=self.backend.dimensions)
+            return self.get_embeddings(texts, model=self.backend.model)
+        return self.backend.embed(texts)
     
+    def embed_batches(self, texts, on_batch):
+        """
+        Embeds `texts` and calls on_batch(indices, embeddings) for each group of
+        results as it becomes available: cached vectors first, then every API
+        batch as soon as it completes.
+        """
+        if not texts:
+            return
+        if self.embedding_cache is None:
+            cached = [None] * len(texts)
+        else:
+            cached = self.embedding_cache.get_many(self.model, texts)
+            hit_indices = [i for i, emb in enumerate(cached) if emb is not None]
+            tracing.add("embedding_cache_hits", len(hit_indices))
+            for start in range(0, len(hit_indices), self.max_batch_size):
+                indices = hit_indices[start:start + self.max_batch_size]
+                on_batch(indices, [cached[i] for i in indices])
+
+        # Identical texts are only sent once
+        positions = {}
+        for i, emb in enumerate(cached):
+            if emb is None:
+                positions.setdefault(texts[i], []).append(i)
+        if not positions:
+            return
+        unique_texts = list(positions)
+
+        def handle_batch(batch_indices, embeddings):
+            batch_texts = [unique_texts[i] for i in batch_indices]
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(self.model, batch_texts, embeddings)
+            indices, vectors = [], []
+            for text, emb in zip(batch_texts, embeddings):
+                for i in positions[text]:
+                    indices.append(i)
+                    vectors.append(emb)
+            on_batch(indices, vectors)
+
+        embed_in_batches(
+            unique_texts,
+            self.embed_uncached,
+            handle_batch,
+            max_concurrency=self.max_concurrency,
+            max_tokens=self.max_batch_tokens,
+            max_items=self.max_batch_size,
+            max_retries=self.max_retries,
+        )
+
+    def embed_texts(self, texts):
+        """
+        Get embeddings for a list of texts, calling the API only for texts
+        that are not already in the embedding cache.
+        """
+        embeddings = [None] * len(texts)
+
+        def collect(indices, vectors):
+            for i, emb in zip(indices, vectors):
+                embeddings[i] = emb
+
+        self.embed_batches(texts, collect)
+        return embeddings
+
     @staticmethod
     def generate_id(row):
-        text = row["Part Description"]
-        return hashlib.md5(text.encode("utf-8")).hexdigest()
+        """
+        Hash of the description and the normalized part columns, so distinct
+        parts sharing a description no longer overwrite each other.
+        """
+        values = [str(row["Part Description"])]
+        values += [PartFeatures.normalize_label(row.get(col)) for col in ID_COLUMNS]
+        return hashlib.md5(json.dumps(values).encode("utf-8")).hexdigest()
 
-    
-    def process_dataframe(self, df):
-        if df.empty:
-            return
-        # Compose rich strings for embedding input
+    @staticmethod
+    def row_fingerprint(row):
+        """
+        Hash of every column of the row (not just the description), so a price
+        or finish change is detected on its own.
+        """
+        values = {str(k): str(v) for k, v in row.items()}
+        payload = json.dumps([METADATA_VERSION, values], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def prepare_rows(self, df):
+        """
+        Returns (ids, documents, metadatas) for the rows of `df`.
+        """
         documents = [self.row_to_embedding_text(row) for _, row in df.iterrows()]
         ids = [self.generate_id(row) for _, row in df.iterrows()]
-        # Keep metadatas as before
+        # Keep metadatas as before, plus the row fingerprint and the engineered
+        # features, computed once here so queries can filter on them
         metadatas = df.drop(columns=["Part Description"]).to_dict(orient='records')
-        embeddings = self.get_embeddings(documents)
-        self.collection.upsert(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
-        )
+        features = PartFeatures.feature_frame(df).to_dict(orient='records')
+        for meta, feats, (_, row) in zip(metadatas, features, df.iterrows()):
+            meta.update(PartFeatures.index_metadata(feats))
+            meta[FINGERPRINT_KEY] = self.row_fingerprint(row)
+        return ids, documents, metadatas
 
-    def query(self, query_text, n_results=1):
-        emb = self.get_embeddings([query_text])[0]   # <-- Extract just the single embedding
-        return self.collection.query(
-            query_embeddings=[emb],
-            n_results=n_results
+    def collapse_rows(self, df, ids, documents, metadatas):
+        """
+        With `dedup`, merges the exact and near-duplicate rows of `df` into one
+        entry per group (see Deduplicator). Returns (ids, documents, metadatas).
+        """
+        if self.dedup is None:
+            return ids, documents, metadatas
+        groups = self.dedup.groups(df.to_dict(orient="records"), ids, self.embed_texts)
+        tracing.add("rows_collapsed", len(ids) - len(groups))
+        return (
+            [ids[group[0]] for group in groups],
+            [documents[group[0]] for group in groups],
+            [group_metadata([metadatas[i] for i in group], FINGERPRINT_KEY) for group in groups],
         )
 
+    def upsert_rows(self, ids, documents, metadatas):
+        """
+        Embeds `documents` and upserts each batch as soon as its embeddings arrive.
+        """
+        def upsert(indices, embeddings):
+            batch_ids = [ids[i] for i in indices]
+            with tracing.span("index.upsert", rows=len(indices)):
+                if self.store is None:
+                    self.collection.upsert(
+                        ids=batch_ids,
+                        embeddings=embeddings,
+                        documents=[documents[i] for i in indices],
+                        metadatas=[metadatas[i] for i in indices]
+                    )
+                    return
+                # The index first: a row that is indexed but not yet stored is
+                # re-added by the next sync, since sync reads the store
+                self.collection.upsert(
+                    ids=batch_ids,
+                    embeddings=embeddings,
+                    metadatas=[filter_metadata(metadatas[i]) for i in indices]
+                )
+                self.store.upsert(
+                    batch_ids,
+                    [documents[i] for i in indices],
+                    [metadatas[i] for i in indices]
+                )
+
+        with tracing.span("index.embed_and_upsert", rows=len(ids)):
+            self.embed_batches(documents, upsert)
+
+    def process_dataframe(self, df):
+        if df.empty:
+            return
+        with tracing.span("index.dataframe", rows=len(df)):
+            # Compose rich strings for embedding input
+            with tracing.span("index.prepare", rows=len(df)):
+                ids, documents, metadatas = self.prepare_rows(df)
+            if self.dedup is not None:
+                with tracing.span("index.dedup", rows=len(df)):
+                    ids, documents, metadatas = self.collapse_rows(df, ids, documents, metadatas)
+            self.upsert_rows(ids, documents, metadatas)
+
+    def iter_metadatas(self, page_size=10_000):
+        """
+        Yields (id, metadata) for everything in the collection, read in pages.
+        """
+        if self.store is not None:
+            for id_, _, meta in self.store.iter_rows(page_size):
+                yield id_, meta
+        offset = 0
+        while True:
+            if self.store is None:
+                page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                rows = zip(page["ids"], page["metadatas"])
+            else:
+                # Rows indexed before the store was enabled still carry their metadata
+                page = self.collection.get(include=[], limit=page_size, offset=offset)
+                legacy = [id_ for id_ in page["ids"] if id_ not in self.store]
+                # get(ids=...) returns rows in storage order, not the order asked for
+                rows = []
+                if legacy:
+                    found = self.collection.get(ids=legacy, include=["metadatas"])
+                    rows = zip(found["ids"], found["metadatas"])
+            for id_, meta in rows:
+                yield id_, meta or {}
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+    def stored_fingerprints(self, page_size=10_000):
+        """
+        Returns {id: row fingerprint} for everything in the collection, read in pages.
+        """
+        return {id_: meta.get(FINGERPRINT_KEY) for id_, meta in self.iter_metadatas(page_size)}
+
+    def sync_dataframe(self, df, prune=True, on_changed=None):
+        """
+        Incrementally brings the collection in line with `df`: only new or changed
+        rows are embedded and upserted, and (with `prune`) parts that are no longer
+        in `df` are deleted. Returns counts of added, updated, unchanged and deleted rows.
+        `on_changed(ids)` is called with the ids of updated and deleted parts,
+        e.g. to evict quotes that used them as reference.
+        """
+        with tracing.span("index.fingerprints"):
+            stored = self.stored_fingerprints()
+        if df.empty:
+            ids, documents, metadatas = [], [], []
+        else:
+            with tracing.span("index.prepare", rows=len(df)):
+                ids, documents, metadatas = self.prepare_rows(df)
+            if self.dedup is not None:
+                with tracing.span("index.dedup", rows=len(df)):
+                    ids, documents, metadatas = self.collapse_rows(df, ids, documents, metadatas)
+
+        # Later rows win when several rows map to the same id
+        latest = {id_: i for i, id_ in enumerate(ids)}
+        summary = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        changed, replaced = [], []
+        for id_, i in latest.items():
+            if id_ not in stored:
+                summary["added"] += 1
+                changed.append(i)
+            elif stored[id_] != metadatas[i][FINGERPRINT_KEY]:
+                summary["updated"] += 1
+                changed.append(i)
+                replaced.append(id_)
+            else:
+                summary["unchanged"] += 1
+
+        if changed:
+            self.upsert_rows(
+                [ids[i] for i in changed],
+                [documents[i] for i in changed],
+                [metadatas[i] for i in changed]
+            )
+
+        stale = []
+        if prune:
+            stale = [id_ for id_ in stored if id_ not in latest]
+            with tracing.span("index.delete", rows=len(stale)):
+                for start in range(0, len(stale), self.max_batch_size):
+                    self.collection.delete(ids=stale[start:start + self.max_batch_size])
+                if self.store is not None:
+                    self.store.delete(stale)
+            summary["deleted"] = len(stale)
+        if on_changed is not None and (replaced or stale):
+            on_changed(replaced + stale)
+        return summary
+
+    @staticmethod
+    def build_filter(material=None, volume_mm3=None, volume_tolerance=None,
+                     size_label=None, finish=None):
+        """
+        Builds a Chroma `where` clause from structured constraints, e.g. the same
+        material and a volume within ±volume_tolerance (0.2 = ±20%) of `volume_mm3`.
+        Returns None when there is nothing to filter on.
+        """
+        conditions = []
+        if material:
+            conditions.append({"Material_Norm": {"$eq": PartFeatures.normalize_label(material)}})
+        if finish:
+            conditions.append({"Finish_Norm": {"$eq": PartFeatures.normalize_label(finish)}})
+        if size_label:
+            conditions.append({"Size_Label": {"$eq": size_label}})
+        if volume_mm3 is not None and volume_tolerance is not None:
+            conditions.append({"Volume_mm3": {"$gte": float(volume_mm3) * (1 - volume_tolerance)}})
+            conditions.append({"Volume_mm3": {"$lte": float(volume_mm3) * (1 + volume_tolerance)}})
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def query(self, query_text, n_results=1, where=None):
+        with tracing.span("query.embedding"):
+            emb = self.embed_texts([query_text])[0]   # <-- Extract just the single embedding
+        return self.search([emb], n_results=n_results, where=where)
+
+    def query_many(self, query_texts, n_results=1, where=None):
+        """
+        Looks up the nearest parts for many texts at once: one batched embedding
+        call and a single multi-embedding index query.
+        """
+        if not query_texts:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with tracing.span("query.embedding", texts=len(query_texts)):
+            embeddings = self.embed_texts(query_texts)
+        return self.search(embeddings, n_results=n_results, where=where)
+
+    def search(self, embeddings, n_results=1, where=None):
+        """
+        Index query for already computed embeddings. With a PartStore, the index
+        returns only ids and distances and the documents and metadata of the
+        hits are looked up in the store.
+        """
+        with tracing.span("query.index", n_results=n_results, filtered=where is not None):
+            if self.store is None:
+                return self.collection.query(
+                    query_embeddings=embeddings,
+                    n_results=n_results,
+                    where=where
+                )
+            result = self.collection.query(
+                query_embeddings=embeddings,
+                n_results=n_results,
+                where=where,
+                include=["distances"]
+            )
+        with tracing.span("query.store"):
+            return self.hydrate(result)
+
+    def hydrate(self, result):
+        """
+        Fills in "documents" and "metadatas" of an ids-only query result from the store.
+        """
+        hit_ids = [id_ for ids in result["ids"] for id_ in ids]
+        documents, metadatas = self.store.get(hit_ids)
+        missing = [id_ for id_, meta in zip(hit_ids, metadatas) if meta is None]
+        if missing:
+            # Rows indexed before the store was enabled
+            legacy = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            found = dict(zip(legacy["ids"], zip(legacy["documents"], legacy["metadatas"])))
+            for i, id_ in enumerate(hit_ids):
+                if metadatas[i] is None and id_ in found:
+                    documents[i], metadatas[i] = found[id_]
+        hydrated = {"ids": result["ids"], "distances": result["distances"], "documents": [], "metadatas": []}
+        position = 0
+        for ids in result["ids"]:
+            hydrated["documents"].append(documents[position:position + len(ids)])
+            hydrated["metadatas"].append(metadatas[position:position + len(ids)])
+            position += len(ids)
+        return hydrated
+
+
+def part_store_path(chroma_dir, collection_name, index_backend="chroma"):
+    """
+    Directory of the PartStore kept with a collection: chroma_dir/<collection_name>.parts
+    for Chroma, and inside the index directory for NumPy, so that the two
+    backends never share (or prune) one store.
+    """
+    if index_backend == "numpy":
+        return os.path.join(chroma_dir, f"{collection_name}.npindex", "parts")
+    return os.path.join(chroma_dir, f"{collection_name}{PART_STORE_SUFFIX}")
+
+
+def filter_metadata(metadata):
+    """
+    The part of a row's metadata the vector index needs for `where` filters
+    when the full row lives in a PartStore.
+    """
+    return {key: metadata[key] for key in PartFeatures.INDEX_KEYS if key in metadata}
+
+
+class ShardedPartEmbedder:
+    """
+    Splits the catalog over independent named shards (e.g. one per customer,
+    material family or year), each its own collection "<collection_name>__<shard>"
+    with its own PartEmbedder. Shards are indexed, synced and rebuilt on their
+    own, so rebuilding one never touches the others.
+
+    Rows are routed to a shard by the `shard_by` column (its values become shard
+    names via shard_key) unless a shard is named explicitly. Queries embed the
+    text once, search the selected shards (all by default) concurrently on a
+    thread pool and merge the per-shard top-k by distance; results have the
+    Chroma shape plus a "shards" list naming the shard of every hit.
+    Every shard uses the same embedding and index backend, so distances compare.
+    """
+
+    def __init__(self, chroma_dir, collection_name, shard_by=None, max_workers=8,
+                 index_backend="chroma", client=None, **embedder_options):
+        if index_backend not in INDEX_BACKENDS:
+            raise ValueError(
+                f"Unknown index backend '{index_backend}'. Available: {', '.join(INDEX_BACKENDS)}"
+            )
+        self.chroma_dir = chroma_dir
+        self.collection_name = collection_name
+        self.shard_by = shard_by
+        self.max_workers = max_workers
+        self.index_backend = index_backend
+        if index_backend == "chroma" and client is None:
+            client = _chroma_client(chroma_dir)
+        self.client = client
+        self.embedder_options = embedder_options
+        self.embedding_cache = embedder_options.get("embedding_cache")
+        self._shards = {}
+        self._lock = threading.RLock()
+        self._pool = None
+        # One backend instance shared by every shard
+        self._template = None
+
+    build_filter = staticmethod(PartEmbedder.build_filter)
+
+    @staticmethod
+    def shard_key(value):
+        """
+        Shard name for a column value: lower-case letters, digits, ".", "_" and
+        "-" only ("ACME Corp." -> "acme-corp"); "default" for empty values.
+        """
+        key = re.sub(r"[^a-z0-9._-]+", "-", str(value).strip().lower()).strip("-._")
+        return key or "default"
+
+    def collection_for(self, shard):
+        if shard != self.shard_key(shard):
+            raise ValueError(f"Invalid shard name '{shard}'; use ShardedPartEmbedder.shard_key(value)")
+        return f"{self.collection_name}{SHARD_SEPARATOR}{shard}"
+
+    def shard(self, name):
+        """
+        The PartEmbedder of shard `name`, created (empty) on first use.
+        """
+        with self._lock:
+            if name not in self._shards:
+                options = dict(self.embedder_options)
+                if self._template is not None:
+                    options["backend"] = self._template.backend
+                self._shards[name] = PartEmbedder(
+                    chroma_dir=self.chroma_dir,
+                    collection_name=self.collection_for(name),
+                    client=self.client,
+                    index_backend=self.index_backend,
+                    **options
+                )
+                self._template = self._template or self._shards[name]
+            return self._shards[name]
+
+    def shard_names(self):
+        """
+        Names of every shard stored under this collection name, sorted.
+        """
+        prefix = f"{self.collection_name}{SHARD_SEPARATOR}"
+        if self.index_backend == "numpy":
+            names = [
+                entry[:-len(".npindex")] for entry in os.listdir(self.chroma_dir)
+                if entry.endswith(".npindex")
+            ] if os.path.isdir(self.chroma_dir) else []
+        else:
+            names = [c.name for c in self.client.list_collections()]
+        with self._lock:
+            names += [self.collection_for(name) for name in self._shards]
+        return sorted({name[len(prefix):] for name in names if name.startswith(prefix)})
+
+    def drop_shard(self, name):
+        """
+        Deletes shard `name` and everything indexed in it.
+        """
+        with self._lock:
+            embedder = self._shards.pop(name, None)
+            collection_name = self.collection_for(name)
+            if self.index_backend == "numpy":
+                shutil.rmtree(os.path.join(self.chroma_dir, f"{collection_name}.npindex"), ignore_errors=True)
+            elif collection_name in [c.name for c in self.client.list_collections()]:
+                self.client.delete_collection(collection_name)
+            shutil.rmtree(part_store_path(self.chroma_dir, collection_name, self.index_backend),
+                          ignore_errors=True)
+            if embedder is not None and embedder is self._template:
+                self._template = next(iter(self._shards.values()), embedder)
+
+    def split(self, df, shard=None):
+        """
+        Yields (shard name, rows of `df` for that shard).
+        """
+        if shard is not None:
+            yield shard, df
+            return
+        if self.shard_by is None:
+            raise ValueError("Pass a shard name, or create the embedder with shard_by=<column>")
+        if self.shard_by not in df.columns:
+            raise KeyError(self.shard_by)
+        keys = df[self.shard_by].map(self.shard_key)
+        for name, rows in df.groupby(keys, sort=True):
+            yield name, rows
+
+    def process_dataframe(self, df, shard=None):
+        if df.empty:
+            return
+        for name, rows in self.split(df, shard):
+            with tracing.span("index.shard", shard=name):
+                self.shard(name).process_dataframe(rows)
+
+    def sync_dataframe(self, df, prune=True, shard=None, on_changed=None):
+        """
+        Syncs each shard that has rows in `df` (see PartEmbedder.sync_dataframe);
+        pruning only removes parts from those shards. Returns the summed counts.
+        """
+        summary = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        parts = list(self.split(df, shard)) if not df.empty or shard is not None else []
+        for name, rows in parts:
+            with tracing.span("index.shard", shard=name):
+                for key, value in self.shard(name).sync_dataframe(rows, prune=prune, on_changed=on_changed).items():
+                    summary[key] += value
+        return summary
+
+    def rebuild_shard(self, name, df):
+        """
+        Replaces the contents of shard `name` with `df`, leaving other shards alone.
+        """
+        self.drop_shard(name)
+        self.process_dataframe(df, shard=name)
+
+    def iter_metadatas(self, page_size=10_000):
+        for name in self.shard_names():
+            yield from self.shard(name).iter_metadatas(page_size)
+
+    def stored_fingerprints(self, page_size=10_000):
+        return {id_: meta.get(FINGERPRINT_KEY) for id_, meta in self.iter_metadatas(page_size)}
+
+    def row_to_embedding_text(self, row):
+        return PartEmbedder.row_to_embedding_text(self, row)
+
+    def embed_texts(self, texts):
+        """
+        Embeds texts with the (shared) backend and cache of the shards.
+        """
+        with self._lock:
+            template = self._template
+        if template is None:
+            names = self.shard_names()
+            if not names:
+                raise ValueError(f"No shards of '{self.collection_name}' have been indexed yet")
+            template = self.shard(names[0])
+        return template.embed_texts(texts)
+
+    def query(self, query_text, n_results=1, where=None, shards=None):
+        return self.query_many([query_text], n_results=n_results, where=where, shards=shards)
+
+    def query_many(self, query_texts, n_results=1, where=None, shards=None):
+        """
+        Nearest parts for every text across `shards` (default: all shards).
+        """
+        empty = {"ids": [], "documents": [], "metadatas": [], "distances": [], "shards": []}
+        if not query_texts:
+            return empty
+        # Unknown shard names are skipped rather than created
+        existing = self.shard_names()
+        names = existing if shards is None else [name for name in shards if name in existing]
+        if not names:
+            return {key: [[] for _ in query_texts] for key in empty}
+        with tracing.span("query.embedding", texts=len(query_texts)):
+            embeddings = self.embed_texts(query_texts)
+
+        def search(name):
+            with tracing.span("query.shard", shard=name):
+                embedder = self.shard(name)
+                if not embedder.collection.count():
+                    return name, None
+                return name, embedder.search(embeddings, n_results=n_results, where=where)
+
+        with tracing.span("query.fanout", shards=len(names), n_results=n_results):
+            if len(names) == 1:
+                results = [search(names[0])]
+            else:
+                pool = self._executor()
+                results = list(pool.map(lambda name, ctx: ctx.run(search, name),
+                                        names, [contextvars.copy_context() for _ in names]))
+            return merge_results(results, len(query_texts), n_results)
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_workers),
+                                                thread_name_prefix="shard-query")
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+def merge_results(shard_results, n_queries, n_results):
+    """
+    Merges per-shard query results [(shard, result or None), ...] into one
+    Chroma-shaped result holding the n_results closest hits per query.
+    """
+    merged = {"ids": [], "documents": [], "metadatas": [], "distances": [], "shards": []}
+    for q in range(n_queries):
+        hits = []
+        for name, result in shard_results:
+            if result is None:
+                continue
+            for rank, id_ in enumerate(result["ids"][q]):
+                hits.append((result["distances"][q][rank], name, rank, result, id_))
+        best = heapq.nsmallest(n_results, hits, key=lambda hit: (hit[0], hit[1], hit[2]))
+        merged["ids"].append([id_ for _, _, _, _, id_ in best])
+        merged["documents"].append([result["documents"][q][rank] for _, _, rank, result, _ in best])
+        merged["metadatas"].append([result["metadatas"][q][rank] for _, _, rank, result, _ in best])
+        merged["distances"].append([distance for distance, _, _, _, _ in best])
+        merged["shards"].append([name for _, name, _, _, _ in best])
+    return merged
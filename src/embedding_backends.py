@@ -0,0 +1,129 @@
+# src/embedding_backends.py
+
+import logging
+import os
+
+try:
+    from . import tracing
+    from .openai_client import get_openai_client
+except ImportError:
+    import tracing
+    from openai_client import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "openai"
+
+
+class EmbeddingBackend:
+    """
+    Interface for the code that turns texts into vectors.
+
+    `model_id` names the backend and its settings (it is part of embedding
+    cache keys and is recorded on every collection), and `dimension` is the
+    vector length, or None when it is only known after the first call.
+    """
+    name = None
+    model_id = None
+    dimension = None
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """
+    Remote embeddings from the OpenAI API.
+    """
+    name = "openai"
+    DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+
+    # Models that return shortened vectors when asked for fewer `dimensions`
+    SHORTENABLE = ("text-embedding-3-small", "text-embedding-3-large")
+
+    def __init__(self, model="text-embedding-3-small", dimensions=None):
+        if dimensions is not None:
+            if model not in self.SHORTENABLE:
+                raise ValueError(f"Model '{model}' does not support reduced dimensions.")
+            if not 0 < dimensions <= self.DIMENSIONS[model]:
+                raise ValueError(
+                    f"dimensions must be between 1 and {self.DIMENSIONS[model]} for '{model}', got {dimensions}."
+                )
+            if dimensions == self.DIMENSIONS[model]:
+                dimensions = None
+        self.model = model
+        # Requested vector length (None: the model's full length)
+        self.dimensions = dimensions
+        # Kept as the bare model name so existing embedding caches stay valid;
+        # shortened vectors are different vectors, so they get their own id
+        self.model_id = model if dimensions is None else f"{model}@{dimensions}"
+        self.dimension = dimensions or self.DIMENSIONS.get(model)
+
+    def embed(self, texts):
+        client = get_openai_client()
+        try:
+            response = client.embeddings.create(
+                input=texts,
+                model=self.model,
+                **({"dimensions": self.dimensions} if self.dimensions else {})
+            )
+            usage = getattr(response, "usage", None)
+            tracing.record_usage(self.model, prompt_tokens=getattr(usage, "prompt_tokens", None) or 0)
+            return [item.embedding for item in response.data]
+        except Exception as e:
+            logger.warning("Error generating batch embeddings: %s", e)
+            raise
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Fully local CPU embeddings: character n-grams hashed into a fixed number of
+    features with scikit-learn's HashingVectorizer, L2-normalized. Needs no
+    fitting, no network and no model download, so it works on air-gapped machines.
+    """
+    name = "hashing"
+
+    def __init__(self, n_features=1024, ngram_range=(2, 4)):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.model_id = f"hashing-char_wb-{self.ngram_range[0]}-{self.ngram_range[1]}-{n_features}"
+        self.dimension = n_features
+        self._vectorizer = HashingVectorizer(
+            analyzer="char_wb",
+            ngram_range=self.ngram_range,
+            n_features=n_features,
+            alternate_sign=False,
+            norm="l2",
+            lowercase=True,
+        )
+
+    def embed(self, texts):
+        matrix = self._vectorizer.transform(texts)
+        return matrix.toarray().astype("float32").tolist()
+
+
+BACKENDS = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend,
+}
+
+
+def get_backend(name=None, **options):
+    """
+    Builds the embedding backend called `name`; defaults to the
+    EMBEDDING_BACKEND environment variable, then "openai".
+    """
+    name = name or os.getenv("EMBEDDING_BACKEND") or DEFAULT_BACKEND
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown embedding backend '{name}'. Available: {', '.join(sorted(BACKENDS))}"
+        ) from None
+    return backend_cls(**options)
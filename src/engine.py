@@ -0,0 +1,300 @@
+# src/engine.py
+"""
+The quoting engine behind the Streamlit app, the CLI and the HTTP service.
+
+QuotingEngine holds the settings the app used to keep as module constants
+(where the index and caches live, which embedding and index backends to use)
+and exposes indexing and quoting as plain method calls. The embedder, caches,
+price model and OpenAI client come from `resources`, so they are opened once
+per process and stay warm across calls.
+"""
+
+import math
+import os
+
+from dotenv import load_dotenv
+
+try:
+    from . import resources, tracing
+    from .dedup import describe_group
+    from .features import PartFeatures
+    from .ingest import stream_ingest
+    from .quoting import LLM_ENGINE, MODEL_VERSION_KEY, RULES_ENGINE, quote_part, quote_parts
+except ImportError:
+    import resources
+    import tracing
+    from dedup import describe_group
+    from features import PartFeatures
+    from ingest import stream_ingest
+    from quoting import LLM_ENGINE, MODEL_VERSION_KEY, RULES_ENGINE, quote_part, quote_parts
+
+INDEX_MODES = ("full", "sync", "stream")
+
+
+class NoReferenceError(LookupError):
+    """
+    Raised when the index has no part to quote against.
+    """
+
+
+class QuotingEngine:
+    """
+    Indexing and quoting against one catalog index under `data_dir`.
+
+    The defaults match the app: Chroma index, OpenAI embeddings, documents in
+    the PartStore sidecar and duplicate rows collapsed. from_env() reads the
+    same environment variables the app always has.
+    """
+
+    def __init__(self, data_dir="data", embedding_backend="openai", index_backend="chroma",
+                 shard_by=None, part_store=True, dedup=True, breakdown_rules_path=None,
+                 embedding_dimensions=None, quantization=None):
+        self.data_dir = data_dir
+        # "openai" or "hashing" for fully local, offline embeddings
+        self.embedding_backend = embedding_backend
+        # "chroma", or "numpy" for the in-process memory-mapped index
+        self.index_backend = index_backend
+        # Optional column (e.g. "Customer") whose values split the catalog into shards
+        self.shard_by = shard_by or None
+        self.part_store = part_store
+        self.dedup = dedup
+        # Optional JSON file overriding the breakdown weight tables (see src/breakdown.py)
+        self.breakdown_rules_path = breakdown_rules_path
+        # Shorter embeddings (e.g. 512 instead of 1536), and "int8" or "binary"
+        # codes scanned by the numpy index before an exact re-rank
+        self.embedding_dimensions = embedding_dimensions or None
+        self.quantization = quantization or None
+
+        # Vectors from different backends (or lengths) must never share a collection
+        self.collection_name = (
+            "parts_db" if embedding_backend == "openai" else f"parts_db_{embedding_backend}"
+        )
+        if self.embedding_dimensions:
+            self.collection_name += f"_d{self.embedding_dimensions}"
+        self.chroma_dir = os.path.join(data_dir, "chroma_db")
+        # Embeddings already computed for unchanged rows are re-used from here
+        self.embedding_cache_path = os.path.join(data_dir, "embedding_cache.sqlite")
+        # AI-computed breakdowns for identical features and reference part are answered from here
+        self.quote_cache_path = os.path.join(data_dir, "quote_cache.sqlite")
+        # Phase-2 price model, retrained after indexing whenever the catalog changed
+        self.price_model_path = os.path.join(
+            data_dir, "price_models", f"{self.collection_name}_{index_backend}.joblib"
+        )
+        # Progress of streaming ingests, so a cancelled run resumes where it stopped
+        self.ingest_checkpoint_path = os.path.join(
+            data_dir, "ingest_checkpoints",
+            f"{self.collection_name}.json" if index_backend == "chroma"
+            else f"{self.collection_name}_{index_backend}.json"
+        )
+
+    @classmethod
+    def from_env(cls, data_dir=None):
+        """
+        Engine configured from EMBEDDING_BACKEND, EMBEDDING_DIMENSIONS,
+        INDEX_BACKEND, INDEX_QUANTIZATION, SHARD_BY, PART_STORE, DEDUP,
+        BREAKDOWN_RULES and QUOTING_DATA_DIR, which may also be set in a .env file.
+        """
+        load_dotenv()
+        return cls(
+            data_dir=data_dir or os.getenv("QUOTING_DATA_DIR", "data"),
+            embedding_backend=os.getenv("EMBEDDING_BACKEND", "openai"),
+            index_backend=os.getenv("INDEX_BACKEND", "chroma"),
+            shard_by=os.getenv("SHARD_BY") or None,
+            part_store=os.getenv("PART_STORE", "1") != "0",
+            dedup=os.getenv("DEDUP", "1") != "0",
+            breakdown_rules_path=os.getenv("BREAKDOWN_RULES"),
+            embedding_dimensions=int(os.getenv("EMBEDDING_DIMENSIONS") or 0) or None,
+            quantization=os.getenv("INDEX_QUANTIZATION") or None,
+        )
+
+    # ---------- shared resources ----------
+
+    def embedder(self):
+        return resources.get_embedder(
+            self.chroma_dir, self.collection_name,
+            backend=self.embedding_backend,
+            embedding_cache_path=self.embedding_cache_path,
+            index_backend=self.index_backend,
+            shard_by=self.shard_by,
+            part_store=self.part_store,
+            dedup=self.dedup,
+            dimensions=self.embedding_dimensions,
+            quantization=self.quantization
+        )
+
+    def price_model(self):
+        return resources.get_price_model(self.price_model_path)
+
+    def quote_cache(self):
+        return resources.get_quote_cache(self.quote_cache_path)
+
+    def rules(self):
+        return resources.get_breakdown_rules(self.breakdown_rules_path)
+
+    def warm_up(self):
+        """
+        Opens the index, caches and price model now instead of on the first request.
+        """
+        self.embedder()
+        self.quote_cache()
+        self.rules()
+        self.price_model()
+
+    # ---------- indexing ----------
+
+    def index(self, source, mode="full", on_progress=None):
+        """
+        Indexes a catalog and retrains the price model if the catalog changed.
+
+        `source` is a DataFrame, or for mode "stream" a CSV path or binary file
+        read chunk by chunk (resumable, see ingest.stream_ingest). Mode "sync"
+        only re-embeds new or changed rows and removes parts missing from
+        `source`. Returns a summary dict.
+        """
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode '{mode}'. Available: {', '.join(INDEX_MODES)}")
+        with tracing.span("index", mode=mode):
+            embedder = self.embedder()
+            if mode == "stream":
+                summary = stream_ingest(
+                    embedder, source,
+                    checkpoint_path=self.ingest_checkpoint_path,
+                    on_progress=on_progress
+                )
+            elif mode == "sync":
+                # Quotes anchored to updated or deleted parts can no longer be served
+                summary = dict(
+                    embedder.sync_dataframe(source, on_changed=self.quote_cache().invalidate_references),
+                    rows=len(source)
+                )
+            else:
+                embedder.process_dataframe(source)
+                summary = {"rows": len(source)}
+            price_model = resources.refresh_price_model(embedder, self.price_model_path)
+        summary["mode"] = mode
+        summary["price_model_version"] = price_model.version if price_model is not None else None
+        summary["price_model_rows"] = price_model.trained_rows if price_model is not None else 0
+        return summary
+
+    # ---------- quoting ----------
+
+    def quote(self, part, engine=RULES_ENGINE, explain=False, same_material=False,
+              volume_tolerance=None, use_price_model=True, shards=None,
+              on_update=None, usage=None):
+        """
+        Quotes one part (a dict with Part Description, Material, Size,
+        Operations and Finish) against its most similar indexed part.
+
+        `same_material` and `volume_tolerance` (0.2 = ±20% volume) restrict the
+        reference search, `shards` limits it to some shards of a sharded index.
+        See quoting.quote_part for `engine`, `explain`, `on_update` and `usage`.
+        Returns a JSON-serializable dict with the breakdown, where it came from
+        ("price_model", "cache", "rules" or "llm"), the reference part and the
+        features of both parts. Raises NoReferenceError when no reference part
+        is found and ValueError (json.JSONDecodeError for an unparseable AI reply)
+        when the part cannot be quoted.
+        """
+        if engine not in (RULES_ENGINE, LLM_ENGINE):
+            raise ValueError(f"Unknown quoting engine '{engine}'. Available: {RULES_ENGINE}, {LLM_ENGINE}")
+        query = str(part.get("Part Description") or "").strip()
+        if not query:
+            raise ValueError("Please enter a part description to quote.")
+        with tracing.span("quote", engine=engine):
+            with resources.timed("quote.embedder"):
+                embedder = self.embedder()
+            warnings = []
+            query_volume = PartFeatures.parse_volume(str(part.get("Size") or "").strip())
+            where = embedder.build_filter(
+                material=part.get("Material") if same_material else None,
+                volume_mm3=query_volume,
+                volume_tolerance=volume_tolerance or None
+            )
+            if volume_tolerance and query_volume is None:
+                warnings.append("Could not read the size, so the volume filter is not applied.")
+            search_options = {"shards": shards or None} if self.shard_by else {}
+            with resources.timed("quote.retrieval"):
+                result = embedder.query(query, n_results=1, where=where, **search_options)
+            if not result["documents"][0]:
+                raise NoReferenceError(
+                    "No similar parts found. Try indexing data, refining your query "
+                    "or loosening the material/volume filters."
+                )
+            reference = result["documents"][0][0]
+            meta = result["metadatas"][0][0]
+            with resources.timed("quote.completion"):
+                breakdown, from_cache = quote_part(
+                    part, reference, meta,
+                    quote_cache=self.quote_cache(),
+                    reference_id=result["ids"][0][0],
+                    price_model=self.price_model() if use_price_model else None,
+                    engine=engine,
+                    rules=self.rules(),
+                    explain=explain,
+                    on_update=on_update,
+                    usage=usage
+                )
+        if breakdown.get(MODEL_VERSION_KEY) is not None:
+            source = "price_model"
+        elif from_cache:
+            source = "cache"
+        else:
+            source = engine
+        query_features = PartFeatures.feature_dict(part)
+        query_features["Target Price (CHF)"] = breakdown.get("Total Quote")
+        return {
+            "breakdown": breakdown,
+            "source": source,
+            "reference": {
+                "id": result["ids"][0][0],
+                "part": reference,
+                "distance": _json_float(result["distances"][0][0]),
+                "price": meta.get("Target Price (CHF)"),
+                "price_range": describe_group(meta),
+                "features": _json_safe(PartFeatures.from_metadata(meta)),
+            },
+            "query_features": _json_safe(query_features),
+            "warnings": warnings,
+        }
+
+    def quote_many(self, df, engine=RULES_ENGINE, explain=False, use_price_model=True, max_concurrency=8):
+        """
+        Quotes every row of a bill of materials (see quoting.quote_parts), at
+        most `max_concurrency` at a time, and yields (position, result row) as
+        each quote completes.
+        """
+        return quote_parts(
+            self.embedder(), df,
+            max_concurrency=max_concurrency,
+            quote_cache=self.quote_cache() if engine == LLM_ENGINE else None,
+            price_model=self.price_model() if use_price_model else None,
+            engine=engine,
+            rules=self.rules(),
+            explain=explain
+        )
+
+    def quote_table(self, df, **options):
+        """
+        quote_many, collected into a list of result rows in the order of `df`,
+        with missing values as None.
+        """
+        rows = [None] * len(df)
+        with tracing.span("batch_quote", parts=len(df)):
+            for position, row in self.quote_many(df, **options):
+                rows[position] = _json_safe(row)
+        return rows
+
+
+def _json_float(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _json_safe(values):
+    """
+    The dict with NaN values (unparseable volumes, empty CSV cells) as None,
+    so it serializes as valid JSON.
+    """
+    return {
+        key: None if isinstance(value, float) and math.isnan(value) else value
+        for key, value in values.items()
+    }
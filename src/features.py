@@ -1,22 +1,136 @@
 # features.py
 
+import math
 import re
 
+# Millimetres per unit for the size formats found in ERP exports
+UNIT_FACTORS = {
+    "mm": 1.0,
+    "cm": 10.0,
+    "m": 1000.0,
+    "in": 25.4,
+    "inch": 25.4,
+    "inches": 25.4,
+    '"': 25.4,
+}
+
+_NUMBER = r'\d+(?:\.\d+)?|\.\d+'
+_UNIT = r'mm|cm|m|inches|inch|in|"'
+_SEP = r'\s*[xX*×]\s*'
+# "100x50x5", "100 x 50 x 5 mm", "10x5x0.5cm", "4 x 2 x 0.25 in", "100mm x 50mm x 5mm".
+# Kept to the RE2-compatible subset (ASCII classes) so pyarrow can run it as well.
+SIZE_GROUPS = ["a", "unit_a", "b", "unit_b", "c", "unit_c"]
+SIZE_PATTERN = re.compile(
+    rf'^\s*(?P<a>{_NUMBER})\s*(?P<unit_a>{_UNIT})?{_SEP}'
+    rf'(?P<b>{_NUMBER})\s*(?P<unit_b>{_UNIT})?{_SEP}'
+    rf'(?P<c>{_NUMBER})\s*(?P<unit_c>{_UNIT})?\s*$',
+    re.IGNORECASE | re.ASCII,
+)
+# Counts comma-separated entries that are not blank
+_OPERATION_PATTERN = re.compile(r'[^,]*[^,\s][^,]*')
+
+
+def _text(value):
+    """
+    Cell value as a string; None and NaN (missing CSV cells) become "".
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+def _parse_size(size_str):
+    """
+    (a, b, c, mm per unit) for a size string, or None if it does not parse.
+    """
+    if not size_str:
+        return None
+    match = SIZE_PATTERN.match(size_str)
+    if not match:
+        return None
+    a, unit_a, b, unit_b, c, unit_c = match.group(*SIZE_GROUPS)
+    unit = (unit_c or unit_b or unit_a or "mm").lower()
+    return float(a), float(b), float(c), UNIT_FACTORS[unit]
+
+
+def _pyarrow():
+    """
+    Returns (pyarrow, pyarrow.compute), or None when pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return None
+    return pa, pc
+
+
+def _volumes(sizes):
+    """
+    Volume in mm³ (NaN when unparseable) for a Series of stripped size strings,
+    computed exactly like PartFeatures.parse_volume. Uses pyarrow's regex kernel
+    when pyarrow is installed, and pandas' str.extract otherwise.
+    """
+    import numpy as np
+    import pandas as pd
+
+    arrow = _pyarrow()
+    if arrow is None:
+        dims = sizes.str.extract(SIZE_PATTERN)
+    else:
+        pa, pc = arrow
+        parts = pc.extract_regex(pa.array(sizes.tolist(), type=pa.string()), "(?i)" + SIZE_PATTERN.pattern)
+        dims = pd.DataFrame({
+            name: pc.struct_field(parts, name).to_numpy(zero_copy_only=False)
+            for name in SIZE_GROUPS
+        }, index=sizes.index)
+        # RE2 reports optional groups that did not take part as "", not null
+        dims = dims.replace("", np.nan)
+
+    unit = dims["unit_c"].fillna(dims["unit_b"]).fillna(dims["unit_a"]).fillna("mm").str.lower()
+    factor_cubed = unit.map({u: f ** 3 for u, f in UNIT_FACTORS.items()}).astype(float)
+    return (
+        dims["a"].astype(float) * dims["b"].astype(float) * dims["c"].astype(float)
+        * factor_cubed
+    ).to_numpy()
+
+
 class PartFeatures:
+    # Engineered features stored with every indexed part (see index_metadata)
+    INDEX_KEYS = ["Volume_mm3", "Size_Label", "Operations_Count", "Material_Norm", "Finish_Norm"]
+
     @staticmethod
-    def parse_volume(size_str):
+    def normalize_label(value):
+        """
+        Lower-cased, whitespace-collapsed form of a material or finish, used for
+        exact-match filters ("Stainless  Steel" == "stainless steel").
+        """
+        return " ".join(_text(value).lower().split())
+
+    @staticmethod
+    def parse_dimensions(size_str):
         """
-        Parses a size string like "100x50x5" or "100x50x5 mm" and returns volume in mm³.
+        Parses a size string like "100x50x5", "100 x 50 x 5 mm", "10x5x0.5cm"
+        or "4x2x0.25 in" and returns its three dimensions in mm. A unit written
+        after the last number applies to all three; the default unit is mm.
         Returns None if not valid.
         """
-        if not size_str:
+        parsed = _parse_size(size_str)
+        if parsed is None:
             return None
-        size_str = size_str.replace("mm", "").strip().lower()
-        # Accept "100x50x5", "100X50X5", "100*50*5"
-        nums = [float(s) for s in re.split(r'[xX*]', size_str) if s.strip()]
-        if len(nums) == 3:
-            return nums[0] * nums[1] * nums[2]
-        return None
+        a, b, c, factor = parsed
+        return a * factor, b * factor, c * factor
+
+    @staticmethod
+    def parse_volume(size_str):
+        """
+        Volume in mm³ of a size string (see parse_dimensions), or None if not valid.
+        """
+        parsed = _parse_size(size_str)
+        if parsed is None:
+            return None
+        a, b, c, factor = parsed
+        return a * b * c * factor ** 3
 
     @staticmethod
     def size_label(volume_mm3):
@@ -38,14 +152,14 @@ class PartFeatures:
         Given a pandas Series or dict (row), returns a dict of engineered features.
         """
         # Works for DataFrame row or user dict
-        material = (row.get('Material') or '').strip().capitalize()
-        size = (row.get('Size') or '').strip()
-        operations = (row.get('Operations') or '').strip()
-        finish = (row.get('Finish') or '').strip()
+        material = _text(row.get('Material')).strip().capitalize()
+        size = _text(row.get('Size')).strip()
+        operations = _text(row.get('Operations')).strip()
+        finish = _text(row.get('Finish')).strip()
         price = row.get('Target Price (CHF)', None)
-        
+
         volume = PartFeatures.parse_volume(size)
-        op_count = len([op for op in operations.split(',') if op.strip()])
+        op_count = len(_OPERATION_PATTERN.findall(operations))
 
         return {
             "Material": material,
@@ -57,3 +171,101 @@ class PartFeatures:
             "Finish": finish,
             "Target Price (CHF)": price,
         }
+
+    @staticmethod
+    def feature_frame(df):
+        """
+        Vectorized feature_dict for a whole DataFrame: returns a DataFrame with
+        the same columns and values as calling feature_dict on every row, except
+        that an unparseable Volume_mm3 is NaN instead of None.
+        """
+        import numpy as np
+        import pandas as pd
+
+        def distinct(name):
+            """
+            Catalog columns repeat a lot, so string work runs once per distinct value.
+            Returns (codes, distinct values as str); code -1 (missing) maps to the
+            trailing "" entry.
+            """
+            if name not in df.columns:
+                return np.full(len(df), -1), pd.Series([""], dtype=object)
+            codes, uniques = pd.factorize(df[name])
+            return codes, pd.Series([_text(v) for v in uniques] + [""], dtype=object)
+
+        def expand(codes, values):
+            return pd.Series(np.asarray(values)[codes], index=df.index)
+
+        codes, values = distinct("Material")
+        material = expand(codes, values.str.strip().str.capitalize())
+
+        codes, values = distinct("Size")
+        values = values.str.strip()
+        size = expand(codes, values)
+        volume = expand(codes, _volumes(values)).astype(float)
+
+        codes, values = distinct("Operations")
+        values = values.str.strip()
+        operations = expand(codes, values)
+        op_count = expand(codes, values.str.count(_OPERATION_PATTERN)).astype(int)
+
+        codes, values = distinct("Finish")
+        finish = expand(codes, values.str.strip())
+
+        size_label = np.select(
+            [volume.isna(), volume < 1000, volume < 100000],
+            ["Unknown", "Small", "Medium"],
+            default="Large",
+        )
+        if "Target Price (CHF)" in df.columns:
+            price = df["Target Price (CHF)"]
+        else:
+            price = pd.Series(None, index=df.index, dtype=object)
+
+        return pd.DataFrame({
+            "Material": material,
+            "Size": size,
+            "Volume_mm3": volume,
+            "Size_Label": pd.Series(size_label, index=df.index),
+            "Operations": operations,
+            "Operations_Count": op_count,
+            "Finish": finish,
+            "Target Price (CHF)": price,
+        }, index=df.index)
+
+    @staticmethod
+    def index_metadata(features):
+        """
+        Typed metadata for the vector index from a feature_dict (or feature_frame
+        row). Volume_mm3 is left out when the size could not be parsed, since
+        the index cannot store missing values.
+        """
+        metadata = {
+            "Size_Label": features["Size_Label"],
+            "Operations_Count": int(features["Operations_Count"]),
+            "Material_Norm": PartFeatures.normalize_label(features["Material"]),
+            "Finish_Norm": PartFeatures.normalize_label(features["Finish"]),
+        }
+        volume = features["Volume_mm3"]
+        if volume is not None and not math.isnan(volume):
+            metadata["Volume_mm3"] = float(volume)
+        return metadata
+
+    @staticmethod
+    def from_metadata(meta):
+        """
+        feature_dict for a part read back from the index, re-using the features
+        stored at index time instead of parsing them again.
+        """
+        if "Size_Label" not in meta:
+            return PartFeatures.feature_dict(meta)
+        return {
+            "Material": _text(meta.get('Material')).strip().capitalize(),
+            "Size": _text(meta.get('Size')).strip(),
+            "Volume_mm3": meta.get("Volume_mm3"),
+            "Size_Label": meta["Size_Label"],
+            "Operations": _text(meta.get('Operations')).strip(),
+            "Operations_Count": meta["Operations_Count"],
+            "Finish": _text(meta.get('Finish')).strip(),
+            "Target Price (CHF)": meta.get('Target Price (CHF)', None),
+        }
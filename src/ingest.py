@@ -0,0 +1,131 @@
+# src/ingest.py
+
+import hashlib
+import json
+import os
+import time
+
+READ_BLOCK_SIZE = 1 << 20
+
+
+def _open_binary(source):
+    """
+    Returns (file object, should_close) for a path or an already open binary file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    source.seek(0)
+    return source, False
+
+
+def scan_source(source):
+    """
+    Streams through the CSV once, in fixed-size blocks, and returns
+    (content fingerprint, number of data rows). Memory use does not depend on file size.
+    The row count is a line count, so quoted multi-line fields make it an estimate.
+    """
+    f, should_close = _open_binary(source)
+    digest = hashlib.sha256()
+    newlines = 0
+    last_block = b""
+    try:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            newlines += block.count(b"\n")
+            last_block = block
+    finally:
+        if should_close:
+            f.close()
+        else:
+            f.seek(0)
+    lines = newlines + (1 if last_block and not last_block.endswith(b"\n") else 0)
+    return digest.hexdigest(), max(lines - 1, 0)
+
+
+class IngestCheckpoint:
+    """
+    Small JSON file recording how many rows of a given source have been indexed.
+    Written atomically after every chunk so a crash never leaves it half-written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, fingerprint):
+        """
+        Returns the number of rows already indexed for this source, or 0 when
+        there is no checkpoint or it belongs to a different file.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        if state.get("fingerprint") != fingerprint:
+            return 0
+        return int(state.get("rows_done", 0))
+
+    def save(self, fingerprint, rows_done):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "rows_done": rows_done}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def stream_ingest(embedder, source, chunksize=5_000, checkpoint_path=None, on_progress=None):
+    """
+    Indexes a CSV chunk by chunk: each chunk is read, embedded and upserted
+    before the next one is read, so peak memory stays flat regardless of file size.
+
+    With `checkpoint_path`, progress is recorded after every chunk and a later run
+    on the same file resumes after the last indexed row. `on_progress` is called
+    as on_progress(rows_done, rows_total, rows_per_sec) after every chunk.
+    Returns a summary dict.
+    """
+    import pandas as pd
+
+    fingerprint, rows_total = scan_source(source)
+    checkpoint = IngestCheckpoint(checkpoint_path) if checkpoint_path else None
+    resumed_from = checkpoint.load(fingerprint) if checkpoint else 0
+    rows_done = resumed_from
+
+    f, should_close = _open_binary(source)
+    started = time.perf_counter()
+    try:
+        # Skip already indexed data rows (line 0 is the header)
+        skiprows = (lambda i: 0 < i <= resumed_from) if resumed_from else None
+        reader = pd.read_csv(f, chunksize=chunksize, skiprows=skiprows)
+        for chunk in reader:
+            embedder.process_dataframe(chunk)
+            rows_done += len(chunk)
+            if checkpoint:
+                checkpoint.save(fingerprint, rows_done)
+            if on_progress:
+                elapsed = time.perf_counter() - started
+                rate = (rows_done - resumed_from) / elapsed if elapsed > 0 else 0.0
+                on_progress(rows_done, max(rows_total, rows_done), rate)
+    finally:
+        if should_close:
+            f.close()
+
+    if checkpoint:
+        checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    processed = rows_done - resumed_from
+    return {
+        "rows_total": rows_done,
+        "rows_processed": processed,
+        "resumed_from": resumed_from,
+        "seconds": elapsed,
+        "rows_per_sec": processed / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,82 @@
+# src/json_stream.py
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Reads a JSON object as it streams in, chunk by chunk, and exposes each
+    top-level field as soon as its value is complete, so a UI can show fields
+    before the reply has finished. Text before the opening brace (such as a
+    ```json fence) and after the closing brace is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment_start = None
+
+    def feed(self, chunk):
+        """
+        Adds `chunk` to the reply. Returns the fields completed by this chunk
+        as a dict (empty when none).
+        """
+        self.buffer += chunk
+        completed = {}
+        text = self.buffer
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._segment_start = self._pos + 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.update(self._parse_segment(self._pos))
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                completed.update(self._parse_segment(self._pos))
+                self._segment_start = self._pos + 1
+            self._pos += 1
+        self.fields.update(completed)
+        return completed
+
+    def _parse_segment(self, end):
+        """
+        Parses one `"key": value` pair of the top-level object.
+        """
+        segment = self.buffer[self._segment_start:end].strip()
+        if not segment:
+            return {}
+        try:
+            return json.loads("{" + segment + "}")
+        except json.JSONDecodeError as e:
+            # Report against the whole reply, like json.loads(reply) would
+            raise json.JSONDecodeError(e.msg, self.buffer, self._segment_start) from None
+
+    def result(self):
+        """
+        The complete object; raises json.JSONDecodeError (with the raw reply in
+        `.doc`) if the reply did not contain one.
+        """
+        if not self.done:
+            raise json.JSONDecodeError("Reply ended before the JSON object was complete",
+                                       self.buffer, len(self.buffer))
+        return dict(self.fields)
@@ -0,0 +1,498 @@
+# src/numpy_index.py
+
+import json
+import os
+import threading
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+# Quantized copies of the vectors (int8 codes with per-row scales, or sign bits)
+CODES_FILE = "codes.npy"
+SCALES_FILE = "scales.npy"
+QUANTIZATIONS = (None, "int8", "binary")
+# Collection metadata and dtype
+HEADER_FILE = "index.json"
+# Append-only log of upserted and deleted rows (id, document, metadata)
+LOG_FILE = "rows.jsonl"
+# Rows scored per matmul; bounds the scratch memory of a query and keeps the
+# float16 -> float32 upcast of each block in cache
+SCORE_CHUNK_ROWS = 4_096
+
+_COMPARATORS = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+
+class NumpyIndex:
+    """
+    Flat in-process vector index with the subset of the Chroma collection API
+    that PartEmbedder uses (upsert, query, get, delete, count, metadata, modify).
+
+    L2-normalized embeddings live in one contiguous float32 (or float16) matrix in
+    a memory-mapped .npy file, so opening the index is instant and the OS pages
+    vectors in on demand. Ids, documents and metadata live in a JSON sidecar.
+    Queries are exact top-k cosine searches: a NumPy matmul over the (optionally
+    `where`-filtered) rows and argpartition. Distances are cosine distances
+    (1 - cosine similarity), so smaller means closer, as in Chroma.
+
+    With `quantization`, a compact copy of every vector is scanned instead:
+    "int8" (one byte per dimension and a per-row scale, 4x smaller than float32)
+    or "binary" (one sign bit per dimension, 32x smaller, scored by Hamming
+    distance). The best `rerank` x k rows of that scan are re-scored with their
+    float vectors, so returned distances are exact and only the shortlist's
+    float rows are read. The codes are rebuilt from the float vectors when an
+    index is opened with a different quantization.
+    """
+
+    def __init__(self, path, metadata=None, dtype="float32", quantization=None, rerank=10):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization '{quantization}'. Available: int8, binary (or None)"
+            )
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self._lock = threading.RLock()
+        self._columns = {}
+        self._ids, self._documents, self._metadatas = [], [], []
+        self._positions = {}
+        self._vectors = None
+        self._codes, self._scales = None, None
+        self.quantization = quantization
+        self.rerank = max(1, int(rerank))
+        os.makedirs(path, exist_ok=True)
+        header = os.path.join(path, HEADER_FILE)
+        if os.path.exists(header):
+            with open(header, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.metadata = state["metadata"]
+            self.dtype = np.dtype(state["dtype"])
+            self._replay()
+            if state.get("quantization") != quantization or state.get("rerank", self.rerank) != self.rerank:
+                self._quantize_all()
+                self._write_header()
+            elif quantization and self._vectors is not None:
+                # Codes are written with the vectors; rebuild them if they went missing
+                files = [CODES_FILE, SCALES_FILE] if quantization == "int8" else [CODES_FILE]
+                if all(os.path.exists(os.path.join(path, name)) for name in files):
+                    self._codes = np.load(os.path.join(path, CODES_FILE), mmap_mode="r+")
+                    if quantization == "int8":
+                        self._scales = np.load(os.path.join(path, SCALES_FILE), mmap_mode="r+")
+                else:
+                    self._quantize_all()
+        else:
+            self.metadata = dict(metadata) if metadata else None
+            self.dtype = np.dtype(dtype)
+            self._write_header()
+
+    # ---------- persistence ----------
+
+    def _write_header(self):
+        header = os.path.join(self.path, HEADER_FILE)
+        with open(header + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"metadata": self.metadata, "dtype": self.dtype.name,
+                       "quantization": self.quantization, "rerank": self.rerank}, f)
+        os.replace(header + ".tmp", header)
+
+    def _replay(self):
+        """
+        Rebuilds ids, documents and metadata from the row log, then compacts the
+        log when it holds mostly superseded records.
+        """
+        log_path = os.path.join(self.path, LOG_FILE)
+        records = 0
+        if os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    records += 1
+                    if "delete" in record:
+                        self._remove(record["delete"], move_vector=False)
+                    else:
+                        self._place(record["id"], record["document"], record["metadata"])
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode="r+")
+        if records > 2 * len(self._ids) + 1_000:
+            self.compact()
+
+    def _log(self, records):
+        with open(os.path.join(self.path, LOG_FILE), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, default=_json_default) + "\n" for record in records)
+
+    def compact(self):
+        """
+        Rewrites the row log with one record per live row.
+        """
+        with self._lock:
+            log_path = os.path.join(self.path, LOG_FILE)
+            with open(log_path + ".tmp", "w", encoding="utf-8") as f:
+                for id_, doc, meta in zip(self._ids, self._documents, self._metadatas):
+                    record = {"id": id_, "document": doc, "metadata": meta}
+                    f.write(json.dumps(record, default=_json_default) + "\n")
+            os.replace(log_path + ".tmp", log_path)
+
+    def _reserve(self, rows, dim):
+        """
+        Makes room for `rows` vectors, growing the memory-mapped files by doubling.
+        """
+        if self._vectors is not None:
+            if self._vectors.shape[1] != dim:
+                raise ValueError(
+                    f"Embedding dimension {dim} does not match index dimension {self._vectors.shape[1]}"
+                )
+            if self._vectors.shape[0] >= rows:
+                return
+        capacity = max(rows, 1024, 2 * (self._vectors.shape[0] if self._vectors is not None else 0))
+        self._vectors = self._grow(VECTORS_FILE, self._vectors, self.dtype, (capacity, dim))
+        self._grow_codes(capacity, dim)
+
+    def _grow_codes(self, capacity, dim):
+        if self.quantization == "int8":
+            self._codes = self._grow(CODES_FILE, self._codes, np.int8, (capacity, dim))
+            self._scales = self._grow(SCALES_FILE, self._scales, np.float32, (capacity,))
+        elif self.quantization == "binary":
+            self._codes = self._grow(CODES_FILE, self._codes, np.uint8, (capacity, (dim + 7) // 8))
+
+    def _grow(self, name, current, dtype, shape):
+        """
+        Copies the used rows of `current` into a new memory-mapped file of `shape`.
+        """
+        tmp_path = os.path.join(self.path, name + ".tmp")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        used = len(self._ids)
+        if used and current is not None:
+            grown[:used] = current[:used]
+        grown.flush()
+        del grown, current
+        os.replace(tmp_path, os.path.join(self.path, name))
+        return np.load(os.path.join(self.path, name), mmap_mode="r+")
+
+    def _quantize_all(self):
+        """
+        Rebuilds the quantized codes from the float vectors, or removes them
+        when the index is not quantized.
+        """
+        self._codes, self._scales = None, None
+        for name in (CODES_FILE, SCALES_FILE):
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        if not self.quantization or self._vectors is None:
+            return
+        self._grow_codes(*self._vectors.shape)
+        for start in range(0, len(self._ids), SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, len(self._ids))
+            self._store_codes(slice(start, stop), np.asarray(self._vectors[start:stop], dtype=np.float32))
+        self._flush()
+
+    def _store_codes(self, rows, vectors):
+        if self.quantization == "int8":
+            codes, scales = _quantize_int8(vectors)
+            self._codes[rows] = codes
+            self._scales[rows] = scales
+        elif self.quantization == "binary":
+            self._codes[rows] = np.packbits(vectors > 0, axis=1)
+
+    def _flush(self):
+        for array in (self._vectors, self._codes, self._scales):
+            if array is not None:
+                array.flush()
+
+    def _place(self, id_, document, metadata):
+        if id_ not in self._positions:
+            self._positions[id_] = len(self._ids)
+            self._ids.append(id_)
+            self._documents.append(None)
+            self._metadatas.append(None)
+        row = self._positions[id_]
+        self._documents[row] = document
+        self._metadatas[row] = metadata
+
+    def _remove(self, id_, move_vector=True):
+        """
+        Deletes a row by moving the last row into its place, so the matrix
+        stays contiguous. Returns False when the id is unknown.
+        """
+        row = self._positions.pop(id_, None)
+        if row is None:
+            return False
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            if move_vector:
+                for array in (self._vectors, self._codes, self._scales):
+                    if array is not None:
+                        array[row] = array[last]
+            self._ids[row] = moved
+            self._documents[row] = self._documents[last]
+            self._metadatas[row] = self._metadatas[last]
+            self._positions[moved] = row
+        self._ids.pop()
+        self._documents.pop()
+        self._metadatas.pop()
+        return True
+
+    # ---------- Chroma-like API ----------
+
+    def count(self):
+        return len(self._ids)
+
+    def modify(self, metadata=None):
+        with self._lock:
+            if metadata is not None:
+                self.metadata = dict(metadata)
+            self._write_header()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._lock:
+            new_ids = [id_ for id_ in dict.fromkeys(ids) if id_ not in self._positions]
+            self._reserve(len(self._ids) + len(new_ids), vectors.shape[1])
+            for id_, doc, meta in zip(ids, documents, metadatas):
+                self._place(id_, doc, meta)
+            rows = np.fromiter((self._positions[id_] for id_ in ids), dtype=np.int64, count=len(ids))
+            self._vectors[rows] = vectors.astype(self.dtype)
+            self._store_codes(rows, vectors)
+            self._flush()
+            self._log({"id": id_, "document": doc, "metadata": meta}
+                      for id_, doc, meta in zip(ids, documents, metadatas))
+            self._columns.clear()
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            targets = list(dict.fromkeys(ids or []))
+            if where is not None:
+                targets += [self._ids[i] for i in np.flatnonzero(self._mask(where))]
+            deleted = [id_ for id_ in targets if self._remove(id_)]
+            if deleted:
+                self._flush()
+                self._log({"delete": id_} for id_ in deleted)
+            self._columns.clear()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        with self._lock:
+            if ids is not None:
+                rows = [self._positions[id_] for id_ in ids if id_ in self._positions]
+            elif where is not None:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            else:
+                rows = list(range(len(self._ids)))
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self._vectors[rows], dtype=np.float32)
+            return result
+
+    def query(self, query_embeddings, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            count = len(self._ids)
+            if count and where is not None:
+                candidates = np.flatnonzero(self._mask(where))
+            else:
+                candidates = None
+            rows_per_query, distances = self._top_k(queries, n_results, candidates)
+            result = {"ids": [[self._ids[r] for r in rows] for rows in rows_per_query]}
+            if "documents" in include:
+                result["documents"] = [[self._documents[r] for r in rows] for rows in rows_per_query]
+            if "metadatas" in include:
+                result["metadatas"] = [[self._metadatas[r] for r in rows] for rows in rows_per_query]
+            if "distances" in include:
+                result["distances"] = distances
+            return result
+
+    # ---------- search internals ----------
+
+    def _top_k(self, queries, k, candidates=None):
+        """
+        Returns (rows, distances) per query, best first. `candidates` restricts
+        the search to those row numbers.
+        """
+        count = len(self._ids)
+        pool = count if candidates is None else len(candidates)
+        k = min(k, pool)
+        if k <= 0:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        if self.quantization is None:
+            best_rows, best_scores = self._scan(queries, k, candidates, self._float_scorer(queries))
+        else:
+            # Shortlist on the compact codes, then re-score the shortlist exactly
+            shortlist, _ = self._scan(
+                queries, min(pool, k * self.rerank), candidates, self._code_scorer(queries)
+            )
+            best_scores = np.stack([
+                np.asarray(self._vectors[rows], dtype=np.float32) @ query
+                for query, rows in zip(queries, shortlist)
+            ])
+            best_rows = shortlist
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        distances = (1.0 - best_scores).astype(float).tolist()
+        return best_rows.tolist(), distances
+
+    def _scan(self, queries, k, candidates, score):
+        """
+        Chunked top-k scan: `score(index)` returns the (queries x rows) scores of
+        the rows at `index` (a slice, or an array of row numbers). Returns the k
+        best (rows, scores) per query, unordered.
+        """
+        pool = len(self._ids) if candidates is None else len(candidates)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, pool, SCORE_CHUNK_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(start + SCORE_CHUNK_ROWS, pool))
+                scores = score(slice(start, start + len(rows)))
+            else:
+                rows = candidates[start:start + SCORE_CHUNK_ROWS]
+                scores = score(rows)
+            # Keep only this chunk's k best before merging with the running best
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                chunk_rows = rows[keep]
+            else:
+                chunk_rows = np.broadcast_to(rows, scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, chunk_rows], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        return best_rows, best_scores
+
+    def _float_scorer(self, queries):
+        return lambda index: queries @ np.asarray(self._vectors[index], dtype=np.float32).T
+
+    def _code_scorer(self, queries):
+        """
+        Approximate scores from the quantized codes: the dot product with the
+        dequantized int8 rows, or for binary codes 1 - 2 * Hamming distance / dim
+        (higher is closer, as for cosine similarity).
+        """
+        if self.quantization == "int8":
+            return lambda index: (
+                (queries @ np.asarray(self._codes[index], dtype=np.float32).T) * self._scales[index]
+            )
+        dim = self._vectors.shape[1]
+        query_bits = np.packbits(queries > 0, axis=1)
+        # Whole 64-bit words make the XOR and popcount about twice as fast
+        word = np.uint64 if query_bits.shape[1] % 8 == 0 and hasattr(np, "bitwise_count") else np.uint8
+        query_bits = query_bits.view(word)
+
+        def score(index):
+            codes = np.ascontiguousarray(self._codes[index]).view(word)
+            return np.stack([
+                1.0 - 2.0 * _popcount(np.bitwise_xor(codes, bits)).sum(axis=1, dtype=np.int32) / dim
+                for bits in query_bits
+            ]).astype(np.float32)
+
+        return score
+
+    def _column(self, key):
+        """
+        Metadata column as (float values with NaN for non-numbers, object values),
+        built once per key and reused until the next write.
+        """
+        if key not in self._columns:
+            raw = np.array([(m or {}).get(key) for m in self._metadatas], dtype=object)
+            numeric = np.array(
+                [v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in raw],
+                dtype=np.float64,
+            )
+            self._columns[key] = (numeric, raw)
+        return self._columns[key]
+
+    def _mask(self, where):
+        """
+        Boolean row mask for a Chroma-style `where` clause.
+        """
+        count = len(self._ids)
+        if not where:
+            return np.ones(count, dtype=bool)
+        if "$and" in where:
+            mask = np.ones(count, dtype=bool)
+            for clause in where["$and"]:
+                mask &= self._mask(clause)
+            return mask
+        if "$or" in where:
+            mask = np.zeros(count, dtype=bool)
+            for clause in where["$or"]:
+                mask |= self._mask(clause)
+            return mask
+        mask = np.ones(count, dtype=bool)
+        for key, condition in where.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            numeric, raw = self._column(key)
+            for op, value in condition.items():
+                if op in _COMPARATORS:
+                    mask &= _COMPARATORS[op](numeric, value)
+                elif op == "$eq":
+                    mask &= np.array([v == value for v in raw], dtype=bool)
+                elif op == "$ne":
+                    mask &= np.array([v != value for v in raw], dtype=bool)
+                elif op == "$in":
+                    mask &= np.array([v in value for v in raw], dtype=bool)
+                elif op == "$nin":
+                    mask &= np.array([v not in value for v in raw], dtype=bool)
+                else:
+                    raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+
+def _json_default(value):
+    # NumPy scalars in metadata (e.g. np.int64 prices)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _quantize_int8(vectors):
+    """
+    Symmetric per-row int8 codes: row ≈ codes * scale.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+_BIT_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(words):
+    # np.bitwise_count needs NumPy 2.0; older versions count bytes with a table
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _BIT_COUNTS[words]
+
+
+def _normalize(vectors):
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,45 @@
+# src/openai_client.py
+
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+_client = None
+_lock = threading.Lock()
+# Seconds spent creating the shared client; None until it exists
+startup_seconds = None
+
+
+def get_openai_client():
+    """
+    Returns the process-wide OpenAI client, creating it on first use. The API key
+    is read once here instead of on every request, and the client's connection
+    pool is re-used by every embedding and chat call.
+    """
+    global _client, startup_seconds
+    if _client is None:
+        with _lock:
+            if _client is None:
+                start = time.perf_counter()
+                # The SDK takes a few hundred ms to import; only pay for it on first use
+                import openai
+
+                load_dotenv()
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable is not set!")
+                _client = openai.OpenAI(api_key=api_key)
+                startup_seconds = time.perf_counter() - start
+    return _client
+
+
+def reset_openai_client():
+    """
+    Drops the shared client, e.g. after the API key changed.
+    """
+    global _client, startup_seconds
+    with _lock:
+        _client = None
+        startup_seconds = None
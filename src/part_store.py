@@ -0,0 +1,217 @@
+# src/part_store.py
+
+import os
+import threading
+
+import pyarrow as pa
+
+ID_COLUMN = "__id"
+DOCUMENT_COLUMN = "__document"
+DELETED_COLUMN = "__deleted"
+SEGMENT_SUFFIX = ".arrow"
+# Segments are merged into one once there are more than this many, or once
+# superseded and deleted rows outnumber the live ones
+MAX_SEGMENTS = 32
+
+
+class PartStore:
+    """
+    Columnar sidecar holding the full row data (document and metadata) of an
+    index, so the vector index itself only needs ids, vectors and filter keys.
+
+    Rows are written as uncompressed Arrow IPC segments, one per upsert or
+    delete, named seg-000001.arrow, seg-000002.arrow, ...; later segments win.
+    Segments are memory-mapped, so opening the store reads only the id columns
+    and a lookup touches only the pages of the rows it returns. Each metadata
+    key is its own column; keys missing from a row come back absent, as in Chroma.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._segments = []
+        self._names = []
+        # id -> (segment number, row) of the live copy
+        self._rows = {}
+        self._dead = 0
+        os.makedirs(path, exist_ok=True)
+        for name in sorted(n for n in os.listdir(path) if n.endswith(SEGMENT_SUFFIX)):
+            self._open_segment(name)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, id_):
+        return id_ in self._rows
+
+    def ids(self):
+        with self._lock:
+            return list(self._rows)
+
+    # ---------- writes ----------
+
+    def upsert(self, ids, documents=None, metadatas=None):
+        if not ids:
+            return
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{}] * len(ids)
+        columns = {ID_COLUMN: list(ids), DOCUMENT_COLUMN: list(documents)}
+        for i, meta in enumerate(metadatas):
+            for key, value in (meta or {}).items():
+                columns.setdefault(key, [None] * len(ids))[i] = value
+        self._write(columns)
+
+    def delete(self, ids):
+        ids = [id_ for id_ in ids if id_ in self._rows]
+        if ids:
+            self._write({ID_COLUMN: ids, DELETED_COLUMN: [True] * len(ids)})
+
+    def _write(self, columns):
+        table = pa.table({key: _array(values) for key, values in columns.items()})
+        with self._lock:
+            number = int(self._names[-1][4:-len(SEGMENT_SUFFIX)]) + 1 if self._names else 1
+            name = f"seg-{number:06d}{SEGMENT_SUFFIX}"
+            _write_table(table, os.path.join(self.path, name))
+            self._open_segment(name)
+            if len(self._segments) > MAX_SEGMENTS or self._dead > max(len(self._rows), 1000):
+                self.compact()
+
+    def _open_segment(self, name):
+        source = pa.memory_map(os.path.join(self.path, name), "r")
+        table = pa.ipc.open_file(source).read_all()
+        index = len(self._segments)
+        self._segments.append(table)
+        self._names.append(name)
+        deleted = (
+            table.column(DELETED_COLUMN).to_pylist() if DELETED_COLUMN in table.column_names
+            else None
+        )
+        for row, id_ in enumerate(table.column(ID_COLUMN).to_pylist()):
+            if id_ in self._rows:
+                self._dead += 1
+            if deleted is not None and deleted[row]:
+                if self._rows.pop(id_, None) is not None:
+                    self._dead += 1
+            else:
+                self._rows[id_] = (index, row)
+
+    def compact(self):
+        """
+        Rewrites the live rows into a single segment and removes the others.
+        """
+        with self._lock:
+            old = list(self._names)
+            number = int(old[-1][4:-len(SEGMENT_SUFFIX)]) + 1 if old else 1
+            name = f"seg-{number:06d}{SEGMENT_SUFFIX}"
+            parts = []
+            for index, rows in self._live_rows_by_segment().items():
+                table = self._segments[index].take(pa.array(rows, type=pa.int64()))
+                if DELETED_COLUMN in table.column_names:
+                    table = table.drop_columns([DELETED_COLUMN])
+                parts.append(table)
+            if parts:
+                _write_table(_concat(parts), os.path.join(self.path, name))
+            self._segments, self._names, self._rows, self._dead = [], [], {}, 0
+            for stale in old:
+                os.remove(os.path.join(self.path, stale))
+            if parts:
+                self._open_segment(name)
+
+    def _live_rows_by_segment(self):
+        by_segment = {}
+        for index, row in self._rows.values():
+            by_segment.setdefault(index, []).append(row)
+        return {index: sorted(rows) for index, rows in sorted(by_segment.items())}
+
+    # ---------- reads ----------
+
+    def get(self, ids):
+        """
+        Returns (documents, metadatas) for `ids`, in order; None for unknown ids.
+        """
+        documents, metadatas = [None] * len(ids), [None] * len(ids)
+        with self._lock:
+            wanted = {}
+            for position, id_ in enumerate(ids):
+                location = self._rows.get(id_)
+                if location is not None:
+                    wanted.setdefault(location[0], []).append((location[1], position))
+            segments = list(self._segments)
+        for index, rows in wanted.items():
+            table = segments[index].take(pa.array([row for row, _ in rows], type=pa.int64()))
+            for (_, position), record in zip(rows, table.to_pylist()):
+                documents[position], metadatas[position] = _split(record)
+        return documents, metadatas
+
+    def iter_rows(self, batch_size=10_000):
+        """
+        Yields (id, document, metadata) for every live row, segment by segment.
+        """
+        with self._lock:
+            by_segment = self._live_rows_by_segment()
+            segments = list(self._segments)
+        for index, rows in by_segment.items():
+            for start in range(0, len(rows), batch_size):
+                take = pa.array(rows[start:start + batch_size], type=pa.int64())
+                for record in segments[index].take(take).to_pylist():
+                    id_ = record[ID_COLUMN]
+                    document, metadata = _split(record)
+                    yield id_, document, metadata
+
+
+def _split(record):
+    document = record.get(DOCUMENT_COLUMN)
+    metadata = {
+        key: value for key, value in record.items()
+        if value is not None and key not in (ID_COLUMN, DOCUMENT_COLUMN, DELETED_COLUMN)
+    }
+    return document, metadata
+
+
+def _array(values):
+    """
+    Arrow array for a column, falling back to strings when its values mix
+    types (e.g. a price column with both numbers and "n/a").
+    """
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _concat(tables):
+    """
+    Concatenates segments whose schemas may differ. Missing columns become
+    nulls and integers widen to floats; a column that is, say, numbers in one
+    segment and strings in another is stored as strings, as _array does
+    within a segment.
+    """
+    types = {}
+    for table in tables:
+        for field in table.schema:
+            if not pa.types.is_null(field.type):
+                types.setdefault(field.name, set()).add(field.type)
+    mixed = {
+        name for name, found in types.items()
+        if len(found) > 1 and not all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in found)
+    }
+    if mixed:
+        tables = [_strings(table, mixed) for table in tables]
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _strings(table, names):
+    for name in names & set(table.column_names):
+        values = [None if v is None else str(v) for v in table.column(name).to_pylist()]
+        table = table.set_column(
+            table.schema.get_field_index(name), name, pa.array(values, type=pa.string())
+        )
+    return table
+
+
+def _write_table(table, path):
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
@@ -0,0 +1,240 @@
+# src/price_model.py
+"""
+Phase 2: a scikit-learn price model trained on the indexed catalog.
+
+A random forest predicts "Target Price (CHF)" from the PartFeatures features
+stored with every indexed part. The spread of the individual trees'
+predictions is the uncertainty estimate; when it is small the quote can be
+answered from the model without calling the LLM.
+"""
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+try:
+    from .embed_parts import FINGERPRINT_KEY
+    from .features import PartFeatures
+except ImportError:
+    from embed_parts import FINGERPRINT_KEY
+    from features import PartFeatures
+
+# Bump when the design matrix layout changes; saved models of another format are retrained
+MODEL_FORMAT = 1
+PRICE_COLUMN = "Target Price (CHF)"
+SIZE_LABELS = ["Small", "Medium", "Large", "Unknown"]
+
+
+def _operation_tokens(operations):
+    return [PartFeatures.normalize_label(op) for op in str(operations or "").split(",") if op.strip()]
+
+
+class PriceModel:
+    """
+    Random forest on log prices. `predict` returns the trees' mean prediction
+    in CHF and the standard deviation of the trees' log predictions, which is
+    roughly the relative error (0.1 ≈ ±10%).
+    """
+
+    def __init__(self, n_estimators=100, min_samples_leaf=2, max_relative_std=0.15,
+                 min_training_rows=20, random_state=0):
+        self.n_estimators = n_estimators
+        self.min_samples_leaf = min_samples_leaf
+        # Predictions with a larger spread than this are not trusted
+        self.max_relative_std = max_relative_std
+        self.min_training_rows = min_training_rows
+        self.random_state = random_state
+        self.version = 0
+        self.trained_rows = 0
+        self.trained_at = None
+        self.training_digest = None
+        self.materials, self.finishes, self.operations = [], [], []
+        self.forest = None
+
+    # ---------- design matrix ----------
+
+    def _learn_vocabulary(self, features, max_categories=50):
+        def most_common(values):
+            counts = {}
+            for value in values:
+                if value:
+                    counts[value] = counts.get(value, 0) + 1
+            return sorted(counts, key=lambda v: (-counts[v], v))[:max_categories]
+
+        self.materials = most_common(PartFeatures.normalize_label(v) for v in features["Material"])
+        self.finishes = most_common(PartFeatures.normalize_label(v) for v in features["Finish"])
+        self.operations = most_common(tok for ops in features["Operations"] for tok in _operation_tokens(ops))
+
+    def design_matrix(self, features):
+        """
+        Numeric matrix for a feature_frame DataFrame (or a dict of feature
+        lists): log volume, operation
+        count, and one-hot material, finish, size label and operation types.
+        Values outside the training vocabulary only set their "other" column.
+        """
+        volume = np.array([np.nan if v is None else v for v in features["Volume_mm3"]], dtype=float)
+        known = ~np.isnan(volume)
+        columns = [
+            np.where(known, np.log1p(np.where(known, volume, 0.0)), -1.0),
+            known.astype(float),
+            np.asarray(features["Operations_Count"], dtype=float),
+        ]
+
+        def one_hot(values, vocabulary):
+            index = {v: i for i, v in enumerate(vocabulary)}
+            block = np.zeros((len(values), len(vocabulary) + 1))
+            for row, value in enumerate(values):
+                block[row, index.get(value, len(vocabulary))] = 1.0
+            return block
+
+        blocks = [
+            one_hot([PartFeatures.normalize_label(v) for v in features["Material"]], self.materials),
+            one_hot([PartFeatures.normalize_label(v) for v in features["Finish"]], self.finishes),
+            one_hot(list(features["Size_Label"]), SIZE_LABELS),
+        ]
+        op_index = {v: i for i, v in enumerate(self.operations)}
+        ops_block = np.zeros((len(volume), len(self.operations) + 1))
+        for row, ops in enumerate(features["Operations"]):
+            for token in _operation_tokens(ops):
+                ops_block[row, op_index.get(token, len(self.operations))] += 1.0
+        blocks.append(ops_block)
+        return np.hstack([np.column_stack(columns)] + blocks)
+
+    # ---------- training and prediction ----------
+
+    @staticmethod
+    def digest(fingerprints):
+        """
+        Order-independent hash of the row fingerprints a model was trained on.
+        """
+        payload = "\n".join(sorted(str(f) for f in fingerprints))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def fit(self, features, fingerprints=None):
+        """
+        Trains on a feature_frame-like DataFrame with a price column. Rows
+        without a positive numeric price are ignored.
+        """
+        from sklearn.ensemble import RandomForestRegressor
+
+        prices = features[PRICE_COLUMN].apply(_to_float).to_numpy()
+        usable = ~np.isnan(prices) & (prices > 0)
+        features = features[usable]
+        if len(features) < self.min_training_rows:
+            raise ValueError(
+                f"Need at least {self.min_training_rows} priced parts to train, got {len(features)}."
+            )
+        self._learn_vocabulary(features)
+        self.forest = RandomForestRegressor(
+            n_estimators=self.n_estimators,
+            min_samples_leaf=self.min_samples_leaf,
+            random_state=self.random_state,
+            n_jobs=-1,
+        )
+        self.forest.fit(self.design_matrix(features), np.log(prices[usable]))
+        # Single-part predictions are faster without a worker pool
+        self.forest.set_params(n_jobs=None)
+        self.version += 1
+        self.trained_rows = len(features)
+        self.trained_at = time.time()
+        if fingerprints is not None:
+            self.training_digest = self.digest(fingerprints)
+        return self
+
+    def predict(self, features):
+        """
+        Returns (prices in CHF, relative uncertainties) as arrays, one per row.
+        """
+        if self.forest is None:
+            raise ValueError("Price model is not trained.")
+        # The trees' low-level predict skips sklearn's per-call input validation,
+        # which otherwise dominates single-part latency
+        X = np.ascontiguousarray(self.design_matrix(features), dtype=np.float32)
+        per_tree = np.stack([tree.tree_.predict(X).reshape(len(X), -1)[:, 0] for tree in self.forest.estimators_])
+        return np.exp(per_tree.mean(axis=0)), per_tree.std(axis=0)
+
+    def estimate(self, feature_dict):
+        """
+        Prediction for a single part (a feature_dict): {"price", "uncertainty",
+        "confident"}.
+        """
+        price, spread = self.predict({key: [value] for key, value in feature_dict.items()})
+        uncertainty = float(spread[0])
+        return {
+            "price": float(price[0]),
+            "uncertainty": uncertainty,
+            "confident": uncertainty <= self.max_relative_std,
+        }
+
+    # ---------- persistence ----------
+
+    def save(self, path):
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump({"format": MODEL_FORMAT, "model": self}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the saved model, or None when there is none or it was saved in
+        an older format.
+        """
+        import joblib
+
+        if not os.path.exists(path):
+            return None
+        saved = joblib.load(path)
+        if saved.get("format") != MODEL_FORMAT:
+            return None
+        return saved["model"]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def training_frame(embedder, page_size=10_000):
+    """
+    Reads every indexed part and returns (features DataFrame, row fingerprints),
+    using the features stored at index time.
+    """
+    import pandas as pd
+
+    rows, fingerprints = [], []
+    for id_, meta in embedder.iter_metadatas(page_size):
+        rows.append(PartFeatures.from_metadata(meta))
+        fingerprints.append(meta.get(FINGERPRINT_KEY, id_))
+    return pd.DataFrame(rows, columns=list(PartFeatures.feature_dict({}))), fingerprints
+
+
+def refresh_price_model(embedder, path, model=None, **options):
+    """
+    Brings the model saved at `path` in line with the indexed catalog: it is
+    retrained (as the next version) only when the set of indexed rows changed
+    since it was trained. Returns the current model, or None when the catalog
+    has too few priced parts to train one.
+
+    A changed catalog is trained into a new PriceModel; `model` is never
+    modified, since other threads may be quoting with it.
+    """
+    model = model if model is not None else PriceModel.load(path)
+    features, fingerprints = training_frame(embedder)
+    if model is not None and model.training_digest == PriceModel.digest(fingerprints):
+        return model
+    candidate = PriceModel(**options)
+    if model is not None:
+        candidate.version = model.version
+    try:
+        candidate.fit(features, fingerprints)
+    except ValueError:
+        return model
+    candidate.save(path)
+    return candidate
@@ -0,0 +1,151 @@
+# src/quote_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def normalize_features(features):
+    """
+    Canonical form of a PartFeatures.feature_dict used for cache keys, so that
+    trivially different inputs ("Drilling, milling" vs "milling,drilling ",
+    "100x50x5 mm" vs "100X50X5") map to the same quote.
+    """
+    def clean(value):
+        return " ".join(str(value or "").lower().split())
+
+    operations = sorted({clean(op) for op in str(features.get("Operations") or "").split(",") if op.strip()})
+    return {
+        "Material": clean(features.get("Material")),
+        "Size": clean(features.get("Size")).replace("mm", "").replace(" ", "").replace("*", "x"),
+        "Volume_mm3": features.get("Volume_mm3"),
+        "Operations": operations,
+        "Finish": clean(features.get("Finish")),
+    }
+
+
+class QuoteCache:
+    """
+    Persistent cache of generated quote breakdowns.
+
+    Keys combine the normalized query features with the reference part's id,
+    price and row fingerprint plus the prompt version and model, so a quote is
+    re-used only when the LLM would have been asked exactly the same thing.
+    A change to the reference row produces a different key; syncing the
+    catalog evicts quotes of updated or deleted reference parts
+    (invalidate_references), and other stale entries age out. Entries expire
+    after `ttl_seconds` and the cache keeps at most `max_entries`, evicting
+    the least recently used.
+    """
+
+    def __init__(self, path, max_entries=10_000, ttl_seconds=7 * 24 * 3600, clock=time.time):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quotes ("
+            " key TEXT PRIMARY KEY,"
+            " reference_id TEXT,"
+            " result TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS quotes_reference ON quotes (reference_id)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(query_features, reference_id, reference_price, reference_fingerprint,
+                 prompt_version, model):
+        payload = json.dumps({
+            "query": normalize_features(query_features),
+            "reference_id": reference_id,
+            "reference_price": str(reference_price),
+            "reference_fingerprint": reference_fingerprint,
+            "prompt_version": prompt_version,
+            "model": model,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached breakdown dict, or None when missing or expired.
+        """
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created FROM quotes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM quotes WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE quotes SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result, reference_id=None):
+        now = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quotes (key, reference_id, result, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, reference_id, json.dumps(result), now, now),
+            )
+            self._conn.execute("DELETE FROM quotes WHERE created < ?", (now - self.ttl_seconds,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM quotes").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM quotes WHERE key IN ("
+                    " SELECT key FROM quotes ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+            self._conn.commit()
+
+    def invalidate_reference(self, reference_id):
+        """
+        Drops every cached quote anchored to the given reference part.
+        """
+        self.invalidate_references([reference_id])
+
+    def invalidate_references(self, reference_ids):
+        """
+        Drops every cached quote anchored to any of the given reference parts.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM quotes WHERE reference_id = ?", [(id_,) for id_ in reference_ids]
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM quotes").fetchone()
+        return count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self._conn.close()
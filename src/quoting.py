@@ -0,0 +1,364 @@
+# src/quoting.py
+
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from . import tracing
+    from .batching import RateLimiter, call_with_retries, estimate_tokens
+    from .breakdown import BreakdownRules
+    from .dedup import describe_group
+    from .embed_parts import FINGERPRINT_KEY
+    from .features import PartFeatures
+    from .json_stream import IncrementalJSONParser
+    from .openai_client import get_openai_client
+    from .quote_cache import QuoteCache
+    from .training_prompt import PROMPT_VERSION, cnc_prompt_sections, explanation_prompt
+except ImportError:
+    import tracing
+    from batching import RateLimiter, call_with_retries, estimate_tokens
+    from breakdown import BreakdownRules
+    from dedup import describe_group
+    from embed_parts import FINGERPRINT_KEY
+    from features import PartFeatures
+    from json_stream import IncrementalJSONParser
+    from openai_client import get_openai_client
+    from quote_cache import QuoteCache
+    from training_prompt import PROMPT_VERSION, cnc_prompt_sections, explanation_prompt
+
+logger = logging.getLogger(__name__)
+
+QUOTE_MODEL = "gpt-4o"
+PART_COLUMNS = ["Part Description", "Material", "Size", "Operations", "Finish"]
+BREAKDOWN_KEYS = [
+    "Base Material", "Size Adjustment", "Operations Fee", "Finish Fee",
+    "Total Quote", "Explanation"
+]
+# Set on breakdowns answered by the price model instead of the LLM
+MODEL_VERSION_KEY = "Price Model Version"
+# "rules": local BreakdownRules, the LLM at most writes the explanation;
+# "llm": the LLM computes the whole breakdown from cnc_training_prompt
+RULES_ENGINE = "rules"
+LLM_ENGINE = "llm"
+DEFAULT_RULES = BreakdownRules()
+
+
+def clean_ai_output(ai_output):
+    """
+    Strips markdown code fencing (and a leading "json" tag) from a model reply.
+    """
+    ai_output = ai_output.strip()
+    if ai_output.startswith("```"):
+        ai_output = ai_output.split("```")[-2] if "```" in ai_output else ai_output
+    ai_output = ai_output.strip()
+    if ai_output.startswith("json"):
+        ai_output = ai_output[4:].strip()
+    return ai_output
+
+
+def request_completion(prompt, model=QUOTE_MODEL, system=None, on_delta=None, usage=None):
+    """
+    Sends a prompt to the chat model, streaming the reply, and returns the
+    cleaned reply text.
+
+    With `system`, that text goes first as its own system message and `prompt`
+    follows as the user message, so a static `system` is a cacheable prefix.
+    `on_delta(text)` is called with every piece of the reply as it arrives.
+    `usage`, if a dict, receives prompt_tokens, cached_tokens (served from the
+    provider's prompt cache), completion_tokens and first_token_seconds.
+    The call is traced as an "llm.completion" span with its tokens and cost.
+    """
+    if system is None:
+        messages = [{"role": "system", "content": prompt}]
+    else:
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    with tracing.span("llm.completion", model=model) as span:
+        start = time.perf_counter()
+        stream = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        pieces = []
+        reported = {}
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not pieces:
+                        reported["first_token_seconds"] = time.perf_counter() - start
+                        span.attributes["first_token_ms"] = round(reported["first_token_seconds"] * 1000, 1)
+                    pieces.append(delta)
+                    if on_delta is not None:
+                        on_delta(delta)
+            if getattr(chunk, "usage", None) is not None:
+                details = getattr(chunk.usage, "prompt_tokens_details", None)
+                reported["prompt_tokens"] = chunk.usage.prompt_tokens
+                reported["cached_tokens"] = getattr(details, "cached_tokens", None) or 0
+                reported["completion_tokens"] = chunk.usage.completion_tokens
+        reply = "".join(pieces)
+        if "prompt_tokens" in reported:
+            tracing.record_usage(model, reported["prompt_tokens"], reported["completion_tokens"],
+                                 reported["cached_tokens"])
+        else:
+            # No usage chunk: estimate the tokens from the text
+            tracing.record_usage(model, sum(estimate_tokens(m["content"]) for m in messages),
+                                 estimate_tokens(reply))
+    if usage is not None:
+        usage.update(reported)
+    with tracing.span("llm.clean_output"):
+        return clean_ai_output(reply)
+
+
+def request_explanation(prompt, model=QUOTE_MODEL, on_delta=None):
+    """
+    Asks the chat model for the one-line explanation of a computed breakdown.
+    """
+    return " ".join(request_completion(prompt, model, on_delta=on_delta).strip().strip('"“”').split())
+
+
+def prompt_token_counts(sections):
+    """
+    Tokens per prompt section, e.g. {"static": 1400, "dynamic": 90}.
+    """
+    return {name: estimate_tokens(text) for name, text in sections.items()}
+
+
+def model_breakdown(estimate, price_model, query_features, rules=None):
+    """
+    Breakdown for a price-model estimate: the predicted total, split across
+    the categories by the breakdown rules.
+    """
+    rules = rules or DEFAULT_RULES
+    total = max(rules.min_charge, round(estimate["price"]))
+    breakdown = rules.split(total, rules.points(query_features))
+    breakdown["Total Quote"] = total
+    breakdown["Explanation"] = (
+        f"Predicted by price model v{price_model.version} from {price_model.trained_rows} "
+        f"catalog parts (about ±{estimate['uncertainty'] * 100:.0f}%)."
+    )
+    breakdown[MODEL_VERSION_KEY] = price_model.version
+    return breakdown
+
+
+def quote_part(query_row, similar_part, similar_meta, model=QUOTE_MODEL,
+               quote_cache=None, reference_id=None, rate_limiter=None, price_model=None,
+               engine=RULES_ENGINE, rules=None, explain=False, on_update=None, usage=None):
+    """
+    Quotes one part against its reference. Returns (breakdown dict, from_cache).
+
+    With a trained `price_model` whose estimate is confident, the model answers
+    (the breakdown then carries MODEL_VERSION_KEY). Otherwise the "rules" engine
+    computes the breakdown locally with `rules` (BreakdownRules), and only asks
+    the LLM for a one-line explanation when `explain` is set; a failed
+    explanation call keeps the rule-based explanation.
+
+    The "llm" engine has the LLM compute the whole breakdown. With a
+    `quote_cache`, a quote previously generated for the same normalized
+    features, reference part and prompt version is returned without calling the LLM.
+    `rate_limiter`, if given, is only waited on before an actual LLM call.
+    Raises json.JSONDecodeError (raw reply in `.doc`) when the reply is not valid JSON.
+
+    LLM replies are streamed: `on_update(fields)` is called with the breakdown
+    fields known so far whenever more arrive. `usage`, if a dict, receives the
+    token counts of the static and dynamic prompt sections and the API's token
+    usage (see request_completion). Each stage is traced as a "quote.*" span.
+    """
+    with tracing.span("quote.features"):
+        ref_features = PartFeatures.from_metadata(similar_meta)
+        query_features = PartFeatures.feature_dict(query_row)
+    similar_price = ref_features.get("Target Price (CHF)", "")
+
+    if price_model is not None:
+        with tracing.span("quote.price_model", version=price_model.version) as span:
+            estimate = price_model.estimate(query_features)
+            span.attributes["confident"] = bool(estimate["confident"])
+            if estimate["confident"]:
+                return model_breakdown(estimate, price_model, query_features, rules), False
+
+    if engine == RULES_ENGINE:
+        with tracing.span("quote.rules"):
+            breakdown = (rules or DEFAULT_RULES).breakdown(query_features, ref_features, similar_price)
+        if explain:
+            prompt = explanation_prompt(
+                query=query_row.get("Part Description", ""),
+                similar_part=similar_part,
+                breakdown={key: breakdown[key] for key in BREAKDOWN_KEYS[:-1]}
+            )
+            if rate_limiter is not None:
+                with tracing.span("quote.rate_limit"):
+                    rate_limiter.wait()
+            if on_update is not None:
+                on_update(dict(breakdown))
+
+            def explain_streamed():
+                pieces = []
+
+                def on_delta(delta):
+                    pieces.append(delta)
+                    on_update(dict(breakdown, Explanation="".join(pieces)))
+
+                return request_explanation(prompt, model, on_delta=on_delta if on_update else None)
+
+            try:
+                breakdown["Explanation"] = call_with_retries(explain_streamed)
+            except Exception as e:
+                # The quote stands without its explanation
+                tracing.record_error(e)
+                logger.warning("Error generating quote explanation: %s", e)
+        return breakdown, False
+    if engine != LLM_ENGINE:
+        raise ValueError(f"Unknown quoting engine '{engine}'. Available: {RULES_ENGINE}, {LLM_ENGINE}")
+
+    cache_key = None
+    if quote_cache is not None:
+        cache_key = QuoteCache.make_key(
+            query_features, reference_id, similar_price,
+            similar_meta.get(FINGERPRINT_KEY), PROMPT_VERSION, model
+        )
+        with tracing.span("quote.cache_lookup") as span:
+            cached = quote_cache.get(cache_key)
+            span.attributes["hit"] = cached is not None
+        if cached is not None:
+            return cached, True
+
+    # Static rules and examples as the system message, the part data as the user message
+    with tracing.span("quote.prompt"):
+        sections = cnc_prompt_sections(
+            query=query_features,
+            similar_price=similar_price,
+            similar_part=similar_part,
+            similar_features=ref_features
+        )
+    if usage is not None:
+        usage.update({f"{name}_tokens": n for name, n in prompt_token_counts(sections).items()})
+    if rate_limiter is not None:
+        with tracing.span("quote.rate_limit"):
+            rate_limiter.wait()
+
+    def complete_streamed():
+        # A fresh parser per attempt, so a retry starts the preview over
+        parser = IncrementalJSONParser()
+
+        def on_delta(delta):
+            try:
+                if parser.feed(delta):
+                    on_update(dict(parser.fields))
+            except json.JSONDecodeError:
+                pass  # only the preview is affected; the full reply is parsed below
+
+        return request_completion(
+            sections["dynamic"], model, system=sections["static"],
+            on_delta=on_delta if on_update else None, usage=usage
+        )
+
+    reply = call_with_retries(complete_streamed)
+    with tracing.span("quote.parse"):
+        breakdown = json.loads(reply)
+    if quote_cache is not None:
+        quote_cache.put(cache_key, breakdown, reference_id=reference_id)
+    return breakdown, False
+
+
+def normalize_parts_frame(df):
+    """
+    Returns `df` with every part column present as a clean string, so that rows
+    from a user-supplied BOM can go through PartFeatures and the embedder.
+    """
+    if "Part Description" not in df.columns:
+        raise KeyError("Part Description")
+    df = df.copy()
+    for col in PART_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    return df
+
+
+def quote_parts(embedder, df, max_concurrency=8, requests_per_minute=500, model=QUOTE_MODEL,
+                quote_cache=None, where=None, price_model=None, engine=RULES_ENGINE,
+                rules=None, explain=False):
+    """
+    Quotes every row of a bill-of-materials DataFrame in one pass.
+
+    All query texts are embedded in one batched call and matched with a single
+    multi-embedding index query; the quotes (see quote_part for `engine`,
+    `rules` and `explain`) then run concurrently, at most `max_concurrency` at
+    a time and LLM calls at most `requests_per_minute` per minute. Parts
+    already in `quote_cache` or confidently predicted by `price_model` are
+    answered without an LLM call, and `where` restricts every lookup (see
+    PartEmbedder.build_filter).
+
+    Yields (position, result row) as each quote completes, in completion order.
+    A failed quote, or a row without a part description, yields a row with an
+    "Error" value instead of a breakdown. Every quote is traced as a "quote.part" span under the caller's current span.
+    """
+    df = normalize_parts_frame(df)
+    if df.empty:
+        return
+    rows = df.to_dict(orient="records")
+    # Rows without a description are not searched, as QuotingEngine.quote refuses them
+    queried = [position for position, row in enumerate(rows) if row["Part Description"]]
+    lookup = {position: i for i, position in enumerate(queried)}
+    neighbours = None
+    if queried:
+        with tracing.span("quote.retrieval", parts=len(queried)):
+            neighbours = embedder.query_many(
+                [embedder.row_to_embedding_text(rows[position]) for position in queried],
+                n_results=1, where=where
+            )
+    limiter = RateLimiter(requests_per_minute)
+
+    def run(position):
+        with tracing.span("quote.part", position=position):
+            return quote_row(position)
+
+    def quote_row(position):
+        row = dict(rows[position])
+        if position not in lookup:
+            row["Error"] = "Missing part description"
+            return row
+        hit = lookup[position]
+        docs = neighbours["documents"][hit]
+        if not docs:
+            row["Error"] = "No similar parts found"
+            return row
+        meta = neighbours["metadatas"][hit][0]
+        row["Reference Part"] = docs[0]
+        row["Reference Price (CHF)"] = meta.get("Target Price (CHF)")
+        # References collapsed from duplicate rows are priced at the group's median
+        group = describe_group(meta)
+        if group is not None:
+            row["Reference Price Range"] = group
+        try:
+            breakdown, from_cache = quote_part(
+                rows[position], docs[0], meta, model=model,
+                quote_cache=quote_cache, reference_id=neighbours["ids"][hit][0],
+                rate_limiter=limiter, price_model=price_model,
+                engine=engine, rules=rules, explain=explain
+            )
+            for key in BREAKDOWN_KEYS:
+                row[key] = breakdown.get(key)
+            row["Cached"] = from_cache
+            row[MODEL_VERSION_KEY] = breakdown.get(MODEL_VERSION_KEY)
+        except json.JSONDecodeError:
+            row["Error"] = "AI response could not be parsed as JSON"
+        except ValueError as e:
+            row["Error"] = str(e)
+        except Exception as e:
+            row["Error"] = f"OpenAI API call failed: {e}"
+        return row
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        # Each quote runs in a copy of this context, so it is traced under the caller's span
+        futures = {
+            pool.submit(contextvars.copy_context().run, run, position): position
+            for position in range(len(rows))
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
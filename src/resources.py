@@ -0,0 +1,218 @@
+# src/resources.py
+"""
+Process-wide resources shared across Streamlit reruns and CLI calls.
+
+Streamlit re-executes the app script on every interaction, but imported
+modules stay loaded, so anything kept here is opened once per process: the
+Chroma client, collection handles (via PartEmbedder), the caches, and the
+parsed upload. `timings` records how long each resource took to start and the
+stages of the latest quote, so the app can show that warm quotes skip startup.
+
+Heavy libraries (chromadb, pandas, the price model's numpy/scikit-learn) are
+imported by the function that first needs them, so importing this module,
+and the app and CLI that import it, does not load them.
+"""
+
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from . import openai_client
+    from .embed_parts import PartEmbedder, ShardedPartEmbedder
+    from .breakdown import BreakdownRules
+    from .embedding_cache import EmbeddingCache
+    from .quote_cache import QuoteCache
+except ImportError:
+    import openai_client
+    from embed_parts import PartEmbedder, ShardedPartEmbedder
+    from breakdown import BreakdownRules
+    from embedding_cache import EmbeddingCache
+    from quote_cache import QuoteCache
+
+MAX_CACHED_UPLOADS = 4
+
+_lock = threading.RLock()
+_chroma_clients = {}
+_embedders = {}
+_embedding_caches = {}
+_quote_caches = {}
+_price_models = {}
+_breakdown_rules = {}
+_uploads = OrderedDict()
+
+# Latest duration in seconds per stage name, e.g. "startup.chroma_client" or "quote.retrieval"
+timings = {}
+
+
+@contextmanager
+def timed(stage):
+    """
+    Records the duration of the block under `stage` in `timings`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def get_chroma_client(chroma_dir):
+    with _lock:
+        if chroma_dir not in _chroma_clients:
+            with timed("startup.chroma_client"):
+                import chromadb
+
+                _chroma_clients[chroma_dir] = chromadb.PersistentClient(path=chroma_dir)
+        return _chroma_clients[chroma_dir]
+
+
+def get_embedding_cache(path):
+    with _lock:
+        if path not in _embedding_caches:
+            _embedding_caches[path] = EmbeddingCache(path)
+        return _embedding_caches[path]
+
+
+def get_quote_cache(path):
+    with _lock:
+        if path not in _quote_caches:
+            _quote_caches[path] = QuoteCache(path)
+        return _quote_caches[path]
+
+
+def get_breakdown_rules(path=None):
+    """
+    Returns the BreakdownRules configured in the JSON file at `path`, or the
+    default rules when `path` is None.
+    """
+    with _lock:
+        if path not in _breakdown_rules:
+            _breakdown_rules[path] = BreakdownRules.from_file(path) if path else BreakdownRules()
+        return _breakdown_rules[path]
+
+
+def _price_model():
+    try:
+        from . import price_model
+    except ImportError:
+        import price_model
+    return price_model
+
+
+def get_price_model(path):
+    """
+    Returns the saved price model at `path` (None until one has been trained),
+    loaded once per process.
+    """
+    with _lock:
+        if path not in _price_models:
+            _price_models[path] = _price_model().PriceModel.load(path)
+        return _price_models[path]
+
+
+def refresh_price_model(embedder, path):
+    """
+    Retrains the shared price model if the indexed catalog changed, and returns it.
+    Training runs outside the lock; only the swap of the shared model is locked.
+    """
+    current = get_price_model(path)
+    with timed("startup.price_model"):
+        model = _price_model().refresh_price_model(embedder, path, model=current)
+    with _lock:
+        _price_models[path] = model
+    return model
+
+
+def get_embedder(chroma_dir, collection_name, backend=None, embedding_cache_path=None,
+                 index_backend="chroma", shard_by=None, part_store=False, dedup=False,
+                 dimensions=None, quantization=None):
+    """
+    Returns the shared PartEmbedder (and so the open collection handle) for
+    these settings, creating it on first use. With `shard_by`, a
+    ShardedPartEmbedder that routes rows to shards by that column; with
+    `dedup`, duplicate rows are collapsed at ingest with the default thresholds.
+    `dimensions` and `quantization` compress the vectors (see PartEmbedder).
+    """
+    key = (chroma_dir, collection_name, backend, embedding_cache_path, index_backend, shard_by,
+           part_store, dedup, dimensions, quantization)
+    with _lock:
+        if key not in _embedders:
+            # The NumPy index needs no Chroma client at all
+            client = get_chroma_client(chroma_dir) if index_backend == "chroma" else None
+            cache = get_embedding_cache(embedding_cache_path) if embedding_cache_path else None
+            with timed("startup.embedder"):
+                if shard_by:
+                    _embedders[key] = ShardedPartEmbedder(
+                        chroma_dir=chroma_dir,
+                        collection_name=collection_name,
+                        shard_by=shard_by,
+                        backend=backend,
+                        embedding_cache=cache,
+                        client=client,
+                        index_backend=index_backend,
+                        part_store=part_store,
+                        dedup=dedup,
+                        dimensions=dimensions,
+                        quantization=quantization
+                    )
+                else:
+                    _embedders[key] = PartEmbedder(
+                        chroma_dir=chroma_dir,
+                        collection_name=collection_name,
+                        backend=backend,
+                        embedding_cache=cache,
+                        client=client,
+                        index_backend=index_backend,
+                        part_store=part_store,
+                        dedup=dedup,
+                        dimensions=dimensions,
+                        quantization=quantization
+                    )
+        return _embedders[key]
+
+
+def get_openai_client():
+    client = openai_client.get_openai_client()
+    if openai_client.startup_seconds is not None:
+        timings["startup.openai_client"] = openai_client.startup_seconds
+    return client
+
+
+def load_csv(data):
+    """
+    Parses uploaded CSV bytes, memoized by content hash so that reruns with the
+    same upload do not parse it again. Treat the returned DataFrame as read-only.
+    """
+    key = hashlib.sha256(data).hexdigest()
+    with _lock:
+        if key in _uploads:
+            _uploads.move_to_end(key)
+            return _uploads[key]
+    with timed("upload.parse"):
+        import pandas as pd
+
+        df = pd.read_csv(io.BytesIO(data))
+    with _lock:
+        _uploads[key] = df
+        while len(_uploads) > MAX_CACHED_UPLOADS:
+            _uploads.popitem(last=False)
+    return df
+
+
+def reset():
+    """
+    Forgets every shared resource (mainly for tests).
+    """
+    with _lock:
+        _chroma_clients.clear()
+        _embedders.clear()
+        _embedding_caches.clear()
+        _quote_caches.clear()
+        _price_models.clear()
+        _breakdown_rules.clear()
+        _uploads.clear()
+        timings.clear()
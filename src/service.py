@@ -0,0 +1,298 @@
+# src/service.py
+"""
+Small asyncio HTTP service in front of a QuotingEngine, for the ERP and batch jobs.
+
+    POST /quote         {"Part Description": ..., "Material": ..., "Size": ...,
+                         "Operations": ..., "Finish": ..., "engine": "rules"}
+    POST /batch-quote   {"parts": [{...}, ...], "engine": "rules"}
+    GET  /health
+
+The engine (index, caches, price model, OpenAI client) is opened once at
+startup and shared by every request. Quotes run on a thread pool, at most
+`max_concurrency` at a time; requests beyond `max_pending` waiting ones are
+answered 503 right away. Identical quote requests that arrive while one is
+already running are coalesced: they wait for and share its result.
+
+Only the standard library is used: HTTP/1.1 with keep-alive and JSON bodies
+sized by Content-Length.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+try:
+    from . import tracing
+    from .engine import NoReferenceError
+    from .quoting import PART_COLUMNS
+except ImportError:
+    import tracing
+    from engine import NoReferenceError
+    from quoting import PART_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Request keys that are quote options rather than part columns
+QUOTE_OPTIONS = ("engine", "explain", "same_material", "volume_tolerance", "use_price_model", "shards")
+BATCH_OPTIONS = ("engine", "explain", "use_price_model")
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ---------- HTTP/1.1 plumbing ----------
+
+async def read_request(reader):
+    """
+    Reads one request and returns (method, path, headers, body bytes), or
+    None when the client closed the connection between requests.
+    """
+    try:
+        line = await reader.readline()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        return None
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    """
+    Writes a complete JSON response.
+    """
+    body = json.dumps(payload, default=str).encode("utf-8")
+    status = HTTPStatus(status)
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+    )
+
+
+# ---------- the service ----------
+
+class QuoteService:
+    """
+    Serves a QuotingEngine over HTTP. Also usable without HTTP: `await
+    service.quote(part)` applies the same coalescing and concurrency limit.
+    """
+
+    def __init__(self, engine, max_concurrency=8, max_pending=256):
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="quote")
+        self._slots = None
+        # Batches take several slots; only one at a time may gather them, so two
+        # half-served batches cannot wait on each other
+        self._gathering = None
+        self._in_flight = {}
+        self._pending = 0
+        self.stats = {"requests": 0, "quotes": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+
+    # ---------- quoting ----------
+
+    @staticmethod
+    def request_key(part, options):
+        """
+        Identical parts (after stripping whitespace) with identical options share one quote.
+        """
+        normalized = {col: " ".join(str(part.get(col) or "").split()) for col in PART_COLUMNS}
+        return json.dumps([normalized, options], sort_keys=True, default=str)
+
+    async def quote(self, part, **options):
+        """
+        Quotes one part with QuotingEngine.quote, coalescing identical
+        concurrent requests. Raises HTTPError(503) when too many are waiting.
+        """
+        key = self.request_key(part, options)
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(shared)
+        task = asyncio.ensure_future(self._run(self.engine.quote, part, **options))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        self.stats["quotes"] += 1
+        return await asyncio.shield(task)
+
+    async def quote_table(self, parts, **options):
+        """
+        Quotes a whole bill of materials in one engine call (one batched
+        embedding and index query). The batch quotes up to max_concurrency
+        parts at once and takes that many concurrency slots.
+        """
+        import pandas as pd
+
+        workers = max(1, min(self.max_concurrency, len(parts)))
+        return await self._run(self.engine.quote_table, pd.DataFrame(parts), slots=workers,
+                               max_concurrency=workers, **options)
+
+    async def _run(self, function, *args, slots=1, **kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._gathering = asyncio.Lock()
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending requests, try again later")
+        self._pending += 1
+        taken = 0
+        try:
+            async with self._gathering if slots > 1 else contextlib.nullcontext():
+                for _ in range(slots):
+                    await self._slots.acquire()
+                    taken += 1
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self._executor, lambda: context.run(function, *args, **kwargs)
+            )
+        finally:
+            for _ in range(taken):
+                self._slots.release()
+            self._pending -= 1
+
+    # ---------- HTTP ----------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.dispatch(method, path, body)
+                write_response(writer, status, payload, keep_alive=keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        """
+        Returns (HTTP status, JSON payload) for one request.
+        """
+        self.stats["requests"] += 1
+        started = time.perf_counter()
+        try:
+            if path == "/health" and method == "GET":
+                return HTTPStatus.OK, self.health()
+            if path == "/quote" and method == "POST":
+                request = _json_body(body)
+                options = {k: request[k] for k in QUOTE_OPTIONS if k in request}
+                result = await self.quote({k: v for k, v in request.items() if k not in QUOTE_OPTIONS},
+                                          **options)
+                return HTTPStatus.OK, dict(result, latency_ms=_ms_since(started))
+            if path == "/batch-quote" and method == "POST":
+                request = _json_body(body)
+                parts = request.get("parts")
+                if not isinstance(parts, list) or not all(isinstance(p, dict) for p in parts):
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, '"parts" must be a list of objects')
+                options = {k: request[k] for k in BATCH_OPTIONS if k in request}
+                results = await self.quote_table(parts, **options) if parts else []
+                return HTTPStatus.OK, {"results": results, "latency_ms": _ms_since(started)}
+            if path in ("/health", "/quote", "/batch-quote"):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route {path}")
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except NoReferenceError as e:
+            return HTTPStatus.NOT_FOUND, {"error": str(e)}
+        except json.JSONDecodeError:
+            self.stats["errors"] += 1
+            return HTTPStatus.BAD_GATEWAY, {"error": "AI response could not be parsed as JSON"}
+        except (ValueError, TypeError) as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(e)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.exception("Error quoting request")
+            return HTTPStatus.BAD_GATEWAY, {"error": f"OpenAI API call failed: {e}"}
+
+    def health(self):
+        return dict(
+            self.stats,
+            status="ok",
+            in_flight=len(self._in_flight),
+            pending=self._pending,
+            max_concurrency=self.max_concurrency,
+            max_pending=self.max_pending,
+        )
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """
+        Warms the engine up and starts listening; returns the asyncio Server.
+        """
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.engine.warm_up)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve_forever(self, host="127.0.0.1", port=8000):
+        server = await self.start(host, port)
+        address = server.sockets[0].getsockname()
+        print(f"Quoting service listening on http://{address[0]}:{address[1]}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def _json_body(body):
+    try:
+        request = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON") from None
+    if not isinstance(request, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+    return request
+
+
+def _ms_since(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def serve(engine, host="127.0.0.1", port=8000, max_concurrency=8, max_pending=256):
+    """
+    Runs the service until interrupted.
+    """
+    tracing.configure_from_env()
+    service = QuoteService(engine, max_concurrency=max_concurrency, max_pending=max_pending)
+    try:
+        asyncio.run(service.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,347 @@
+# src/tracing.py
+"""
+Lightweight tracing for the index and quote paths.
+
+Code wraps each stage in `span(name)`; spans opened inside another span become
+its children, so one request produces one tree (a trace) with the duration of
+every stage. `add()` and `record_usage()` attach counters (API calls, tokens
+in and out, estimated cost) to the innermost open span. When the outermost span
+ends, the finished trace is kept for `last_trace()` and handed to every
+configured exporter: a one-line log summary, a JSONL file, or OpenTelemetry.
+
+The current span lives in a contextvar, so work submitted to a thread pool
+through `contextvars.copy_context().run` is attributed to the span that
+submitted it. Only the standard library is needed; OpenTelemetry is optional.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# USD per million tokens: (input, cached input, output)
+PRICES_PER_MILLION = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+    "text-embedding-ada-002": (0.10, 0.10, 0.0),
+}
+USD_TO_CHF = float(os.getenv("USD_TO_CHF", "0.80"))
+# Children kept per span; further ones (e.g. thousands of upsert batches) are only counted
+MAX_CHILDREN = 200
+RECENT_TRACES = 20
+DEFAULT_TRACE_FILE = "data/traces.jsonl"
+
+logger = logging.getLogger("quoting_assistant.trace")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_TRACES)
+_exporters = []
+_configured = False
+
+
+class Span:
+    """
+    One timed stage. `counters` holds this span's own counts; totals() adds
+    up the counters of the whole subtree.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.counters = {}
+        self.children = []
+        self.dropped_children = 0
+        self.error = None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.start_time = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def add(self, name, value=1):
+        with _lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def totals(self):
+        totals = dict(self.counters)
+        for child in self.children:
+            for name, value in child.totals().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.counters:
+            data["counters"] = self.counters
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        if self.dropped_children:
+            data["dropped_children"] = self.dropped_children
+        if self.parent is None:
+            data["trace_id"] = self.trace_id
+            data["totals"] = self.totals()
+        return data
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the block as a child of the current span (or as a new trace).
+    Yields the Span, so attributes and counters can be set inside the block.
+    """
+    parent = _current.get()
+    current = Span(name, parent, attributes)
+    if parent is not None:
+        with _lock:
+            if len(parent.children) < MAX_CHILDREN:
+                parent.children.append(current)
+            else:
+                parent.dropped_children += 1
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current.reset(token)
+        if parent is None:
+            _finish(current)
+
+
+def current_span():
+    return _current.get()
+
+
+def record_error(error):
+    """
+    Notes a handled exception on the current span; a no-op outside any span.
+    """
+    current = _current.get()
+    if current is not None:
+        current.error = f"{type(error).__name__}: {error}"
+
+
+def add(name, value=1):
+    """
+    Adds `value` to counter `name` on the current span; a no-op outside any span.
+    """
+    current = _current.get()
+    if current is not None:
+        current.add(name, value)
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    """
+    Estimated USD cost of one API call; 0.0 for models without a known price.
+    """
+    prices = PRICES_PER_MILLION.get(model)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1e6
+
+
+def record_usage(model, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    """
+    Counts one API call with its tokens and estimated cost on the current span.
+    """
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+    add("api_calls")
+    add("tokens_in", prompt_tokens)
+    add("tokens_out", completion_tokens)
+    if cached_tokens:
+        add("cached_tokens", cached_tokens)
+    add("cost_usd", cost)
+    add("cost_chf", cost * USD_TO_CHF)
+
+
+def last_trace(name=None):
+    """
+    The most recently finished trace (as a dict), optionally the latest one
+    whose root span is called `name`; None if there is none.
+    """
+    with _lock:
+        for trace in reversed(_recent):
+            if name is None or trace["name"] == name:
+                return trace
+    return None
+
+
+def span_rows(trace):
+    """
+    Flattens a trace dict into one row per span, depth-first, for display.
+    """
+    rows = []
+
+    def visit(node, depth):
+        row = {"Stage": "  " * depth + node["name"], "ms": node["duration_ms"]}
+        row.update(node.get("counters", {}))
+        if node.get("error"):
+            row["error"] = node["error"]
+        rows.append(row)
+        for child in node.get("children", []):
+            visit(child, depth + 1)
+
+    visit(trace, 0)
+    return rows
+
+
+def _finish(root):
+    trace = root.to_dict()
+    with _lock:
+        _recent.append(trace)
+        exporters = list(_exporters)
+    for exporter in exporters:
+        try:
+            exporter.export(trace)
+        except Exception:
+            logger.exception("Error exporting trace to %s", type(exporter).__name__)
+
+
+class LogExporter:
+    """
+    Logs one summary line per trace: total duration, slowest stages and counters.
+    """
+
+    def __init__(self, log=None, level=logging.INFO, top=5):
+        self.log = log or logger
+        self.level = level
+        self.top = top
+
+    def export(self, trace):
+        stages = []
+
+        def visit(node):
+            for child in node.get("children", []):
+                stages.append((child["duration_ms"], child["name"]))
+                visit(child)
+
+        visit(trace)
+        slowest = ", ".join(f"{name} {ms:.0f} ms" for ms, name in sorted(stages, reverse=True)[:self.top])
+        counters = ", ".join(
+            f"{name}={value:.4f}" if isinstance(value, float) else f"{name}={value}"
+            for name, value in trace.get("totals", {}).items()
+        )
+        self.log.log(self.level, "trace %s %s %.0f ms [%s] %s", trace.get("trace_id"),
+                     trace["name"], trace["duration_ms"], slowest, counters)
+
+
+class JSONLExporter:
+    """
+    Appends every trace as one JSON line to `path`.
+    """
+
+    def __init__(self, path=DEFAULT_TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OpenTelemetryExporter:
+    """
+    Re-emits every trace as OpenTelemetry spans with their original start and
+    end times. Needs the opentelemetry-api package; where the spans go is up
+    to the configured TracerProvider (e.g. opentelemetry-sdk with an OTLP exporter).
+    """
+
+    def __init__(self, tracer_provider=None, name="quoting-assistant"):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "The OpenTelemetry exporter needs the opentelemetry-api package "
+                "(pip install opentelemetry-api opentelemetry-sdk)."
+            ) from None
+        self._trace = trace
+        self.tracer = trace.get_tracer(name, tracer_provider=tracer_provider)
+
+    def export(self, trace):
+        self._emit(trace, None)
+
+    def _emit(self, node, parent):
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        start_ns = int(node["start"] * 1e9)
+        attributes = {
+            key: value for key, value in {**node.get("attributes", {}), **node.get("counters", {})}.items()
+            if isinstance(value, (str, bool, int, float))
+        }
+        otel_span = self.tracer.start_span(node["name"], context=context, start_time=start_ns,
+                                           attributes=attributes)
+        if node.get("error"):
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, node["error"]))
+        for child in node.get("children", []):
+            self._emit(child, otel_span)
+        otel_span.end(end_time=start_ns + int(node["duration_ms"] * 1e6))
+
+
+EXPORTERS = {
+    "log": LogExporter,
+    "jsonl": JSONLExporter,
+    "otel": OpenTelemetryExporter,
+}
+
+
+def configure(exporters):
+    """
+    Replaces the exporters every finished trace is sent to.
+    """
+    global _configured
+    with _lock:
+        _exporters[:] = list(exporters)
+        _configured = True
+
+
+def configure_from_env(force=False):
+    """
+    Sets up the exporters named in the comma-separated TRACE_EXPORTER
+    environment variable ("log", "jsonl", "otel"); JSONL traces go to
+    TRACE_FILE. Runs once per process unless `force` is set.
+    """
+    if _configured and not force:
+        return list(_exporters)
+    exporters = []
+    for name in filter(None, (n.strip() for n in os.getenv("TRACE_EXPORTER", "").split(","))):
+        if name not in EXPORTERS:
+            raise ValueError(f"Unknown trace exporter '{name}'. Available: {', '.join(EXPORTERS)}")
+        if name == "jsonl":
+            exporters.append(JSONLExporter(os.getenv("TRACE_FILE", DEFAULT_TRACE_FILE)))
+        else:
+            exporters.append(EXPORTERS[name]())
+    configure(exporters)
+    return exporters
+
+
+def reset():
+    """
+    Drops the exporters and the recent traces (mainly for tests).
+    """
+    global _configured
+    with _lock:
+        _exporters.clear()
+        _recent.clear()
+        _configured = False
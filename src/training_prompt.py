@@ -1,12 +1,17 @@
-def cnc_training_prompt(query,similar_price,similar_part,similar_features):
-    return f"""
+# Bump whenever the prompt text changes, so cached quotes from the old prompt are not re-used
+PROMPT_VERSION = "2"
+
+# Everything that is the same for every quote comes first and is sent as its own
+# message, so the provider can serve it from its prompt-prefix cache; only the
+# short REFERENCE section at the end changes per part.
+CNC_PROMPT_PREFIX = """
 You are a quoting assistant for CNC manufacturing parts.
 Your job is to provide a DETAILED, LOGICAL, and TRANSPARENT price breakdown for a new part, using the closest past job as a reference.
 
 Follow these rules strictly:
 
-1. **ALWAYS anchor the Total Quote to the similar past job’s price (CHF {similar_price}). Do NOT invent new totals or change the sum.**
-2. **The sum of Base Material, Size Adjustment, Operations Fee, and Finish Fee MUST equal the Total Quote (CHF {similar_price}).**
+1. **ALWAYS anchor the Total Quote to the similar past job’s price (the Reference Price given at the end). Do NOT invent new totals or change the sum.**
+2. **The sum of Base Material, Size Adjustment, Operations Fee, and Finish Fee MUST equal the Total Quote (the Reference Price).**
 3. **Use the features below to distribute the cost:**
     - Base Material: Scales with volume (Size) and Material type (e.g., Steel > Aluminum > Plastic > ABS > Brass > Copper > Bronze)
     - Size Adjustment: Higher for larger or unusually shaped parts.
@@ -84,7 +89,11 @@ Follow these rules strictly:
 - Finish Fee
 - Total Quote
 - Explanation
+"""
+
 
+def cnc_prompt_suffix(query, similar_price, similar_part, similar_features):
+    return f"""
 ---
 
 REFERENCE:
@@ -92,4 +101,30 @@ REFERENCE:
 - Closest past part: "{similar_part}"
 - Features: {similar_features}
 - Reference Price: CHF {similar_price}
-"""
\ No newline at end of file
+"""
+
+
+def cnc_prompt_sections(query, similar_price, similar_part, similar_features):
+    """
+    The quoting prompt as {"static": shared prefix, "dynamic": per-part suffix}.
+    """
+    return {
+        "static": CNC_PROMPT_PREFIX,
+        "dynamic": cnc_prompt_suffix(query, similar_price, similar_part, similar_features),
+    }
+
+
+def cnc_training_prompt(query,similar_price,similar_part,similar_features):
+    return CNC_PROMPT_PREFIX + cnc_prompt_suffix(query, similar_price, similar_part, similar_features)
+
+def explanation_prompt(query, similar_part, breakdown):
+    return f"""
+You are a quoting assistant for CNC manufacturing parts.
+The price breakdown below was already calculated; do NOT change or recalculate any number.
+Write ONE clear, specific sentence for the customer that explains what drives this price (not generic).
+Respond with only that sentence, no quotes or markdown.
+
+- New part: "{query}"
+- Closest past part: "{similar_part}"
+- Breakdown (CHF): {breakdown}
+"""
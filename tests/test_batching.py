@@ -0,0 +1,132 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import threading
+import time
+from unittest.mock import patch
+from src.batching import token_batches, call_with_retries, embed_in_batches
+from src.embed_parts import PartEmbedder
+
+
+@pytest.fixture
+def temp_chroma_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class StubEmbeddingClient:
+    """
+    Local stand-in for the embeddings endpoint: records batch sizes and the peak
+    number of in-flight requests, and can fail the first `fail_first` calls
+    with a rate-limit error.
+    """
+    def __init__(self, fail_first=0, delay=0.0):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, model=None):
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise RateLimited("slow down")
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.batch_sizes.append(len(texts))
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_token_batches_respect_budget():
+    texts = ["a" * 40] * 10  # ~11 tokens each with the character heuristic
+    batches = list(token_batches(texts, max_tokens=25, max_items=100, count_tokens=lambda t: 11))
+    assert [len(b) for b in batches] == [2, 2, 2, 2, 2]
+    assert [i for b in batches for i in b] == list(range(10))
+
+
+def test_token_batches_respect_item_limit():
+    batches = list(token_batches(["x"] * 7, max_tokens=10_000, max_items=3))
+    assert [len(b) for b in batches] == [3, 3, 1]
+
+
+def test_oversized_text_gets_its_own_batch():
+    batches = list(token_batches(["small", "huge", "small"], max_tokens=10,
+                                 count_tokens=lambda t: 50 if t == "huge" else 1))
+    assert batches == [[0], [1], [2]]
+
+
+def test_retries_rate_limit_then_succeeds():
+    stub = StubEmbeddingClient(fail_first=2)
+    sleeps = []
+    result = call_with_retries(stub, ["part"], sleep=sleeps.append)
+    assert result == [[4.0, 1.0]]
+    assert len(sleeps) == 2
+    assert sleeps[1] > sleeps[0] / 2  # backoff grows (with jitter)
+
+
+def test_non_retryable_error_is_raised_immediately():
+    calls = []
+
+    def broken(texts):
+        calls.append(texts)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        call_with_retries(broken, ["part"], sleep=lambda s: None)
+    assert len(calls) == 1
+
+
+def test_concurrency_cap():
+    stub = StubEmbeddingClient(delay=0.02)
+    results = {}
+
+    def on_batch(indices, embeddings):
+        for i, emb in zip(indices, embeddings):
+            results[i] = emb
+
+    texts = [f"part {i}" for i in range(40)]
+    embed_in_batches(texts, stub, on_batch, max_concurrency=3, max_items=4)
+    assert stub.peak_in_flight <= 3
+    assert len(stub.batch_sizes) == 10
+    assert [results[i][0] for i in range(40)] == [float(len(t)) for t in texts]
+
+
+def test_process_dataframe_upserts_every_batch(temp_chroma_dir):
+    n = 25
+    df = pd.DataFrame({
+        "Part Description": [f"Aluminum bracket #{i}" for i in range(n)],
+        "Material": ["Aluminum"] * n,
+        "Size": ["100x50x5"] * n,
+        "Operations": ["Drilling"] * n,
+        "Finish": ["Anodized"] * n,
+        "Target Price (CHF)": list(range(n))
+    })
+    stub = StubEmbeddingClient(fail_first=1)
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(stub)), \
+            patch("src.batching.time.sleep"):
+        embedder = PartEmbedder(
+            chroma_dir=temp_chroma_dir,
+            collection_name="batched_test",
+            max_batch_size=4,
+            max_concurrency=2
+        )
+        upserts = []
+        original_upsert = embedder.collection.upsert
+        with patch.object(embedder.collection, "upsert",
+                          side_effect=lambda **kw: (upserts.append(len(kw["ids"])), original_upsert(**kw))):
+            embedder.process_dataframe(df)
+
+    assert sum(stub.batch_sizes) == n
+    assert max(upserts) <= 4
+    assert embedder.collection.count() == n
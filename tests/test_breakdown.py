@@ -0,0 +1,156 @@
+import pytest
+import json
+import os
+import tempfile
+import shutil
+import numpy as np
+from unittest.mock import patch
+from src import quoting
+from src.breakdown import BreakdownRules, CATEGORIES, volume_scale
+from src.features import PartFeatures
+
+REFERENCE = PartFeatures.feature_dict({
+    "Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+    "Finish": "Anodized", "Target Price (CHF)": 60
+})
+
+
+def features(**row):
+    base = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling", "Finish": "Anodized"}
+    return PartFeatures.feature_dict({**base, **row})
+
+
+def check_rules(breakdown, rules, reference_price):
+    amounts = [breakdown[c] for c in CATEGORIES]
+    total = breakdown["Total Quote"]
+    assert sum(amounts) == total
+    assert total >= rules.min_charge
+    assert total <= max(reference_price, rules.min_charge)
+    assert all(isinstance(a, int) and a >= 0 for a in amounts)
+    positive = sum(1 for a in amounts if a > 0)
+    if positive >= 2:
+        assert max(amounts) <= max(int(rules.max_share * total), -(-total // positive))
+
+
+@pytest.fixture
+def rules():
+    return BreakdownRules()
+
+
+def test_same_part_matches_prompt_example(rules):
+    breakdown = rules.breakdown(features(), REFERENCE, 60)
+    assert {c: breakdown[c] for c in CATEGORIES} == {
+        "Base Material": 20, "Size Adjustment": 10, "Operations Fee": 20, "Finish Fee": 10
+    }
+    assert breakdown["Total Quote"] == 60
+    assert set(breakdown) == set(quoting.BREAKDOWN_KEYS)
+
+
+def test_none_and_raw_have_no_fees(rules):
+    breakdown = rules.breakdown(features(Operations="none", Finish="Raw"), REFERENCE, 60)
+    assert breakdown["Operations Fee"] == 0
+    assert breakdown["Finish Fee"] == 0
+    check_rules(breakdown, rules, 60)
+
+
+def test_minimum_charge(rules):
+    breakdown = rules.breakdown(features(Size="1x1x1", Operations="none", Finish="raw"), REFERENCE, 60)
+    assert breakdown["Total Quote"] == 10
+    assert "minimum charge" in breakdown["Explanation"]
+    check_rules(breakdown, rules, 60)
+
+
+@pytest.mark.parametrize("price, total", [(61.5, 61), (24.99, 24)])
+def test_fractional_reference_price_is_not_exceeded(rules, price, total):
+    breakdown = rules.breakdown(features(), REFERENCE, price)
+    assert breakdown["Total Quote"] == total
+    check_rules(breakdown, rules, price)
+
+
+def test_reference_below_minimum_charge(rules):
+    breakdown = rules.breakdown(features(), REFERENCE, 4.5)
+    assert breakdown["Total Quote"] == rules.min_charge
+    assert "above the reference part's price of CHF 4.5" in breakdown["Explanation"]
+    check_rules(breakdown, rules, 4.5)
+
+
+def test_more_complex_part_is_held_at_reference(rules):
+    breakdown = rules.breakdown(
+        features(Operations="Drilling, Milling, Hobbing", Finish="anodized, polished, painted"), REFERENCE, 60
+    )
+    assert breakdown["Total Quote"] == 60
+    assert breakdown["Operations Fee"] <= 36
+    check_rules(breakdown, rules, 60)
+
+
+def test_rules_hold_for_random_parts(rules):
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        part = features(
+            Material=rng.choice(["Steel", "ABS", "Bronze", "Unobtainium", ""]),
+            Size=rng.choice(["1x1x1", "10x5x0.5", "200x150x20 mm", "unknown", "2x2x2 m"]),
+            Operations=rng.choice(["none", "Drilling", "Milling, Turning, Tapping", "laser cut", ""]),
+            Finish=rng.choice(["raw", "None", "polished", "tin plated, brushed", ""]),
+        )
+        price = int(rng.integers(1, 500))
+        check_rules(rules.breakdown(part, dict(REFERENCE, **{"Target Price (CHF)": price}), price), rules, price)
+
+
+def test_split_caps_each_category(rules):
+    amounts = rules.split(100, {"Base Material": 10.0, "Size Adjustment": 0.1,
+                                "Operations Fee": 0.0, "Finish Fee": 0.1})
+    assert amounts == {"Base Material": 60, "Size Adjustment": 20, "Operations Fee": 0, "Finish Fee": 20}
+
+
+def test_weight_tables_from_file(rules):
+    d = tempfile.mkdtemp()
+    try:
+        path = os.path.join(d, "rules.json")
+        with open(path, "w") as f:
+            json.dump({"material_weights": {"Aluminum": 8.0}, "min_charge": 25}, f)
+        custom = BreakdownRules.from_file(path)
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+    assert custom.material_weights["aluminum"] == 8.0
+    assert custom.material_weights["steel"] == rules.material_weights["steel"]
+    breakdown = custom.breakdown(features(), REFERENCE, 60)
+    assert breakdown["Base Material"] > 20
+    assert custom.breakdown(features(Size="1x1x1"), REFERENCE, 60)["Total Quote"] == 25
+
+
+def test_reference_without_price_is_rejected(rules):
+    with pytest.raises(ValueError):
+        rules.breakdown(features(), REFERENCE, "")
+
+
+def test_volume_scale():
+    assert volume_scale(1000.0, 8000.0) == pytest.approx(0.5)
+    assert volume_scale(None, 8000.0) == 1.0
+    assert volume_scale(1.0, 1e12) == 0.05
+
+
+def test_quote_part_only_asks_llm_for_explanation():
+    row = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+           "Finish": "Anodized", "Part Description": "Aluminum bracket"}
+    meta = {k: v for k, v in REFERENCE.items() if v is not None}
+    prompts = []
+
+    def stub(prompt, model=None, **kwargs):
+        prompts.append(prompt)
+        return '"Same bracket as before, so the same price."'
+
+    with patch.object(quoting, "request_completion", stub):
+        quiet, _ = quoting.quote_part(row, "Aluminum bracket", meta)
+        assert prompts == []
+        explained, _ = quoting.quote_part(row, "Aluminum bracket", meta, explain=True)
+    assert len(prompts) == 1
+    assert explained["Explanation"] == "Same bracket as before, so the same price."
+    assert {k: explained[k] for k in CATEGORIES} == {k: quiet[k] for k in CATEGORIES}
+
+    def failing(prompt, model=None, **kwargs):
+        raise RuntimeError("offline")
+
+    with patch.object(quoting, "request_completion", failing), \
+            patch("src.batching.time.sleep"):
+        fallback, _ = quoting.quote_part(row, "Aluminum bracket", meta, explain=True)
+    assert fallback["Explanation"] == quiet["Explanation"]
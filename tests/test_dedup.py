@@ -0,0 +1,145 @@
+import pytest
+import shutil
+import tempfile
+import pandas as pd
+from src.dedup import (Deduplicator, GROUP_SIZE_KEY, PRICE_MAX_KEY, PRICE_MEDIAN_KEY, PRICE_MIN_KEY,
+                       describe_group, price_stats)
+from src.embed_parts import PartEmbedder, FINGERPRINT_KEY
+from src.embedding_backends import HashingEmbeddingBackend
+from src.price_model import training_frame
+from src import quoting
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def catalog(rows):
+    """
+    rows: (description, size, price), all aluminum, drilled and anodized.
+    """
+    return pd.DataFrame({
+        "Part Description": [d for d, _, _ in rows],
+        "Material": ["Aluminum"] * len(rows),
+        "Size": [s for _, s, _ in rows],
+        "Operations": ["Drilling"] * len(rows),
+        "Finish": ["Anodized"] * len(rows),
+        "Target Price (CHF)": [p for _, _, p in rows],
+    })
+
+
+ERP_EXPORT = [
+    ("Aluminum bracket", "100x50x5", 60),
+    ("Aluminum bracket", "100x50x5", 62),       # exact duplicate, another price
+    ("Aluminum bracket", "100.2x50x5", 64),     # a fraction of a millimetre apart
+    ("Aluminum bracket", "50x100x5", 58),       # same part, turned around
+    ("Aluminum bracket", "120x50x5", 90),       # a bigger part
+    ("Aluminum heatsink with 12 fins", "100x50x5", 75),  # same size, different part
+]
+
+
+def embedder(temp_dir, **options):
+    return PartEmbedder(temp_dir, "dedup", backend="hashing", index_backend="numpy", dedup=True, **options)
+
+
+def test_ids_differ_for_parts_sharing_a_description():
+    df = catalog(ERP_EXPORT)
+    ids = [PartEmbedder.generate_id(row) for _, row in df.iterrows()]
+    assert ids[0] == ids[1]
+    assert len(set(ids)) == 5
+    steel = df.iloc[0].copy()
+    steel["Material"] = "Steel"
+    assert PartEmbedder.generate_id(steel) != ids[0]
+    spaced = df.iloc[0].copy()
+    spaced["Finish"] = "  anodized "
+    assert PartEmbedder.generate_id(spaced) == ids[0]
+
+
+@pytest.mark.parametrize("part_store", [False, True])
+def test_duplicates_collapse_into_one_entry_with_price_stats(temp_dir, part_store):
+    e = embedder(temp_dir, part_store=part_store)
+    e.process_dataframe(catalog(ERP_EXPORT))
+    assert e.collection.count() == 3
+
+    result = e.query_many(["Aluminum bracket", "Aluminum heatsink with 12 fins"], n_results=1)
+    meta = result["metadatas"][0][0]
+    assert result["documents"][0][0].endswith("Description: Aluminum bracket")
+    assert meta[GROUP_SIZE_KEY] == 4
+    assert (meta[PRICE_MIN_KEY], meta[PRICE_MEDIAN_KEY], meta[PRICE_MAX_KEY]) == (58, 61, 64)
+    assert meta["Target Price (CHF)"] == 61
+    assert describe_group(meta) == "Median of 4 near-identical parts (CHF 58–64)"
+    assert GROUP_SIZE_KEY not in result["metadatas"][1][0]
+
+    features, _ = training_frame(e)
+    assert sorted(features["Target Price (CHF)"]) == [61, 75, 90]
+
+
+def test_sync_tracks_groups(temp_dir):
+    e = embedder(temp_dir)
+    assert e.sync_dataframe(catalog(ERP_EXPORT)) == {"added": 3, "updated": 0, "unchanged": 0, "deleted": 0}
+    assert e.sync_dataframe(catalog(ERP_EXPORT))["unchanged"] == 3
+
+    repriced = list(ERP_EXPORT)
+    repriced[2] = ("Aluminum bracket", "100.2x50x5", 70)
+    assert e.sync_dataframe(catalog(repriced)) == {"added": 0, "updated": 1, "unchanged": 2, "deleted": 0}
+    stored = {m[GROUP_SIZE_KEY] if GROUP_SIZE_KEY in m else 1: m for _, m in e.iter_metadatas()}
+    assert stored[4][PRICE_MAX_KEY] == 70 and FINGERPRINT_KEY in stored[4]
+
+    # Dropping a member changes the group; dropping its representative re-keys it
+    assert e.sync_dataframe(catalog(repriced[:3] + repriced[4:])) == \
+        {"added": 0, "updated": 1, "unchanged": 2, "deleted": 0}
+    assert e.sync_dataframe(catalog(repriced[2:])) == {"added": 1, "updated": 0, "unchanged": 2, "deleted": 1}
+
+
+def test_embedding_distance_keeps_different_parts_apart():
+    rows = catalog(ERP_EXPORT).to_dict(orient="records")
+    ids = [PartEmbedder.generate_id(row) for row in rows]
+    backend = HashingEmbeddingBackend()
+
+    def embed(texts):
+        embed.calls.append(list(texts))
+        return backend.embed(texts)
+    embed.calls = []
+
+    groups = Deduplicator().groups(rows, ids, embed)
+    assert sorted(sorted(g) for g in groups) == [[0, 1, 2, 3], [4], [5]]
+    # The smallest size leads (rows 0, 1 and 3 tie), and the latest of exact duplicates represents them
+    assert groups[[0 in g for g in groups].index(True)][0] in (1, 3)
+    assert embed.calls == [["aluminum bracket", "aluminum heatsink with # fins"]]
+
+    exact_size = Deduplicator(size_tolerance=0, min_size_tolerance_mm=0)
+    assert sorted(sorted(g) for g in exact_size.groups(rows, ids, embed)) == [[0, 1, 3], [2], [4], [5]]
+    any_text = Deduplicator(size_tolerance=0, min_size_tolerance_mm=0, max_distance=1.0)
+    assert sorted(sorted(g) for g in any_text.groups(rows, ids, embed)) == [[0, 1, 3, 5], [2], [4]]
+
+
+def test_comparison_text_masks_sizes():
+    assert Deduplicator.comparison_text("Aluminum bracket, 100.2 x 50 x 5 mm") == "aluminum bracket #"
+    assert Deduplicator.comparison_text("Steel gear 30x30x10mm; milling") == "steel gear # milling"
+    assert Deduplicator.comparison_text("Brass nut M8") == "brass nut m#"
+
+
+def test_unparseable_sizes_only_merge_exact_duplicates():
+    rows = catalog([("Bracket", "see drawing", 10), ("Bracket", "see drawing", 20), ("Bracket", "", 30)])
+    rows = rows.to_dict(orient="records")
+    ids = [PartEmbedder.generate_id(row) for row in rows]
+    groups = Deduplicator().groups(rows, ids, lambda texts: pytest.fail("no embedding needed"))
+    assert sorted(sorted(g) for g in groups) == [[0, 1], [2]]
+
+
+def test_price_stats():
+    assert price_stats([60, "62", None, "n/a", 0, 65]) == {"min": 60, "median": 62, "max": 65}
+    assert price_stats([60, 61]) == {"min": 60, "median": 60.5, "max": 61}
+    assert price_stats([None, "n/a"]) is None
+
+
+def test_batch_quotes_report_the_reference_price_range(temp_dir):
+    e = embedder(temp_dir)
+    e.process_dataframe(catalog(ERP_EXPORT))
+    bom = catalog([("Aluminum bracket", "100x50x5", None)]).drop(columns=["Target Price (CHF)"])
+    (_, row), = quoting.quote_parts(e, bom)
+    assert row["Reference Price (CHF)"] == 61
+    assert row["Reference Price Range"] == "Median of 4 near-identical parts (CHF 58–64)"
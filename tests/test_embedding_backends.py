@@ -0,0 +1,133 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import os
+import time
+import numpy as np
+from unittest.mock import patch
+from src.embed_parts import PartEmbedder, BACKEND_KEY, DIMENSION_KEY, QUANTIZATION_KEY
+from src.embedding_backends import (
+    HashingEmbeddingBackend, OpenAIEmbeddingBackend, get_backend
+)
+from src.embedding_cache import EmbeddingCache
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "Data", "sample_data.csv")
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def no_remote_calls(texts, model=None):
+    raise AssertionError("the OpenAI API must not be called with a local backend")
+
+
+def test_hashing_backend_vectors():
+    backend = HashingEmbeddingBackend(n_features=256)
+    vectors = np.array(backend.embed(["Aluminum bracket", "Aluminum bracket", "Steel gear"]))
+    assert vectors.shape == (3, 256)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.allclose(vectors[0], vectors[1])
+    close = backend.embed(["Aluminium bracket"])[0]
+    assert np.dot(vectors[0], close) > np.dot(vectors[0], vectors[2])
+
+
+def test_get_backend_by_name_and_env():
+    assert isinstance(get_backend("hashing"), HashingEmbeddingBackend)
+    with patch.dict(os.environ, {"EMBEDDING_BACKEND": "hashing"}):
+        assert isinstance(get_backend(), HashingEmbeddingBackend)
+    with patch.dict(os.environ, {}, clear=True):
+        assert isinstance(get_backend(), OpenAIEmbeddingBackend)
+    with pytest.raises(ValueError):
+        get_backend("nope")
+
+
+def test_local_backend_indexes_and_queries_offline(temp_dir):
+    df = pd.read_csv(SAMPLE_CSV).drop_duplicates("Part Description")
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(no_remote_calls)):
+        embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="local_test", backend="hashing")
+        embedder.process_dataframe(df)
+        result = embedder.query("Brass bushing 40x20x15 turning polished", n_results=1)
+    assert "Brass bushing" in result["documents"][0][0]
+    assert embedder.collection.metadata[BACKEND_KEY] == embedder.backend.model_id
+    assert embedder.collection.metadata[DIMENSION_KEY] == 1024
+
+
+def test_local_backend_query_latency():
+    backend = HashingEmbeddingBackend()
+    backend.embed(["warm up"])
+    timings = []
+    for _ in range(50):
+        start = time.perf_counter()
+        backend.embed(["Aluminum bracket, 100x50x5 mm, drilling, anodized"])
+        timings.append(time.perf_counter() - start)
+    assert sorted(timings)[len(timings) // 2] < 0.02
+
+
+def test_backends_are_never_mixed(temp_dir):
+    PartEmbedder(chroma_dir=temp_dir, collection_name="mixed_test", backend="hashing")
+    with pytest.raises(ValueError, match="embedding backend"):
+        PartEmbedder(chroma_dir=temp_dir, collection_name="mixed_test")
+    with pytest.raises(ValueError):
+        PartEmbedder(chroma_dir=temp_dir, collection_name="mixed_test",
+                     backend=HashingEmbeddingBackend(n_features=512))
+
+
+def test_legacy_collection_is_tagged(temp_dir):
+    embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="legacy_test")
+    embedder.client.delete_collection("legacy_test")
+    embedder.client.create_collection("legacy_test")
+    reopened = PartEmbedder(chroma_dir=temp_dir, collection_name="legacy_test")
+    assert reopened.collection.metadata[BACKEND_KEY] == "text-embedding-3-small"
+
+
+def test_cache_is_keyed_by_backend(temp_dir):
+    cache = EmbeddingCache(os.path.join(temp_dir, "cache.sqlite"))
+    embedder = PartEmbedder(chroma_dir=os.path.join(temp_dir, "chroma"), collection_name="cache_backend",
+                            backend="hashing", embedding_cache=cache)
+    embedder.embed_texts(["Steel gear"])
+    assert cache.get_many(embedder.backend.model_id, ["Steel gear"])[0] is not None
+    assert cache.get_many("text-embedding-3-small", ["Steel gear"])[0] is None
+
+
+def test_openai_reduced_dimensions(temp_dir):
+    backend = OpenAIEmbeddingBackend(dimensions=512)
+    assert (backend.model_id, backend.dimension) == ("text-embedding-3-small@512", 512)
+    assert OpenAIEmbeddingBackend(dimensions=1536).model_id == "text-embedding-3-small"
+    with pytest.raises(ValueError):
+        OpenAIEmbeddingBackend("text-embedding-ada-002", dimensions=256)
+    with pytest.raises(ValueError):
+        OpenAIEmbeddingBackend(dimensions=4096)
+
+    requests = []
+
+    def fake(texts, model=None, dimensions=None):
+        requests.append((model, dimensions))
+        return [[1.0] * 512 for _ in texts]
+
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(fake)):
+        embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="short_test",
+                                index_backend="numpy", dimensions=512)
+        embedder.embed_texts(["Steel gear"])
+    assert requests == [("text-embedding-3-small", 512)]
+    assert embedder.collection.metadata[DIMENSION_KEY] == 512
+    # Full-length vectors cannot be added to a collection of shortened ones
+    with pytest.raises(ValueError, match="embedding backend"):
+        PartEmbedder(chroma_dir=temp_dir, collection_name="short_test", index_backend="numpy")
+
+
+def test_compression_is_recorded_on_the_collection(temp_dir):
+    embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="quant_test", backend="hashing",
+                            index_backend="numpy", quantization="binary", rerank=20)
+    assert embedder.collection.metadata[QUANTIZATION_KEY] == "binary"
+    assert embedder.collection.metadata["index_rerank"] == 20
+    reopened = PartEmbedder(chroma_dir=temp_dir, collection_name="quant_test", backend="hashing",
+                            index_backend="numpy")
+    assert QUANTIZATION_KEY not in reopened.collection.metadata
+    with pytest.raises(ValueError):
+        PartEmbedder(chroma_dir=temp_dir, collection_name="quant_chroma", backend="hashing",
+                     quantization="int8")
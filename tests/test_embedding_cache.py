@@ -0,0 +1,115 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+from src.embed_parts import PartEmbedder
+from src.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+@pytest.fixture
+def small_test_df():
+    return pd.DataFrame({
+        "Part Description": [
+            "Aluminum bracket, 100x50x5 mm, drilling, anodized",
+            "Steel gear, 30x30x10 mm, milling, painted"
+        ],
+        "Material": ["Aluminum", "Steel"],
+        "Size": ["100x50x5", "30x30x10"],
+        "Operations": ["Drilling", "Milling"],
+        "Finish": ["Anodized", "Painted"],
+        "Target Price (CHF)": [60, 80]
+    })
+
+
+class CountingEmbeddings:
+    """
+    Stand-in for PartEmbedder.get_embeddings that records every text sent to the "API".
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, model=None):
+        self.calls.append(list(texts))
+        return [[1.0] * 8 if "Aluminum" in t else [0.0] * 7 + [1.0] for t in texts]
+
+    @property
+    def texts_sent(self):
+        return [t for call in self.calls for t in call]
+
+
+def test_hit_miss_counters_and_persistence(temp_dir):
+    path = os.path.join(temp_dir, "cache.sqlite")
+    cache = EmbeddingCache(path)
+    assert cache.get_many("m", ["a", "b"]) == [None, None]
+    cache.put_many("m", ["a"], [[0.5, 0.25]])
+    assert cache.get_many("m", ["a", "b"]) == [[0.5, 0.25], None]
+    assert cache.hits == 1
+    assert cache.misses == 3
+    cache.close()
+
+    # A new instance sees the vectors written by the previous one
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many("m", ["a"]) == [[0.5, 0.25]]
+
+
+def test_key_includes_model_name(temp_dir):
+    cache = EmbeddingCache(os.path.join(temp_dir, "cache.sqlite"))
+    cache.put_many("model-a", ["text"], [[1.0]])
+    assert cache.get_many("model-b", ["text"]) == [None]
+
+
+def test_lru_eviction(temp_dir):
+    cache = EmbeddingCache(os.path.join(temp_dir, "cache.sqlite"), max_entries=2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("m", ["a"])  # "b" is now least recently used
+    cache.put_many("m", ["c"], [[3.0]])
+    assert len(cache) == 2
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_reindex_only_embeds_new_texts(temp_dir, small_test_df):
+    """
+    Re-processing an unchanged catalog should not call the embeddings API again.
+    """
+    fake = CountingEmbeddings()
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(fake)):
+        embedder = PartEmbedder(
+            chroma_dir=os.path.join(temp_dir, "chroma"),
+            collection_name="cache_test",
+            embedding_cache=EmbeddingCache(os.path.join(temp_dir, "cache.sqlite"))
+        )
+        embedder.process_dataframe(small_test_df)
+        assert len(fake.texts_sent) == 2
+
+        embedder.process_dataframe(small_test_df)
+        assert len(fake.texts_sent) == 2
+
+        extra = small_test_df.iloc[[0]].assign(**{"Part Description": "Aluminum plate, 10x10x1 mm"})
+        embedder.process_dataframe(pd.concat([small_test_df, extra]))
+        assert fake.texts_sent[-1].endswith("Aluminum plate, 10x10x1 mm")
+        assert len(fake.texts_sent) == 3
+
+
+def test_query_uses_cache(temp_dir, small_test_df):
+    fake = CountingEmbeddings()
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(fake)):
+        embedder = PartEmbedder(
+            chroma_dir=os.path.join(temp_dir, "chroma"),
+            collection_name="cache_query_test",
+            embedding_cache=EmbeddingCache(os.path.join(temp_dir, "cache.sqlite"))
+        )
+        embedder.process_dataframe(small_test_df)
+        first = embedder.query("Aluminum", n_results=1)
+        second = embedder.query("Aluminum", n_results=1)
+        assert fake.texts_sent.count("Aluminum") == 1
+        assert first["ids"] == second["ids"]
+        assert embedder.embedding_cache.stats()["hits"] >= 1
@@ -0,0 +1,128 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import json
+import os
+from src import resources
+from src.engine import QuotingEngine, NoReferenceError
+from src.cli import main
+
+
+@pytest.fixture
+def engine():
+    resources.reset()
+    d = tempfile.mkdtemp()
+    yield QuotingEngine(data_dir=d, embedding_backend="hashing", index_backend="numpy")
+    resources.reset()
+    shutil.rmtree(d, ignore_errors=True)
+
+
+@pytest.fixture
+def catalog_df():
+    return pd.DataFrame({
+        "Part Description": [
+            "Aluminum bracket, 100x50x5 mm, drilling, anodized",
+            "Steel gear, 30x30x10 mm, milling, painted",
+            "Brass bushing, 40x20x15 mm, turning, polished"
+        ],
+        "Material": ["Aluminum", "Steel", "Brass"],
+        "Size": ["100x50x5", "30x30x10", "40x20x15"],
+        "Operations": ["Drilling", "Milling", "Turning"],
+        "Finish": ["Anodized", "Painted", "Polished"],
+        "Target Price (CHF)": [60, 80, 55]
+    })
+
+
+def bracket(**overrides):
+    return dict({
+        "Part Description": "Aluminum bracket, 110x50x5 mm, drilling, anodized",
+        "Material": "Aluminum",
+        "Size": "110x50x5",
+        "Operations": "Drilling",
+        "Finish": "Anodized"
+    }, **overrides)
+
+
+def test_paths_match_the_app_layout():
+    engine = QuotingEngine(data_dir="data", embedding_backend="hashing", index_backend="numpy")
+    assert engine.collection_name == "parts_db_hashing"
+    assert engine.chroma_dir == os.path.join("data", "chroma_db")
+    assert engine.price_model_path == os.path.join("data", "price_models", "parts_db_hashing_numpy.joblib")
+    assert QuotingEngine().collection_name == "parts_db"
+    assert QuotingEngine(embedding_dimensions=512).collection_name == "parts_db_d512"
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setenv("DEDUP", "0")
+    monkeypatch.setenv("SHARD_BY", "")
+    engine = QuotingEngine.from_env(data_dir="elsewhere")
+    assert engine.embedding_backend == "hashing"
+    assert engine.dedup is False
+    assert engine.shard_by is None
+    assert engine.data_dir == "elsewhere"
+
+
+def test_index_then_quote(engine, catalog_df):
+    summary = engine.index(catalog_df)
+    assert summary["mode"] == "full"
+    assert summary["rows"] == 3
+
+    result = engine.quote(bracket(), use_price_model=False)
+    assert result["source"] == "rules"
+    assert result["reference"]["part"].endswith(catalog_df["Part Description"][0])
+    assert result["reference"]["price"] == 60
+    assert result["breakdown"]["Total Quote"] > 0
+    assert result["query_features"]["Target Price (CHF)"] == result["breakdown"]["Total Quote"]
+    # Plain JSON all the way down, as the service returns it
+    json.dumps(result, allow_nan=False)
+
+
+def test_sync_reports_changes(engine, catalog_df):
+    engine.index(catalog_df)
+    changed = catalog_df.copy()
+    changed.loc[1, "Target Price (CHF)"] = 85
+    summary = engine.index(changed.iloc[:2], mode="sync")
+    assert summary["mode"] == "sync"
+    assert (summary["updated"], summary["deleted"], summary["unchanged"]) == (1, 1, 1)
+
+
+def test_quote_errors(engine, catalog_df):
+    with pytest.raises(ValueError):
+        engine.quote(bracket(**{"Part Description": "  "}))
+    with pytest.raises(ValueError):
+        engine.quote(bracket(), engine="oracle")
+    with pytest.raises(ValueError):
+        engine.index(catalog_df, mode="append")
+
+    engine.index(catalog_df)
+    with pytest.raises(NoReferenceError):
+        engine.quote(bracket(Material="Titanium"), same_material=True)
+    result = engine.quote(bracket(Size="unknown"), volume_tolerance=0.2, use_price_model=False)
+    assert result["warnings"]
+
+
+def test_quote_table_keeps_order(engine, catalog_df):
+    engine.index(catalog_df)
+    bom = catalog_df.drop(columns=["Target Price (CHF)"]).iloc[::-1].reset_index(drop=True)
+    rows = engine.quote_table(bom, use_price_model=False)
+    assert [row["Part Description"] for row in rows] == list(bom["Part Description"])
+    assert all(row["Total Quote"] > 0 for row in rows)
+
+
+def test_cli_index_and_quote(engine, catalog_df, capsys):
+    catalog_path = os.path.join(engine.data_dir, "catalog.csv")
+    catalog_df.to_csv(catalog_path, index=False)
+    options = ["--data-dir", engine.data_dir, "--embedding-backend", "hashing", "--index-backend", "numpy"]
+
+    assert main(options + ["index", catalog_path]) == 0
+    assert json.loads(capsys.readouterr().out)["rows"] == 3
+
+    assert main(options + ["quote", "--description", "Steel gear, 30x30x12 mm",
+                           "--material", "Steel", "--size", "30x30x12", "--no-price-model"]) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result["reference"]["price"] == 80
+
+    assert main(options + ["quote", "--description", "gear", "--material", "Titanium",
+                           "--same-material"]) == 1
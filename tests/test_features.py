@@ -0,0 +1,75 @@
+import pytest
+import math
+import os
+import pandas as pd
+from unittest.mock import patch
+from src.features import PartFeatures
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "Data", "sample_data.csv")
+
+
+@pytest.fixture
+def variants_df():
+    sample = pd.read_csv(SAMPLE_CSV)
+    extra = pd.DataFrame({
+        "Part Description": ["variant"] * 9,
+        "Material": ["aluminum ", None, "STEEL", "brass", "Abs", "pvc", "", "x", 7],
+        "Size": ["100 x 50 x 5 mm", "10x5x0.5cm", "4x2x0.25 in", '4x2x.25"',
+                 "100mm x 50mm x 5mm", "100X50X5", "bad", None, "1x2"],
+        "Operations": ["Drilling, , Milling", "", None, "none", "a,b,", " , ", "x", "y", "z"],
+        "Finish": ["Anodized ", None, "Raw", "", "Painted", "x", "y", "z", "w"],
+        "Target Price (CHF)": [60, 10, None, 5, 7, 8, 9, 10, 11],
+    })
+    return pd.concat([sample, extra], ignore_index=True)
+
+
+@pytest.mark.parametrize("size, expected", [
+    ("100x50x5", 25000.0),
+    ("100x50x5 mm", 25000.0),
+    ("100 x 50 x 5 mm", 25000.0),
+    ("100*50*5", 25000.0),
+    ("10x5x0.5cm", 25000.0),
+    ("100mm x 50mm x 5mm", 25000.0),
+    ("1x1x1 in", 25.4 ** 3),
+    ('1x1x1"', 25.4 ** 3),
+    ("100x50", None),
+    ("abc", None),
+    ("", None),
+])
+def test_parse_volume_formats(size, expected):
+    volume = PartFeatures.parse_volume(size)
+    if expected is None:
+        assert volume is None
+    else:
+        assert volume == pytest.approx(expected)
+
+
+def assert_matches_scalar(frame, df):
+    assert list(frame.columns) == list(PartFeatures.feature_dict(df.iloc[0]).keys())
+    for (_, row), vectorized in zip(df.iterrows(), frame.to_dict(orient="records")):
+        scalar = PartFeatures.feature_dict(row)
+        for key, value in scalar.items():
+            got = vectorized[key]
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                assert got is None or (isinstance(got, float) and math.isnan(got)), key
+            else:
+                assert got == value, (key, got, value)
+
+
+def test_feature_frame_matches_feature_dict(variants_df):
+    assert_matches_scalar(PartFeatures.feature_frame(variants_df), variants_df)
+
+
+def test_feature_frame_without_pyarrow(variants_df):
+    with patch("src.features._pyarrow", return_value=None):
+        frame = PartFeatures.feature_frame(variants_df)
+    assert_matches_scalar(frame, variants_df)
+
+
+def test_feature_frame_missing_columns():
+    df = pd.DataFrame({"Part Description": ["a", "b"], "Size": ["1x1x1", None]})
+    frame = PartFeatures.feature_frame(df)
+    assert frame["Material"].tolist() == ["", ""]
+    assert frame["Volume_mm3"].iloc[0] == 1.0
+    assert frame["Size_Label"].tolist() == ["Small", "Unknown"]
+    assert frame["Operations_Count"].tolist() == [0, 0]
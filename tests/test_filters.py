@@ -0,0 +1,79 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+from src.embed_parts import PartEmbedder
+from src.features import PartFeatures
+
+
+@pytest.fixture
+def temp_chroma_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+@pytest.fixture
+def catalog_df():
+    return pd.DataFrame({
+        "Part Description": [
+            "Aluminum bracket, 100x50x5 mm, drilling, anodized",
+            "Steel bracket, 100x50x5 mm, drilling, painted",
+            "Steel bracket, 200x100x10 mm, drilling, painted",
+            "Stainless  Steel plate, 10x10x1 cm, laser cut, brushed",
+            "Brass bushing, size unknown, turning, polished"
+        ],
+        "Material": ["Aluminum", "Steel", "Steel", "Stainless  Steel", "Brass"],
+        "Size": ["100x50x5", "100x50x5", "200x100x10", "10x10x1 cm", "unknown"],
+        "Operations": ["Drilling", "Drilling", "Drilling, Milling", "Laser Cutting", "Turning"],
+        "Finish": ["Anodized", "Painted", "Painted", "Brushed", "Polished"],
+        "Target Price (CHF)": [60, 70, 120, 110, 55]
+    })
+
+
+@pytest.fixture
+def embedder(temp_chroma_dir, catalog_df):
+    embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="filter_test", backend="hashing")
+    embedder.process_dataframe(catalog_df)
+    return embedder
+
+
+def test_features_are_stored_as_typed_metadata(embedder):
+    stored = embedder.collection.get(include=["metadatas"])["metadatas"]
+    by_material = {m["Material"]: m for m in stored}
+    steel = by_material["Stainless  Steel"]
+    assert steel["Material_Norm"] == "stainless steel"
+    assert steel["Volume_mm3"] == pytest.approx(100_000.0)
+    assert steel["Size_Label"] == "Large"
+    assert steel["Operations_Count"] == 1
+    assert "Volume_mm3" not in by_material["Brass"]
+    assert by_material["Brass"]["Size_Label"] == "Unknown"
+
+
+def test_from_metadata_matches_feature_dict(embedder):
+    for meta in embedder.collection.get(include=["metadatas"])["metadatas"]:
+        assert PartFeatures.from_metadata(meta) == PartFeatures.feature_dict(meta)
+
+
+def test_material_filter(embedder):
+    where = PartEmbedder.build_filter(material="steel ")
+    result = embedder.query("Aluminum bracket 100x50x5 drilling anodized", n_results=5, where=where)
+    assert [m["Material"] for m in result["metadatas"][0]] == ["Steel", "Steel"]
+
+
+def test_volume_filter(embedder):
+    where = PartEmbedder.build_filter(volume_mm3=25_000, volume_tolerance=0.2)
+    result = embedder.query("bracket", n_results=5, where=where)
+    assert sorted(m["Material"] for m in result["metadatas"][0]) == ["Aluminum", "Steel"]
+
+
+def test_combined_filter(embedder):
+    where = PartEmbedder.build_filter(material="Steel", volume_mm3=200_000, volume_tolerance=0.1)
+    assert "$and" in where
+    result = embedder.query("bracket", n_results=5, where=where)
+    assert [m["Target Price (CHF)"] for m in result["metadatas"][0]] == [120]
+
+
+def test_no_filter():
+    assert PartEmbedder.build_filter() is None
+    assert PartEmbedder.build_filter(volume_mm3=100) is None
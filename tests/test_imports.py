@@ -0,0 +1,73 @@
+import pytest
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Third-party packages that take tens to hundreds of ms to import; none of them
+# may be loaded just by importing the modules below
+HEAVY = ("numpy", "pandas", "pyarrow", "chromadb", "openai", "sklearn", "streamlit")
+
+# Cold-start budget per module in ms (measured: features ~1, training_prompt
+# ~0.5, engine ~50, service and cli ~80 with asyncio). Importing engine used
+# to take ~1.6 s with chromadb and openai loaded eagerly.
+BUDGETS_MS = {
+    "src.features": 50,
+    "src.training_prompt": 50,
+    "src.embed_parts": 250,
+    "src.quoting": 250,
+    "src.resources": 250,
+    "src.engine": 300,
+    "src.service": 400,
+    "src.cli": 400,
+}
+
+
+def import_profile(module):
+    """
+    Imports `module` in a fresh interpreter with -X importtime and returns
+    {imported module: cumulative microseconds}.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def report(profile, top=10):
+    slowest = sorted(profile.items(), key=lambda item: item[1], reverse=True)[:top]
+    return "\n".join(f"{us / 1000:8.1f} ms  {name}" for name, us in slowest)
+
+
+def test_app_imports_only_streamlit_at_load():
+    # The Streamlit script cannot be imported outside `streamlit run`, so its
+    # module-level imports are read from the source instead
+    with open(os.path.join(ROOT, "src", "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.add(node.module.split(".")[0])
+    assert names & set(HEAVY) == {"streamlit"}
+
+
+@pytest.mark.parametrize("module", BUDGETS_MS)
+def test_cold_import_stays_light(module):
+    profile = import_profile(module)
+    loaded = sorted({name.split(".")[0] for name in profile} & set(HEAVY))
+    assert not loaded, f"importing {module} loads {loaded}:\n{report(profile)}"
+    elapsed_ms = profile[module] / 1000
+    assert elapsed_ms <= BUDGETS_MS[module], (
+        f"importing {module} took {elapsed_ms:.0f} ms (budget {BUDGETS_MS[module]} ms):\n{report(profile)}"
+    )
@@ -0,0 +1,93 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+from src.embed_parts import PartEmbedder
+from src.ingest import stream_ingest, scan_source, IngestCheckpoint
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "Data", "sample_data.csv")
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+class RecordingEmbedder:
+    """
+    Minimal stand-in for PartEmbedder that records the chunks it is given.
+    """
+    def __init__(self):
+        self.chunk_sizes = []
+        self.descriptions = []
+
+    def process_dataframe(self, df):
+        self.chunk_sizes.append(len(df))
+        self.descriptions.extend(df["Part Description"].tolist())
+
+
+def dummy_get_embeddings(texts, model=None):
+    return [[1.0, 0.0] if "Aluminum" in t else [0.0, 1.0] for t in texts]
+
+
+def test_scan_source_counts_rows():
+    _, rows = scan_source(SAMPLE_CSV)
+    assert rows == len(pd.read_csv(SAMPLE_CSV))
+
+
+def test_ingest_in_chunks():
+    embedder = RecordingEmbedder()
+    progress = []
+    summary = stream_ingest(embedder, SAMPLE_CSV, chunksize=10,
+                            on_progress=lambda done, total, rate: progress.append((done, total)))
+    expected = pd.read_csv(SAMPLE_CSV)["Part Description"].tolist()
+    assert embedder.descriptions == expected
+    assert max(embedder.chunk_sizes) == 10
+    assert summary["rows_processed"] == len(expected)
+    assert progress[-1] == (len(expected), len(expected))
+
+
+def test_resume_after_crash(temp_dir):
+    checkpoint_path = os.path.join(temp_dir, "checkpoint.json")
+    embedder = RecordingEmbedder()
+
+    def crash_after_two_chunks(done, total, rate):
+        if done >= 20:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        stream_ingest(embedder, SAMPLE_CSV, chunksize=10, checkpoint_path=checkpoint_path,
+                      on_progress=crash_after_two_chunks)
+    fingerprint, _ = scan_source(SAMPLE_CSV)
+    assert IngestCheckpoint(checkpoint_path).load(fingerprint) == 20
+
+    resumed = RecordingEmbedder()
+    summary = stream_ingest(resumed, SAMPLE_CSV, chunksize=10, checkpoint_path=checkpoint_path)
+    expected = pd.read_csv(SAMPLE_CSV)["Part Description"].tolist()
+    assert summary["resumed_from"] == 20
+    assert resumed.descriptions == expected[20:]
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_checkpoint_ignored_for_different_file(temp_dir):
+    checkpoint = IngestCheckpoint(os.path.join(temp_dir, "checkpoint.json"))
+    checkpoint.save("some-other-file", 40)
+    embedder = RecordingEmbedder()
+    summary = stream_ingest(embedder, SAMPLE_CSV, chunksize=10, checkpoint_path=checkpoint.path)
+    assert summary["resumed_from"] == 0
+    assert len(embedder.descriptions) == len(pd.read_csv(SAMPLE_CSV))
+
+
+def test_stream_into_chroma_from_file_object(temp_dir):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
+        embedder = PartEmbedder(
+            chroma_dir=os.path.join(temp_dir, "chroma"),
+            collection_name="stream_test"
+        )
+        with open(SAMPLE_CSV, "rb") as f:
+            stream_ingest(embedder, f, chunksize=7)
+    assert embedder.collection.count() == pd.read_csv(SAMPLE_CSV)["Part Description"].nunique()
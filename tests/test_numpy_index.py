@@ -0,0 +1,186 @@
+import pytest
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+from src import numpy_index
+from src.numpy_index import NumpyIndex
+from src.embed_parts import PartEmbedder
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def brute_force(matrix, query, k):
+    matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    query = query / np.linalg.norm(query)
+    return list(np.argsort(-(matrix @ query), kind="stable")[:k])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_top_k_matches_brute_force(temp_dir, dtype):
+    vectors = random_vectors(500)
+    ids = [f"id{i}" for i in range(500)]
+    index = NumpyIndex(os.path.join(temp_dir, "idx"), dtype=dtype)
+    index.upsert(ids=ids, embeddings=vectors, documents=ids, metadatas=[{"n": i} for i in range(500)])
+    queries = random_vectors(3, seed=1)
+    # Small chunks exercise the running top-k merge
+    with patch.object(numpy_index, "SCORE_CHUNK_ROWS", 64):
+        result = index.query(query_embeddings=queries, n_results=5)
+    for q, found in zip(queries, result["ids"]):
+        expected = [ids[i] for i in brute_force(vectors, q, 5)]
+        if dtype == "float32":
+            assert found == expected
+        else:
+            assert len(set(found) & set(expected)) >= 4
+    assert result["distances"][0] == sorted(result["distances"][0])
+    assert result["documents"][0] == result["ids"][0]
+
+
+def test_upsert_delete_and_reopen(temp_dir):
+    path = os.path.join(temp_dir, "idx")
+    index = NumpyIndex(path, metadata={"embedding_backend": "test"})
+    vectors = random_vectors(1500)
+    index.upsert(ids=[f"id{i}" for i in range(1500)], embeddings=vectors,
+                 metadatas=[{"n": i} for i in range(1500)])
+    index.upsert(ids=["id0"], embeddings=vectors[1:2], metadatas=[{"n": -1}])
+    index.delete(ids=["id1", "missing"])
+    assert index.count() == 1499
+
+    reopened = NumpyIndex(path)
+    assert reopened.count() == 1499
+    assert reopened.metadata == {"embedding_backend": "test"}
+    assert reopened.get(ids=["id0"])["metadatas"] == [{"n": -1}]
+    # id0 now holds id1's vector, and id1 is gone
+    hit = reopened.query(query_embeddings=[vectors[1]], n_results=1)
+    assert hit["ids"] == [["id0"]]
+    assert hit["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+    page = reopened.get(include=["metadatas"], limit=1000, offset=1000)
+    assert len(page["ids"]) == 499
+
+    reopened.compact()
+    compacted = NumpyIndex(path)
+    assert compacted.get(ids=["id0", "id1", "id2"])["metadatas"] == [{"n": -1}, {"n": 2}]
+
+
+def test_where_filters(temp_dir):
+    index = NumpyIndex(os.path.join(temp_dir, "idx"))
+    metadatas = [
+        {"Material_Norm": "steel", "Volume_mm3": 100.0},
+        {"Material_Norm": "steel", "Volume_mm3": 300.0},
+        {"Material_Norm": "aluminum", "Volume_mm3": 100.0},
+        {"Material_Norm": "brass"},
+    ]
+    index.upsert(ids=["a", "b", "c", "d"], embeddings=random_vectors(4), metadatas=metadatas)
+    query = random_vectors(1, seed=2)
+
+    def found(where):
+        return sorted(index.query(query_embeddings=query, n_results=10, where=where)["ids"][0])
+
+    assert found({"Material_Norm": {"$eq": "steel"}}) == ["a", "b"]
+    assert found({"Volume_mm3": {"$lte": 200.0}}) == ["a", "c"]
+    assert found({"$and": [{"Material_Norm": "steel"}, {"Volume_mm3": {"$gte": 200.0}}]}) == ["b"]
+    assert found({"Material_Norm": {"$in": ["brass", "aluminum"]}}) == ["c", "d"]
+    assert found({"Material_Norm": {"$eq": "titanium"}}) == []
+    with pytest.raises(ValueError):
+        found({"Material_Norm": {"$like": "st%"}})
+
+
+def test_embedder_with_numpy_index(temp_dir):
+    df = pd.DataFrame({
+        "Part Description": ["Aluminum bracket 100x50x5", "Steel gear 40x40x10", "Steel bracket 100x50x5"],
+        "Material": ["Aluminum", "Steel", "Steel"],
+        "Size": ["100x50x5", "40x40x10", "100x50x5"],
+        "Operations": ["Drilling", "Milling", "Drilling"],
+        "Finish": ["Anodized", "None", "Painted"],
+        "Target Price (CHF)": [60, 90, 70]
+    })
+    embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="np_test",
+                            backend="hashing", index_backend="numpy")
+    assert embedder.client is None
+    embedder.process_dataframe(df)
+    result = embedder.query("Aluminum bracket 100x50x5", n_results=1)
+    assert result["metadatas"][0][0]["Target Price (CHF)"] == 60
+    where = PartEmbedder.build_filter(material="steel")
+    batch = embedder.query_many(["bracket", "gear"], n_results=1, where=where)
+    assert [m[0]["Material"] for m in batch["metadatas"]] == ["Steel", "Steel"]
+
+    summary = embedder.sync_dataframe(df.iloc[:2])
+    assert summary == {"added": 0, "updated": 0, "unchanged": 2, "deleted": 1}
+
+    with pytest.raises(ValueError):
+        PartEmbedder(chroma_dir=temp_dir, collection_name="np_test",
+                     backend="hashing", index_backend="faiss")
+
+
+def clustered_vectors(n, dim=64, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_reranks_exactly(temp_dir, quantization):
+    # Sign bits need a few hundred dimensions to rank well
+    vectors = clustered_vectors(2000, dim=256)
+    ids = [f"id{i}" for i in range(2000)]
+    exact = NumpyIndex(os.path.join(temp_dir, "exact"))
+    exact.upsert(ids=ids, embeddings=vectors)
+    index = NumpyIndex(os.path.join(temp_dir, "idx"), quantization=quantization, rerank=10)
+    index.upsert(ids=ids, embeddings=vectors)
+    queries = vectors[:20] + 0.3 * random_vectors(20, dim=256, seed=1)
+    with patch.object(numpy_index, "SCORE_CHUNK_ROWS", 256):
+        truth = exact.query(query_embeddings=queries, n_results=5)
+        found = index.query(query_embeddings=queries, n_results=5)
+    assert [f[0] for f in found["ids"]] == [t[0] for t in truth["ids"]]
+    recall = np.mean([len(set(f) & set(t)) / 5 for f, t in zip(found["ids"], truth["ids"])])
+    assert recall >= 0.9
+    # Re-ranked with the float vectors, so shared results have exact distances
+    assert found["distances"][0][0] == pytest.approx(truth["distances"][0][0], abs=1e-6)
+    codes = np.load(os.path.join(temp_dir, "idx", numpy_index.CODES_FILE), mmap_mode="r")
+    assert codes.dtype == (np.int8 if quantization == "int8" else np.uint8)
+    assert codes.shape[1] == (256 if quantization == "int8" else 32)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_empty_quantized_index_reopens(temp_dir, quantization):
+    path = os.path.join(temp_dir, "idx")
+    NumpyIndex(path, quantization=quantization)
+    reopened = NumpyIndex(path, quantization=quantization)
+    assert reopened.count() == 0
+    vectors = clustered_vectors(50)
+    reopened.upsert(ids=[f"id{i}" for i in range(50)], embeddings=vectors)
+    again = NumpyIndex(path, quantization=quantization)
+    assert again.query(query_embeddings=vectors[7:8], n_results=1)["ids"] == [["id7"]]
+
+
+def test_quantization_changes_on_reopen(temp_dir):
+    path = os.path.join(temp_dir, "idx")
+    vectors = clustered_vectors(500)
+    ids = [f"id{i}" for i in range(500)]
+    NumpyIndex(path).upsert(ids=ids, embeddings=vectors)
+    expected = NumpyIndex(path).query(query_embeddings=vectors[:3], n_results=3)["ids"]
+
+    binary = NumpyIndex(path, quantization="binary")
+    assert binary.query(query_embeddings=vectors[:3], n_results=3)["ids"] == expected
+    # Deletes move codes along with their vectors
+    binary.delete(ids=["id1", "id2"])
+    binary.upsert(ids=["new"], embeddings=vectors[1:2])
+    reopened = NumpyIndex(path, quantization="binary")
+    assert reopened.query(query_embeddings=vectors[1:2], n_results=1)["ids"] == [["new"]]
+
+    plain = NumpyIndex(path)
+    assert not os.path.exists(os.path.join(path, numpy_index.CODES_FILE))
+    assert plain.query(query_embeddings=vectors[1:2], n_results=1)["ids"] == [["new"]]
+    with pytest.raises(ValueError):
+        NumpyIndex(path, quantization="int4")
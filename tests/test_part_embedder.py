@@ -31,13 +31,13 @@ def small_test_df():
         "Target Price (CHF)": [60, 80]
     })
 
-def dummy_get_embedding(text, model=None):
-    # Returns a unique (but fixed-size) vector for each text
-    return [1.0] * 10 if "Aluminum" in text else [0.0] * 10
+def dummy_get_embeddings(texts, model=None):
+    # Returns a fixed-size vector per text: one direction for aluminum parts, another for the rest
+    return [[1.0] + [0.0] * 9 if "Aluminum" in text else [0.0, 1.0] + [0.0] * 8 for text in texts]
 
 def test_embedding_and_storage(temp_chroma_dir, small_test_df):
-    # Patch PartEmbedder.get_embedding with dummy version
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    # Patch PartEmbedder.get_embeddings with dummy version
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="test_parts"
@@ -56,8 +56,8 @@ def test_metadata_integrity(temp_chroma_dir, small_test_df):
     """
     Test that metadata is saved and matches input DataFrame.
     """
-    # Patch PartEmbedder.get_embedding with dummy version
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    # Patch PartEmbedder.get_embeddings with dummy version
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="test_parts"
@@ -80,7 +80,7 @@ def test_query_by_similarity(temp_chroma_dir, small_test_df):
     Test that querying by similar text returns the expected part.
     """
 
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="test_parts"
@@ -97,7 +97,7 @@ def test_batch_add_and_duplicate_handling(temp_chroma_dir, small_test_df):
     Test adding parts in batches and handling duplicate IDs gracefully.
     When using hash-based IDs, adding the same data again should not create duplicates.
     """
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="test_parts"
@@ -124,7 +124,7 @@ def test_edge_cases_empty_dataframe(temp_chroma_dir):
         "Target Price (CHF)": []
     })
 
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="test_empty"
@@ -137,59 +137,31 @@ def test_chromadb_persistence(temp_chroma_dir, small_test_df):
     """
     Test that embeddings and metadata persist across reloads of the PartEmbedder.
     """
-    # src/embed_parts.py
-
-import chromadb
-import hashlib
-
-class PartEmbedder:
-    def __init__(self, chroma_dir, collection_name):
-        self.chroma_dir = chroma_dir
-        self.collection_name = collection_name
-        self.client = chromadb.PersistentClient(path=chroma_dir)
-        # Delete collection if exists (for clean start in tests)
-        if collection_name in [c.name for c in self.client.list_collections()]:
-            self.client.delete_collection(collection_name)
-        self.collection = self.client.create_collection(collection_name)
-
-    @staticmethod
-    def get_embedding(text, model=None):
-        # This will be patched/mocked during tests,
-        # but for now, raise NotImplementedError to signal it's a placeholder.
-        raise NotImplementedError("get_embedding should be patched or implemented.")
-    
-    @staticmethod
-    def generate_id(row):
-        text = row["Part Description"]
-        return hashlib.md5(text.encode("utf-8")).hexdigest()
-
-    
-    def process_dataframe(self, df):
-        if df.empty:
-            return
-        documents = df["Part Description"].tolist()
-        ids = [self.generate_id(row) for _, row in df.iterrows()]
-        metadatas = df.drop(columns=["Part Description"]).to_dict(orient='records')
-        embeddings = [self.get_embedding(desc) for desc in documents]
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
+        embedder = PartEmbedder(
+            chroma_dir=temp_chroma_dir,
+            collection_name="persist_test"
         )
+        embedder.process_dataframe(small_test_df)
+        del embedder
 
-    def query(self, query_text, n_results=1):
-        emb = self.get_embedding(query_text)
-        return self.collection.query(
-            query_embeddings=[emb],
-            n_results=n_results
+        reloaded = PartEmbedder(
+            chroma_dir=temp_chroma_dir,
+            collection_name="persist_test"
         )
+        results = reloaded.collection.get(include=['documents', 'metadatas', 'embeddings'])
+        assert len(results['documents']) == len(small_test_df)
+        prices = sorted(meta['Target Price (CHF)'] for meta in results['metadatas'])
+        assert prices == [60, 80]
+
+        result = reloaded.query('Aluminum', n_results=1)
+        assert 'Aluminum' in result['documents'][0][0]
 
 def test_query_returns_all_metadata_fields(temp_chroma_dir, small_test_df):
     """
     Test that all metadata fields are present in query results.
     """
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="meta_fields_test"
@@ -198,7 +170,8 @@ def test_query_returns_all_metadata_fields(temp_chroma_dir, small_test_df):
         result = embedder.query('Aluminum', n_results=1)
         meta = result['metadatas'][0][0]
         expected_keys = {"Material", "Size", "Operations", "Finish", "Target Price (CHF)"}
-        assert set(meta.keys()) == expected_keys
+        # Engineered features and the row fingerprint are stored alongside
+        assert expected_keys <= set(meta.keys())
 
 def test_error_handling_bad_input(temp_chroma_dir):
     """
@@ -209,7 +182,7 @@ def test_error_handling_bad_input(temp_chroma_dir):
         "Material": ["Steel"],
         "Size": ["30x30x10"]
     })
-    with patch.object(PartEmbedder, "get_embedding", staticmethod(dummy_get_embedding)):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(dummy_get_embeddings)):
         embedder = PartEmbedder(
             chroma_dir=temp_chroma_dir,
             collection_name="error_input_test"
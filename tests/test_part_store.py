@@ -0,0 +1,148 @@
+import pytest
+import os
+import shutil
+import tempfile
+import pandas as pd
+from src import part_store
+from src.embed_parts import FINGERPRINT_KEY, PartEmbedder
+from src.features import PartFeatures
+from src.part_store import PartStore
+from src.price_model import training_frame
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def catalog(n, price=60, start=0):
+    return pd.DataFrame({
+        "Part Description": [f"Aluminum bracket {i}" for i in range(start, start + n)],
+        "Material": ["Aluminum"] * n,
+        "Size": [f"{10 + i}x50x5" for i in range(start, start + n)],
+        "Operations": ["Drilling"] * n,
+        "Finish": ["Anodized"] * n,
+        "Target Price (CHF)": [price] * n,
+    })
+
+
+def test_upsert_get_delete_and_reopen(temp_dir):
+    store = PartStore(os.path.join(temp_dir, "parts"))
+    store.upsert(["a", "b"], ["doc a", "doc b"], [{"Material": "Steel", "Price": 10}, {"Material": "Brass"}])
+    store.upsert(["b", "c"], ["doc b2", "doc c"], [{"Material": "Copper", "Price": "n/a"}, {"Price": 3.5}])
+    store.delete(["a", "missing"])
+
+    reopened = PartStore(os.path.join(temp_dir, "parts"))
+    for s in (store, reopened):
+        assert len(s) == 2 and "a" not in s
+        documents, metadatas = s.get(["c", "a", "b"])
+        assert documents == ["doc c", None, "doc b2"]
+        # A column mixing numbers and text within one write is stored as text
+        assert metadatas == [{"Price": "3.5"}, None, {"Material": "Copper", "Price": "n/a"}]
+        assert sorted(id_ for id_, _, _ in s.iter_rows(batch_size=1)) == ["b", "c"]
+
+
+def test_compaction_keeps_live_rows(temp_dir, monkeypatch):
+    monkeypatch.setattr(part_store, "MAX_SEGMENTS", 3)
+    path = os.path.join(temp_dir, "parts")
+    store = PartStore(path)
+    for i in range(10):
+        store.upsert([f"id{i}", "shared"], [f"doc{i}", f"shared{i}"], [{"n": i}, {"n": -i}])
+    store.delete(["id0"])
+    assert len([n for n in os.listdir(path) if n.endswith(".arrow")]) <= 3
+    assert len(store) == 10
+    assert store.get(["shared", "id9", "id0"])[1] == [{"n": -9}, {"n": 9}, None]
+    store.compact()
+    assert len(os.listdir(path)) == 1
+    assert PartStore(path).get(["id5"]) == (["doc5"], [{"n": 5}])
+
+
+def test_compaction_unifies_mixed_column_types(temp_dir, monkeypatch):
+    monkeypatch.setattr(part_store, "MAX_SEGMENTS", 2)
+    path = os.path.join(temp_dir, "parts")
+    store = PartStore(path)
+    store.upsert(["a"], ["doc a"], [{"Price": 60, "Qty": 1}])
+    store.upsert(["b"], ["doc b"], [{"Price": "n/a", "Qty": 2.5}])
+    store.compact()
+    # Later upserts keep working once every write compacts
+    store.upsert(["c"], ["doc c"], [{"Price": 70}])
+    store.upsert(["d"], ["doc d"], [{"Price": True}])
+    assert len(os.listdir(path)) <= 2
+    documents, metadatas = PartStore(path).get(["a", "b", "c", "d"])
+    assert documents == ["doc a", "doc b", "doc c", "doc d"]
+    assert metadatas == [{"Price": "60", "Qty": 1.0}, {"Price": "n/a", "Qty": 2.5},
+                         {"Price": "70"}, {"Price": "True"}]
+
+
+@pytest.mark.parametrize("index_backend", ["numpy", "chroma"])
+def test_index_keeps_only_ids_vectors_and_filter_keys(temp_dir, index_backend):
+    embedder = PartEmbedder(temp_dir, "slim", backend="hashing", index_backend=index_backend, part_store=True)
+    embedder.process_dataframe(catalog(20))
+    indexed = embedder.collection.get(include=["documents", "metadatas"])
+    assert all(doc is None for doc in indexed["documents"])
+    assert all(set(meta) <= set(PartFeatures.INDEX_KEYS) for meta in indexed["metadatas"])
+
+    result = embedder.query("Aluminum bracket 7", n_results=3,
+                            where=embedder.build_filter(material="aluminum"))
+    assert result["documents"][0][0].endswith("Description: Aluminum bracket 7")
+    meta = result["metadatas"][0][0]
+    assert meta["Size"] == "17x50x5" and meta["Target Price (CHF)"] == 60 and FINGERPRINT_KEY in meta
+    assert len(result["distances"][0]) == 3
+
+
+def test_sync_and_price_model_read_the_store(temp_dir):
+    embedder = PartEmbedder(temp_dir, "slim", backend="hashing", index_backend="numpy", part_store=True)
+    embedder.sync_dataframe(catalog(30))
+    summary = embedder.sync_dataframe(catalog(25, start=5))
+    assert summary == {"added": 0, "updated": 0, "unchanged": 25, "deleted": 5}
+    assert len(embedder.store) == embedder.collection.count() == 25
+    features, fingerprints = training_frame(embedder)
+    assert len(features) == 25 and features["Target Price (CHF)"].eq(60).all()
+
+
+def test_rows_indexed_before_the_store_still_resolve(temp_dir):
+    legacy = PartEmbedder(temp_dir, "mixed", backend="hashing", index_backend="numpy")
+    legacy.process_dataframe(catalog(5))
+    del legacy
+    embedder = PartEmbedder(temp_dir, "mixed", backend="hashing", index_backend="numpy", part_store=True)
+    embedder.process_dataframe(catalog(5, start=5, price=80))
+
+    result = embedder.query_many(["Aluminum bracket 2", "Aluminum bracket 8"], n_results=1)
+    assert result["metadatas"][0][0]["Target Price (CHF)"] == 60
+    assert result["documents"][1][0].endswith("Aluminum bracket 8")
+    assert len(embedder.stored_fingerprints()) == 10
+    prices = sorted(features["Target Price (CHF)"] for features in training_frame(embedder)[0].to_dict("records"))
+    assert prices == [60] * 5 + [80] * 5
+
+
+def test_legacy_metadata_is_matched_by_id(temp_dir):
+    legacy = PartEmbedder(temp_dir, "mixed", backend="hashing", index_backend="numpy")
+    legacy.process_dataframe(catalog(5))
+    expected = {id_: meta["Size"] for id_, meta in legacy.iter_metadatas()}
+    del legacy
+    embedder = PartEmbedder(temp_dir, "mixed", backend="hashing", index_backend="numpy", part_store=True)
+    get = embedder.collection.get
+
+    def storage_order(ids=None, **kwargs):
+        # Chroma returns get(ids=...) rows in storage order, not the order asked for
+        page = get(ids=ids, **kwargs)
+        return {key: list(reversed(value)) if isinstance(value, list) else value for key, value in page.items()} \
+            if ids else page
+
+    embedder.collection.get = storage_order
+    assert {id_: meta["Size"] for id_, meta in embedder.iter_metadatas()} == expected
+
+
+def test_backends_keep_separate_stores(temp_dir):
+    chroma = PartEmbedder(temp_dir, "switch", backend="hashing", index_backend="chroma", part_store=True)
+    chroma.sync_dataframe(catalog(5))
+    numpy = PartEmbedder(temp_dir, "switch", backend="hashing", index_backend="numpy", part_store=True)
+    assert numpy.sync_dataframe(catalog(5)) == {"added": 5, "updated": 0, "unchanged": 0, "deleted": 0}
+    assert numpy.collection.count() == 5
+    assert numpy.query("Aluminum bracket 3")["documents"][0][0].endswith("Aluminum bracket 3")
+
+    # Pruning from one backend leaves the other's rows alone
+    numpy.sync_dataframe(catalog(2))
+    assert len(chroma.store) == chroma.collection.count() == 5
@@ -0,0 +1,130 @@
+import pytest
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+from src import quoting
+from src.embed_parts import PartEmbedder
+from src.features import PartFeatures
+from src.price_model import PriceModel, refresh_price_model
+
+MATERIAL_RATES = {"Aluminum": 1.0, "Steel": 1.5, "Brass": 2.5}
+FINISH_FEES = {"Raw": 0, "Anodized": 15, "Painted": 10}
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def make_catalog(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    materials = rng.choice(list(MATERIAL_RATES), size=rows)
+    finishes = rng.choice(list(FINISH_FEES), size=rows)
+    dims = rng.choice([10, 20, 50, 100], size=(rows, 3))
+    operations = rng.choice(["Drilling", "Milling", "Drilling, Milling"], size=rows)
+    prices = [
+        round(20 + MATERIAL_RATES[m] * a * b * c / 1000 + FINISH_FEES[f] + 10 * ops.count(",") + 10)
+        for m, f, (a, b, c), ops in zip(materials, finishes, dims, operations)
+    ]
+    return pd.DataFrame({
+        "Part Description": [f"{m} part {i}" for i, m in enumerate(materials)],
+        "Material": materials,
+        "Size": [f"{a}x{b}x{c}" for a, b, c in dims],
+        "Operations": operations,
+        "Finish": finishes,
+        "Target Price (CHF)": prices,
+    })
+
+
+@pytest.fixture
+def trained_model():
+    catalog = make_catalog(400)
+    return PriceModel().fit(PartFeatures.feature_frame(catalog)), catalog
+
+
+def test_predicts_catalog_prices(trained_model):
+    model, catalog = trained_model
+    part = catalog.iloc[0]
+    estimate = model.estimate(PartFeatures.feature_dict(part))
+    assert estimate["price"] == pytest.approx(part["Target Price (CHF)"], rel=0.15)
+    assert estimate["confident"]
+    assert model.version == 1 and model.trained_rows == 400
+
+
+def test_unseen_parts_are_less_certain(trained_model):
+    model, catalog = trained_model
+    known = model.estimate(PartFeatures.feature_dict(catalog.iloc[0]))
+    unseen = model.estimate(PartFeatures.feature_dict(
+        {"Material": "Titanium", "Size": "unknown", "Operations": "EDM, Hobbing", "Finish": "Gold plated"}
+    ))
+    assert unseen["uncertainty"] > known["uncertainty"]
+
+
+def test_requires_enough_priced_rows():
+    catalog = make_catalog(30)
+    catalog.loc[:15, "Target Price (CHF)"] = None
+    with pytest.raises(ValueError):
+        PriceModel().fit(PartFeatures.feature_frame(catalog))
+
+
+def test_save_and_load(temp_dir, trained_model):
+    model, catalog = trained_model
+    path = os.path.join(temp_dir, "models", "price.joblib")
+    assert PriceModel.load(path) is None
+    model.save(path)
+    loaded = PriceModel.load(path)
+    features = PartFeatures.feature_frame(catalog.head(5))
+    np.testing.assert_allclose(loaded.predict(features)[0], model.predict(features)[0])
+    with patch("src.price_model.MODEL_FORMAT", 99):
+        assert PriceModel.load(path) is None
+
+
+def test_refresh_retrains_only_when_catalog_changes(temp_dir):
+    embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="price_test",
+                            backend="hashing", index_backend="numpy")
+    path = os.path.join(temp_dir, "price.joblib")
+    catalog = make_catalog(60)
+    embedder.process_dataframe(catalog.head(10))
+    assert refresh_price_model(embedder, path) is None
+
+    embedder.process_dataframe(catalog)
+    first = refresh_price_model(embedder, path)
+    assert first.version == 1 and first.trained_rows == 60
+    assert refresh_price_model(embedder, path).version == 1
+
+    embedder.sync_dataframe(pd.concat([catalog, make_catalog(5, seed=1).assign(
+        **{"Part Description": lambda d: d["Part Description"] + " new"}
+    )]))
+    second = refresh_price_model(embedder, path, model=first)
+    assert second.version == 2 and second.trained_rows == 65
+    # The live model is left untouched for threads still quoting with it
+    assert second is not first
+    assert first.version == 1 and first.trained_rows == 60
+    assert PriceModel.load(path).version == 2
+
+
+def test_confident_model_skips_llm(trained_model):
+    model, catalog = trained_model
+    part = catalog.iloc[0].to_dict()
+    meta = {k: v for k, v in part.items() if k != "Part Description"}
+
+    def fail(*args, **kwargs):
+        raise AssertionError("LLM should not be called")
+
+    with patch.object(quoting, "request_completion", fail):
+        breakdown, from_cache = quoting.quote_part(part, part["Part Description"], meta, price_model=model)
+    assert not from_cache
+    assert breakdown[quoting.MODEL_VERSION_KEY] == 1
+    assert breakdown["Total Quote"] == pytest.approx(part["Target Price (CHF)"], rel=0.15)
+    assert sum(breakdown[key] for key in quoting.BREAKDOWN_KEYS[:4]) == breakdown["Total Quote"]
+
+    model.max_relative_std = 0.0
+    with patch.object(quoting, "request_completion", lambda prompt, model, **kwargs: '{"Total Quote": 42}'):
+        breakdown, _ = quoting.quote_part(part, part["Part Description"], meta, price_model=model,
+                                          engine="llm")
+    assert breakdown == {"Total Quote": 42}
@@ -0,0 +1,131 @@
+import pytest
+import tempfile
+import shutil
+import os
+import json
+import pandas as pd
+from unittest.mock import patch
+from src import quoting
+from src.embed_parts import PartEmbedder
+from src.quote_cache import QuoteCache, normalize_features
+from src.features import PartFeatures
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+REFERENCE_META = {
+    "Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+    "Finish": "Anodized", "Target Price (CHF)": 60, "row_fingerprint": "fp-1"
+}
+
+
+def make_key(features, fingerprint="fp-1", price=60):
+    return QuoteCache.make_key(features, "ref-1", price, fingerprint, "1", "gpt-4o")
+
+
+def test_reworded_features_share_a_key():
+    a = PartFeatures.feature_dict({"Material": "aluminum", "Size": "100x50x5 mm",
+                                   "Operations": "Drilling, milling", "Finish": "Anodized"})
+    b = PartFeatures.feature_dict({"Material": "Aluminum ", "Size": "100X50X5",
+                                   "Operations": "milling,drilling", "Finish": "anodized"})
+    assert normalize_features(a) == normalize_features(b)
+    assert make_key(a) == make_key(b)
+
+
+def test_reference_change_changes_key():
+    features = PartFeatures.feature_dict(REFERENCE_META)
+    assert make_key(features) != make_key(features, fingerprint="fp-2")
+    assert make_key(features) != make_key(features, price=65)
+
+
+def test_ttl_expiry(temp_dir):
+    clock = FakeClock()
+    cache = QuoteCache(os.path.join(temp_dir, "quotes.sqlite"), ttl_seconds=60, clock=clock)
+    cache.put("k", {"Total Quote": 60})
+    assert cache.get("k") == {"Total Quote": 60}
+    clock.now += 61
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction(temp_dir):
+    clock = FakeClock()
+    cache = QuoteCache(os.path.join(temp_dir, "quotes.sqlite"), max_entries=2, clock=clock)
+    cache.put("a", {"Total Quote": 1})
+    clock.now += 1
+    cache.put("b", {"Total Quote": 2})
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.put("c", {"Total Quote": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_invalidate_reference(temp_dir):
+    cache = QuoteCache(os.path.join(temp_dir, "quotes.sqlite"))
+    cache.put("a", {"Total Quote": 1}, reference_id="ref-1")
+    cache.put("b", {"Total Quote": 2}, reference_id="ref-2")
+    cache.invalidate_reference("ref-1")
+    assert cache.get("a") is None
+    assert cache.get("b") == {"Total Quote": 2}
+
+
+def test_sync_evicts_quotes_of_changed_references(temp_dir):
+    catalog = pd.DataFrame({
+        "Part Description": ["Aluminum bracket", "Steel gear", "Brass bushing"],
+        "Material": ["Aluminum", "Steel", "Brass"],
+        "Size": ["100x50x5", "40x40x10", "20x20x15"],
+        "Operations": ["Drilling", "Milling", "Turning"],
+        "Finish": ["Anodized", "Raw", "Polished"],
+        "Target Price (CHF)": [60, 80, 30],
+    })
+    embedder = PartEmbedder(temp_dir, "cache_sync", backend="hashing", index_backend="numpy")
+    embedder.sync_dataframe(catalog)
+    cache = QuoteCache(os.path.join(temp_dir, "quotes.sqlite"))
+    ids = {meta["Material"]: id_ for id_, meta in embedder.iter_metadatas()}
+    for id_ in ids.values():
+        cache.put(id_, {"Total Quote": 1}, reference_id=id_)
+
+    # Repriced aluminum bracket, steel gear unchanged, brass bushing dropped
+    embedder.sync_dataframe(catalog.iloc[:2].assign(**{"Target Price (CHF)": [65, 80]}),
+                            on_changed=cache.invalidate_references)
+    assert {material: cache.get(id_) is not None for material, id_ in ids.items()} == \
+        {"Aluminum": False, "Steel": True, "Brass": False}
+
+
+def test_repeat_quote_skips_llm(temp_dir):
+    calls = []
+
+    def stub_completion(prompt, model=None, **kwargs):
+        calls.append(prompt)
+        return json.dumps({"Total Quote": 60, "Explanation": "stub"})
+
+    cache = QuoteCache(os.path.join(temp_dir, "quotes.sqlite"))
+    query_row = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+                 "Finish": "Anodized", "Part Description": "Aluminum bracket"}
+    with patch.object(quoting, "request_completion", stub_completion):
+        first, first_cached = quoting.quote_part(query_row, "doc", REFERENCE_META,
+                                                 quote_cache=cache, reference_id="ref-1", engine="llm")
+        reworded = dict(query_row, **{"Part Description": "Bracket in aluminium", "Size": "100X50X5 mm"})
+        second, second_cached = quoting.quote_part(reworded, "doc", REFERENCE_META,
+                                                   quote_cache=cache, reference_id="ref-1", engine="llm")
+        changed_ref = dict(REFERENCE_META, row_fingerprint="fp-2")
+        _, third_cached = quoting.quote_part(query_row, "doc", changed_ref,
+                                             quote_cache=cache, reference_id="ref-1", engine="llm")
+    assert (first_cached, second_cached, third_cached) == (False, True, False)
+    assert first == second
+    assert len(calls) == 2
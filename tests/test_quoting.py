@@ -0,0 +1,134 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+import json
+import threading
+import time
+from unittest.mock import patch
+from src import quoting
+from src.embed_parts import PartEmbedder
+
+
+@pytest.fixture
+def temp_chroma_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+@pytest.fixture
+def catalog_df():
+    return pd.DataFrame({
+        "Part Description": [
+            "Aluminum bracket, 100x50x5 mm, drilling, anodized",
+            "Steel gear, 30x30x10 mm, milling, painted"
+        ],
+        "Material": ["Aluminum", "Steel"],
+        "Size": ["100x50x5", "30x30x10"],
+        "Operations": ["Drilling", "Milling"],
+        "Finish": ["Anodized", "Painted"],
+        "Target Price (CHF)": [60, 80]
+    })
+
+
+@pytest.fixture
+def bom_df():
+    return pd.DataFrame({
+        "Part Description": [f"{m} part #{i}" for i, m in enumerate(["Aluminum", "Steel"] * 6)],
+        "Material": ["Aluminum", "Steel"] * 6,
+        "Size": ["50x50x5", None] * 6,
+    })
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, model=None):
+        self.calls += 1
+        return [[1.0, 0.0] if "Aluminum" in t else [0.0, 1.0] for t in texts]
+
+
+class StubCompletions:
+    """
+    Stand-in for the chat completion call: answers with the reference price
+    found in the prompt and records peak concurrency.
+    """
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model=None, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        price = 80 if prompt.rstrip().endswith("CHF 80") else 60
+        return json.dumps({
+            "Base Material": price / 2, "Size Adjustment": price / 4,
+            "Operations Fee": price / 8, "Finish Fee": price / 8,
+            "Total Quote": price, "Explanation": "stub"
+        })
+
+
+def test_clean_ai_output_strips_code_fences():
+    assert quoting.clean_ai_output('```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert quoting.clean_ai_output('  {"a": 1} ') == '{"a": 1}'
+
+
+def test_batch_quote_uses_one_embedding_call_and_one_query(temp_chroma_dir, catalog_df, bom_df):
+    embeddings = CountingEmbeddings()
+    completions = StubCompletions()
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(embeddings)), \
+            patch.object(quoting, "request_completion", completions):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="bom_test")
+        embedder.process_dataframe(catalog_df)
+        embeddings.calls = 0
+        with patch.object(embedder.collection, "query", wraps=embedder.collection.query) as query:
+            results = dict(quoting.quote_parts(embedder, bom_df, max_concurrency=4,
+                                               requests_per_minute=None, engine="llm"))
+        assert embeddings.calls == 1
+        assert query.call_count == 1
+
+    assert sorted(results) == list(range(len(bom_df)))
+    for position, row in results.items():
+        expected = 60 if bom_df.loc[position, "Material"] == "Aluminum" else 80
+        assert row["Total Quote"] == expected
+        assert row["Reference Price (CHF)"] == expected
+        assert "Error" not in row
+    assert 1 < completions.peak <= 4
+
+
+def test_batch_quote_reports_unparseable_reply(temp_chroma_dir, catalog_df, bom_df):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(CountingEmbeddings())), \
+            patch.object(quoting, "request_completion", lambda prompt, model=None, **kwargs: "not json"):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="bom_error_test")
+        embedder.process_dataframe(catalog_df)
+        results = [row for _, row in quoting.quote_parts(embedder, bom_df.head(2), engine="llm")]
+    assert all(row["Error"] == "AI response could not be parsed as JSON" for row in results)
+
+
+def test_blank_description_is_not_quoted(temp_chroma_dir, catalog_df, bom_df):
+    embeddings = CountingEmbeddings()
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(embeddings)):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="bom_blank_test")
+        embedder.process_dataframe(catalog_df)
+        bom = bom_df.head(3).copy()
+        bom.loc[1, "Part Description"] = "  "
+        results = dict(quoting.quote_parts(embedder, bom))
+        blank = pd.DataFrame({"Part Description": [None]})
+        only_blank = dict(quoting.quote_parts(embedder, blank))
+    assert results[1]["Error"] == "Missing part description"
+    assert "Total Quote" not in results[1]
+    assert all("Error" not in results[p] for p in (0, 2))
+    assert only_blank[0]["Error"] == "Missing part description"
+
+
+def test_missing_description_column_is_rejected():
+    with pytest.raises(KeyError):
+        quoting.normalize_parts_frame(pd.DataFrame({"Material": ["Steel"]}))
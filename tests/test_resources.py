@@ -0,0 +1,69 @@
+import pytest
+import tempfile
+import shutil
+import os
+import time
+from unittest.mock import patch
+from src import resources, openai_client
+
+
+@pytest.fixture
+def temp_dir():
+    resources.reset()
+    d = tempfile.mkdtemp()
+    yield d
+    resources.reset()
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def test_embedder_is_shared(temp_dir):
+    chroma_dir = os.path.join(temp_dir, "chroma")
+    cache_path = os.path.join(temp_dir, "cache.sqlite")
+    first = resources.get_embedder(chroma_dir, "shared_test", backend="hashing",
+                                   embedding_cache_path=cache_path)
+    second = resources.get_embedder(chroma_dir, "shared_test", backend="hashing",
+                                    embedding_cache_path=cache_path)
+    other = resources.get_embedder(chroma_dir, "other_test", backend="hashing")
+    assert first is second
+    assert first.embedding_cache is resources.get_embedding_cache(cache_path)
+    assert other is not first
+    assert other.client is first.client
+    assert "startup.chroma_client" in resources.timings
+
+
+def test_warm_path_skips_startup(temp_dir):
+    chroma_dir = os.path.join(temp_dir, "chroma")
+    start = time.perf_counter()
+    resources.get_embedder(chroma_dir, "warm_test", backend="hashing")
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    resources.get_embedder(chroma_dir, "warm_test", backend="hashing")
+    warm = time.perf_counter() - start
+    assert warm < cold
+    assert warm < 0.001
+
+
+def test_load_csv_is_memoized_by_content(temp_dir):
+    data = b"Part Description,Material\nBracket,Aluminum\n"
+    first = resources.load_csv(data)
+    assert resources.load_csv(bytes(data)) is first
+    assert resources.load_csv(data + b"Gear,Steel\n") is not first
+    for i in range(resources.MAX_CACHED_UPLOADS):
+        resources.load_csv(data + f"Part {i},Steel\n".encode())
+    assert resources.load_csv(data) is not first
+
+
+def test_openai_client_is_created_once():
+    openai_client.reset_openai_client()
+    try:
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}):
+            client = resources.get_openai_client()
+            assert resources.get_openai_client() is client
+            assert "startup.openai_client" in resources.timings
+        openai_client.reset_openai_client()
+        with patch.dict(os.environ, {"OPENAI_API_KEY": ""}), \
+                patch.object(openai_client, "load_dotenv"):
+            with pytest.raises(ValueError):
+                openai_client.get_openai_client()
+    finally:
+        openai_client.reset_openai_client()
@@ -0,0 +1,181 @@
+import pytest
+import asyncio
+import json
+import threading
+import time
+from src import openai_client
+from src.engine import NoReferenceError
+from src.quoting import request_completion
+from src.embed_parts import PartEmbedder
+from src.service import QuoteService, HTTPError
+from benchmarks.stub_openai import StubOpenAI
+
+
+class SlowEngine:
+    """
+    Stands in for QuotingEngine: every quote takes `delay` seconds.
+    """
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def quote(self, part, **options):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if part["Part Description"] == "missing":
+            raise NoReferenceError("No similar parts found.")
+        return {"breakdown": {"Total Quote": 42.0}, "part": part["Part Description"]}
+
+    def quote_table(self, df, max_concurrency=8, **options):
+        # A batch quotes up to max_concurrency parts at once
+        with self.lock:
+            self.running += max_concurrency
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= max_concurrency
+        return [{"Part Description": d, "Total Quote": 42.0} for d in df["Part Description"]]
+
+    def warm_up(self):
+        pass
+
+
+def part(description):
+    return {"Part Description": description, "Material": "Aluminum", "Size": "100x50x5",
+            "Operations": "Drilling", "Finish": "Anodized"}
+
+
+def test_identical_requests_are_coalesced():
+    engine = SlowEngine()
+    service = QuoteService(engine)
+
+    async def burst():
+        same = [service.quote(part(" Aluminum  bracket")) for _ in range(5)]
+        other = [service.quote(part("Steel gear"))]
+        return await asyncio.gather(*same, *other)
+
+    results = asyncio.run(burst())
+    service.close()
+    assert engine.calls == 2
+    assert service.stats["coalesced"] == 4
+    assert results[0] == results[4]
+    assert results[5]["part"] == "Steel gear"
+    assert not service._in_flight
+
+
+def test_concurrency_limit_and_rejection():
+    engine = SlowEngine(delay=0.05)
+    service = QuoteService(engine, max_concurrency=2, max_pending=4)
+
+    async def burst():
+        return await asyncio.gather(
+            *(service.quote(part(f"part {i}")) for i in range(6)), return_exceptions=True
+        )
+
+    results = asyncio.run(burst())
+    service.close()
+    rejected = [r for r in results if isinstance(r, HTTPError)]
+    assert len(rejected) == 2
+    assert all(r.status == 503 for r in rejected)
+    assert engine.calls == 4
+    assert engine.max_running == 2
+
+
+def test_batches_count_against_the_concurrency_limit():
+    engine = SlowEngine(delay=0.05)
+    service = QuoteService(engine, max_concurrency=4)
+
+    async def burst():
+        batches = [service.quote_table([part(f"b{b} part {i}") for i in range(6)]) for b in range(2)]
+        singles = [service.quote(part(f"single {i}")) for i in range(3)]
+        small = [service.quote_table([part("only one")])]
+        return await asyncio.gather(*batches, *singles, *small)
+
+    results = asyncio.run(burst())
+    service.close()
+    assert [len(r) for r in results[:2]] == [6, 6]
+    assert engine.max_running == 4
+    assert engine.running == 0
+    assert service._slots._value == 4
+
+
+async def send(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    head, _, body = (await reader.read()).partition(b"\r\n\r\n")
+    writer.close()
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_http_routes():
+    service = QuoteService(SlowEngine(delay=0))
+
+    async def round_trip():
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return [
+                await send(port, "POST", "/quote", dict(part("Aluminum bracket"), engine="rules")),
+                await send(port, "POST", "/quote", part("missing")),
+                await send(port, "POST", "/quote", ["not", "an", "object"]),
+                await send(port, "POST", "/batch-quote", {"parts": [part("a"), part("b")]}),
+                await send(port, "GET", "/quote"),
+                await send(port, "GET", "/nowhere"),
+                await send(port, "GET", "/health"),
+            ]
+
+    responses = asyncio.run(round_trip())
+    service.close()
+    statuses = [status for status, _ in responses]
+    assert statuses == [200, 404, 400, 200, 405, 404, 200]
+    assert responses[0][1]["breakdown"]["Total Quote"] == 42.0
+    assert [r["Part Description"] for r in responses[3][1]["results"]] == ["a", "b"]
+    assert responses[6][1]["status"] == "ok"
+    assert responses[6][1]["quotes"] == 2
+
+
+async def shutdown(server):
+    # Ends the connections the SDK keeps open, then the server
+    server.close()
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_stub_openai_serves_the_sdk(monkeypatch):
+    stub = StubOpenAI(chunk_chars=8)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(stub.start("127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    openai_client.reset_openai_client()
+    try:
+        vectors = PartEmbedder.get_embeddings(["Aluminum bracket", "Steel gear"])
+        usage = {}
+        reply = request_completion("Quote this part.", usage=usage)
+    finally:
+        openai_client.reset_openai_client()
+        asyncio.run_coroutine_threadsafe(shutdown(server), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+    assert len(vectors) == 2 and len(vectors[0]) > 0
+    assert json.loads(reply) == json.loads(stub.reply)
+    assert usage["prompt_tokens"] > 0
+    assert stub.calls == {"embeddings": 1, "chat": 1}
@@ -0,0 +1,123 @@
+import pytest
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from src.embed_parts import PartEmbedder, ShardedPartEmbedder, merge_results
+from src.price_model import training_frame
+from src import quoting
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+def catalog(customer, parts, price=60):
+    return pd.DataFrame({
+        "Part Description": [f"{customer} {part}" for part in parts],
+        "Material": ["Aluminum"] * len(parts),
+        "Size": ["100x50x5"] * len(parts),
+        "Operations": ["Drilling"] * len(parts),
+        "Finish": ["Anodized"] * len(parts),
+        "Target Price (CHF)": [price] * len(parts),
+        "Customer": [customer] * len(parts),
+    })
+
+
+PARTS = ["bracket", "gear", "shaft", "plate"]
+
+
+@pytest.fixture(params=["numpy", "chroma"])
+def sharded(request, temp_dir):
+    embedder = ShardedPartEmbedder(temp_dir, "parts", shard_by="Customer",
+                                   backend="hashing", index_backend=request.param)
+    embedder.process_dataframe(pd.concat([catalog("ACME Corp.", PARTS), catalog("Globex", PARTS[:2])]))
+    yield embedder
+    embedder.close()
+
+
+def test_rows_are_routed_to_shards(sharded):
+    assert ShardedPartEmbedder.shard_key(" ACME Corp. ") == "acme-corp"
+    assert ShardedPartEmbedder.shard_key("") == "default"
+    assert sharded.shard_names() == ["acme-corp", "globex"]
+    assert sharded.shard("acme-corp").collection.count() == 4
+    assert sharded.shard("globex").collection.count() == 2
+    assert len(sharded.stored_fingerprints()) == 6
+
+
+def test_query_fans_out_and_merges(sharded):
+    result = sharded.query("Globex gear", n_results=3)
+    assert result["documents"][0][0].endswith("Description: Globex gear")
+    assert result["shards"][0][0] == "globex"
+    assert len(result["ids"][0]) == 3
+    assert result["distances"][0] == sorted(result["distances"][0])
+    assert set(result["shards"][0]) == {"acme-corp", "globex"}
+
+    only = sharded.query("Globex gear", n_results=3, shards=["acme-corp", "nobody"])
+    assert set(only["shards"][0]) == {"acme-corp"}
+    assert "nobody" not in sharded.shard_names()
+
+    many = sharded.query_many(["ACME Corp. shaft", "Globex bracket"], n_results=1)
+    assert [docs[0].split("Description: ")[1] for docs in many["documents"]] == \
+        ["ACME Corp. shaft", "Globex bracket"]
+
+
+def test_fanout_matches_single_collection(temp_dir):
+    df = pd.concat([catalog(c, PARTS) for c in ["a1", "b2", "c3"]])
+    single = PartEmbedder(temp_dir, "all", backend="hashing", index_backend="numpy")
+    single.process_dataframe(df)
+    sharded = ShardedPartEmbedder(temp_dir, "parts", shard_by="Customer",
+                                  backend="hashing", index_backend="numpy")
+    sharded.process_dataframe(df)
+    texts = ["b2 gear", "c3 plate drilling", "a1 shaft"]
+    expected = single.query_many(texts, n_results=5)
+    merged = sharded.query_many(texts, n_results=5)
+    assert merged["ids"] == expected["ids"]
+    np.testing.assert_allclose(merged["distances"], expected["distances"], atol=1e-5)
+    sharded.close()
+
+
+def test_rebuild_only_touches_one_shard(sharded):
+    globex_before = sharded.shard("globex").stored_fingerprints()
+    sharded.rebuild_shard("acme-corp", catalog("ACME Corp.", ["bolt"]))
+    assert sharded.shard("acme-corp").collection.count() == 1
+    assert sharded.shard("globex").stored_fingerprints() == globex_before
+
+    summary = sharded.sync_dataframe(catalog("Globex", ["gear", "nut"]))
+    assert summary == {"added": 1, "updated": 0, "unchanged": 1, "deleted": 1}
+    assert sharded.shard("acme-corp").collection.count() == 1
+
+    sharded.drop_shard("acme-corp")
+    assert sharded.shard_names() == ["globex"]
+
+
+def test_price_model_and_batch_quotes_read_all_shards(sharded):
+    features, fingerprints = training_frame(sharded)
+    assert len(features) == len(fingerprints) == 6
+
+    bom = catalog("Globex", ["gear"]).drop(columns=["Target Price (CHF)", "Customer"])
+    (_, row), = quoting.quote_parts(sharded, bom)
+    assert row["Total Quote"] == 60
+    assert row["Reference Part"].endswith("Globex gear")
+
+
+def test_requires_shard_column(temp_dir):
+    unsharded = ShardedPartEmbedder(temp_dir, "parts", backend="hashing", index_backend="numpy")
+    with pytest.raises(ValueError):
+        unsharded.process_dataframe(catalog("x", PARTS))
+    unsharded.process_dataframe(catalog("x", PARTS), shard="manual")
+    assert unsharded.shard_names() == ["manual"]
+    with pytest.raises(ValueError):
+        unsharded.shard("Not Valid")
+    assert unsharded.query("anything", n_results=1, shards=[])["ids"] == [[]]
+
+
+def test_merge_results_ties_and_empty_shards():
+    a = {"ids": [["a1", "a2"]], "documents": [["A1", "A2"]], "metadatas": [[{}, {}]], "distances": [[0.1, 0.3]]}
+    b = {"ids": [["b1"]], "documents": [["B1"]], "metadatas": [[{}]], "distances": [[0.1]]}
+    merged = merge_results([("b", b), ("empty", None), ("a", a)], 1, 2)
+    assert merged["ids"] == [["a1", "b1"]]
+    assert merged["shards"] == [["a", "b"]]
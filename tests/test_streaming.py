@@ -0,0 +1,111 @@
+import pytest
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+from src import quoting
+from src.json_stream import IncrementalJSONParser
+from src.training_prompt import CNC_PROMPT_PREFIX, cnc_training_prompt
+
+REPLY = json.dumps({
+    "Base Material": 20, "Size Adjustment": 10, "Operations Fee": 20, "Finish Fee": 10,
+    "Total Quote": 60, "Explanation": "Drilling, \"anodized\" {finish} and [size] drive it."
+})
+REFERENCE_META = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+                  "Finish": "Anodized", "Target Price (CHF)": 60}
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeStreamingClient:
+    """
+    Stand-in for openai.OpenAI that streams a fixed reply a few characters at a time.
+    """
+    def __init__(self, reply, piece=7):
+        self.reply = reply
+        self.piece = piece
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        pieces = [self.reply[i:i + self.piece] for i in range(0, len(self.reply), self.piece)]
+        usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=60,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1408))
+        return iter([chunk(p) for p in pieces] + [chunk(usage=usage)])
+
+
+def test_parser_yields_fields_as_they_complete():
+    parser = IncrementalJSONParser()
+    seen = []
+    for ch in "```json\n" + REPLY + "\n```":
+        new = parser.feed(ch)
+        if new:
+            seen.append(list(new))
+    assert seen == [[key] for key in json.loads(REPLY)]
+    assert parser.result() == json.loads(REPLY)
+
+
+def test_parser_handles_nested_values():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": {"b": [1, 2], "c": "x,}"}, "d": ') == {"a": {"b": [1, 2], "c": "x,}"}}
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
+    assert parser.feed('null}') == {"d": None}
+    assert parser.done
+
+
+def test_parser_reports_invalid_reply():
+    parser = IncrementalJSONParser()
+    with pytest.raises(json.JSONDecodeError) as e:
+        parser.feed('{"a": nope, "b": 1}')
+    assert e.value.doc == '{"a": nope, "b": 1}'
+
+
+def test_static_prefix_is_shared_and_dominates_the_prompt():
+    first = quoting.cnc_prompt_sections("Steel gear", 80, "Steel gear, 30x30x10", {"Material": "Steel"})
+    second = quoting.cnc_prompt_sections("Brass pin", 12, "Brass pin, 5x5x20", {"Material": "Brass"})
+    assert first["static"] == second["static"] == CNC_PROMPT_PREFIX
+    assert "Steel gear" not in CNC_PROMPT_PREFIX and "{" not in CNC_PROMPT_PREFIX
+    assert cnc_training_prompt("Steel gear", 80, "Steel gear, 30x30x10", {"Material": "Steel"}) == \
+        first["static"] + first["dynamic"]
+    counts = quoting.prompt_token_counts(first)
+    assert counts["static"] > 5 * counts["dynamic"]
+
+
+def test_llm_quote_is_streamed():
+    client = FakeStreamingClient(REPLY)
+    updates, usage = [], {}
+    row = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+           "Finish": "Anodized", "Part Description": "Aluminum bracket"}
+    with patch.object(quoting, "get_openai_client", lambda: client):
+        breakdown, _ = quoting.quote_part(row, "Aluminum bracket", REFERENCE_META, engine="llm",
+                                          on_update=updates.append, usage=usage)
+    assert breakdown == json.loads(REPLY)
+    assert list(updates[0]) == ["Base Material"]
+    assert updates[-1] == breakdown
+    assert len(updates) == len(breakdown)
+
+    request = client.requests[0]
+    assert request["stream"] is True
+    assert request["messages"][0] == {"role": "system", "content": CNC_PROMPT_PREFIX}
+    assert request["messages"][1]["role"] == "user"
+    assert request["messages"][1]["content"].rstrip().endswith("CHF 60")
+    assert usage["cached_tokens"] == 1408 and usage["prompt_tokens"] == 1500
+    assert usage["static_tokens"] > usage["dynamic_tokens"]
+    assert "first_token_seconds" in usage
+
+
+def test_explanation_is_streamed_after_rule_breakdown():
+    client = FakeStreamingClient("Simple drilled bracket, so the price matches the reference.", piece=5)
+    updates = []
+    row = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+           "Finish": "Anodized", "Part Description": "Aluminum bracket"}
+    with patch.object(quoting, "get_openai_client", lambda: client):
+        breakdown, _ = quoting.quote_part(row, "Aluminum bracket", REFERENCE_META,
+                                          explain=True, on_update=updates.append)
+    assert updates[0]["Total Quote"] == 60
+    assert updates[1]["Explanation"] == "Simpl"
+    assert breakdown["Explanation"] == "Simple drilled bracket, so the price matches the reference."
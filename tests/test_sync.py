@@ -0,0 +1,93 @@
+import pytest
+import pandas as pd
+import tempfile
+import shutil
+from unittest.mock import patch
+from src.embed_parts import PartEmbedder, FINGERPRINT_KEY
+
+
+@pytest.fixture
+def temp_chroma_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+@pytest.fixture
+def catalog_df():
+    return pd.DataFrame({
+        "Part Description": [
+            "Aluminum bracket, 100x50x5 mm, drilling, anodized",
+            "Steel gear, 30x30x10 mm, milling, painted",
+            "Brass bushing, 40x20x15 mm, turning, polished"
+        ],
+        "Material": ["Aluminum", "Steel", "Brass"],
+        "Size": ["100x50x5", "30x30x10", "40x20x15"],
+        "Operations": ["Drilling", "Milling", "Turning"],
+        "Finish": ["Anodized", "Painted", "Polished"],
+        "Target Price (CHF)": [60, 80, 55]
+    })
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts_sent = []
+
+    def __call__(self, texts, model=None):
+        self.texts_sent.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_row_fingerprint_covers_all_columns(catalog_df):
+    row = catalog_df.iloc[0]
+    changed = row.copy()
+    changed["Target Price (CHF)"] = 61
+    assert PartEmbedder.row_fingerprint(row) != PartEmbedder.row_fingerprint(changed)
+    assert PartEmbedder.generate_id(row) == PartEmbedder.generate_id(changed)
+
+
+def test_sync_detects_changes_and_prunes(temp_chroma_dir, catalog_df):
+    fake = CountingEmbeddings()
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(fake)):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="sync_test")
+        first = embedder.sync_dataframe(catalog_df)
+        assert first == {"added": 3, "updated": 0, "unchanged": 0, "deleted": 0}
+
+        # Price change on one row, one row removed, one new row
+        updated = catalog_df.copy()
+        updated.loc[0, "Target Price (CHF)"] = 65
+        updated = updated.drop(index=2)
+        updated.loc[3] = ["Copper plate, 50x50x2 mm, laser cut, raw", "Copper",
+                          "50x50x2", "Laser Cutting", "Raw", 40]
+        sent_before = len(fake.texts_sent)
+        second = embedder.sync_dataframe(updated)
+        assert second == {"added": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+        assert len(fake.texts_sent) - sent_before == 2
+
+        stored = embedder.collection.get(include=["metadatas"])
+        prices = {m["Material"]: m["Target Price (CHF)"] for m in stored["metadatas"]}
+        assert prices == {"Aluminum": 65, "Steel": 80, "Copper": 40}
+
+        # Nothing changed: no embedding calls at all
+        sent_before = len(fake.texts_sent)
+        third = embedder.sync_dataframe(updated)
+        assert third == {"added": 0, "updated": 0, "unchanged": 3, "deleted": 0}
+        assert len(fake.texts_sent) == sent_before
+
+
+def test_process_dataframe_stores_fingerprint(temp_chroma_dir, catalog_df):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(CountingEmbeddings())):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="fp_test")
+        embedder.process_dataframe(catalog_df)
+        assert embedder.sync_dataframe(catalog_df)["unchanged"] == 3
+        meta = embedder.collection.get(include=["metadatas"])["metadatas"][0]
+        assert FINGERPRINT_KEY in meta
+
+
+def test_sync_without_prune_keeps_missing_rows(temp_chroma_dir, catalog_df):
+    with patch.object(PartEmbedder, "get_embeddings", staticmethod(CountingEmbeddings())):
+        embedder = PartEmbedder(chroma_dir=temp_chroma_dir, collection_name="no_prune_test")
+        embedder.sync_dataframe(catalog_df)
+        summary = embedder.sync_dataframe(catalog_df.iloc[:1], prune=False)
+        assert summary["deleted"] == 0
+        assert embedder.collection.count() == 3
@@ -0,0 +1,226 @@
+import pytest
+import json
+import logging
+import os
+import shutil
+import tempfile
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+from src import quoting, tracing
+from src.embed_parts import PartEmbedder
+from src.batching import embed_in_batches
+
+REPLY = json.dumps({
+    "Base Material": 20, "Size Adjustment": 10, "Operations Fee": 20, "Finish Fee": 10,
+    "Total Quote": 60, "Explanation": "Same part."
+})
+PART = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+        "Finish": "Anodized", "Part Description": "Aluminum bracket"}
+REFERENCE_META = {"Material": "Aluminum", "Size": "100x50x5", "Operations": "Drilling",
+                  "Finish": "Anodized", "Target Price (CHF)": 60}
+
+
+@pytest.fixture(autouse=True)
+def clean_tracing():
+    tracing.reset()
+    yield
+    tracing.reset()
+
+
+@pytest.fixture
+def temp_dir():
+    d = tempfile.mkdtemp()
+    yield d
+    shutil.rmtree(d, ignore_errors=True)
+
+
+class FakeChatClient:
+    """
+    Streams REPLY, then a usage chunk like the real API.
+    """
+    def __init__(self, with_usage=True):
+        self.with_usage = with_usage
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=REPLY))], usage=None)]
+        if self.with_usage:
+            usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=100,
+                                    prompt_tokens_details=SimpleNamespace(cached_tokens=400))
+            chunks.append(SimpleNamespace(choices=[], usage=usage))
+        return iter(chunks)
+
+
+def names(trace):
+    return [row["Stage"].strip() for row in tracing.span_rows(trace)]
+
+
+def test_nested_spans_form_one_trace():
+    with tracing.span("request", user="a") as root:
+        with tracing.span("stage.one"):
+            tracing.add("items", 2)
+        with tracing.span("stage.two"):
+            tracing.add("items", 3)
+            with tracing.span("stage.two.inner"):
+                pass
+    trace = tracing.last_trace()
+    assert trace["trace_id"] == root.trace_id
+    assert names(trace) == ["request", "stage.one", "stage.two", "stage.two.inner"]
+    assert trace["attributes"] == {"user": "a"}
+    assert trace["totals"] == {"items": 5}
+    assert trace["duration_ms"] >= trace["children"][1]["duration_ms"]
+    assert tracing.current_span() is None
+
+
+def test_errors_are_recorded_and_raised():
+    with pytest.raises(KeyError):
+        with tracing.span("request"):
+            with tracing.span("stage"):
+                raise KeyError("missing")
+    trace = tracing.last_trace("request")
+    assert trace["children"][0]["error"] == "KeyError: 'missing'"
+
+
+def test_failed_explanation_is_recorded_not_printed(capsys):
+    def fail(*args, **kwargs):
+        raise ValueError("no explanation")
+
+    with patch("src.quoting.request_explanation", fail):
+        with tracing.span("request"):
+            breakdown, _ = quoting.quote_part(PART, "Aluminum bracket", REFERENCE_META, explain=True)
+    assert breakdown["Total Quote"] > 0
+    assert tracing.last_trace("request")["error"] == "ValueError: no explanation"
+    assert capsys.readouterr().out == ""
+
+
+def test_children_beyond_the_limit_are_counted(monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_CHILDREN", 3)
+    with tracing.span("request"):
+        for _ in range(5):
+            with tracing.span("batch"):
+                tracing.add("rows", 1)
+    trace = tracing.last_trace()
+    assert len(trace["children"]) == 3
+    assert trace["dropped_children"] == 2
+
+
+def test_cost_estimate():
+    assert tracing.estimate_cost("gpt-4o", 1_000_000, 0) == pytest.approx(2.50)
+    assert tracing.estimate_cost("gpt-4o", 1_000_000, 1_000_000, cached_tokens=1_000_000) == \
+        pytest.approx(1.25 + 10.0)
+    assert tracing.estimate_cost("unknown-model", 1000, 1000) == 0.0
+
+
+def test_completion_usage_and_cost_are_counted():
+    with patch.object(quoting, "get_openai_client", lambda: FakeChatClient()):
+        with tracing.span("quote"):
+            breakdown, _ = quoting.quote_part(PART, "Aluminum bracket", REFERENCE_META, engine="llm")
+    assert breakdown == json.loads(REPLY)
+    trace = tracing.last_trace("quote")
+    assert names(trace) == ["quote", "quote.features", "quote.prompt", "llm.completion",
+                            "llm.clean_output", "quote.parse"]
+    totals = trace["totals"]
+    assert totals["api_calls"] == 1
+    assert totals["tokens_in"] == 1000 and totals["tokens_out"] == 100 and totals["cached_tokens"] == 400
+    assert totals["cost_usd"] == pytest.approx(tracing.estimate_cost("gpt-4o", 1000, 100, 400))
+    assert totals["cost_chf"] == pytest.approx(totals["cost_usd"] * tracing.USD_TO_CHF)
+
+
+def test_tokens_are_estimated_without_usage_chunk():
+    with patch.object(quoting, "get_openai_client", lambda: FakeChatClient(with_usage=False)):
+        with tracing.span("quote"):
+            quoting.request_completion("Quote this part", system="Rules")
+    totals = tracing.last_trace()["totals"]
+    assert totals["api_calls"] == 1
+    assert totals["tokens_in"] > 0 and totals["tokens_out"] > 0
+
+
+def test_worker_threads_report_to_the_caller_span():
+    with tracing.span("index"):
+        embed_in_batches(
+            [f"text {i}" for i in range(10)],
+            lambda batch: tracing.add("embedded", len(batch)) or [[0.0]] * len(batch),
+            lambda indices, embeddings: None,
+            max_items=3,
+        )
+    assert tracing.last_trace()["totals"] == {"embedded": 10}
+
+
+def test_batch_quotes_are_traced_per_part(temp_dir):
+    embedder = PartEmbedder(chroma_dir=temp_dir, collection_name="trace_test",
+                            backend="hashing", index_backend="numpy")
+    embedder.process_dataframe(pd.DataFrame([dict(PART, **{"Target Price (CHF)": 60})]))
+    assert names(tracing.last_trace()) == ["index.dataframe", "index.prepare",
+                                           "index.embed_and_upsert", "index.upsert"]
+
+    bom = pd.DataFrame([PART, dict(PART, **{"Part Description": "Second bracket"})])
+    with tracing.span("batch_quote"):
+        results = [row for _, row in quoting.quote_parts(embedder, bom)]
+    assert all(row["Total Quote"] == 60 for row in results)
+    trace = tracing.last_trace("batch_quote")
+    assert [child["name"] for child in trace["children"]] == ["quote.retrieval", "quote.part", "quote.part"]
+    retrieval = trace["children"][0]
+    assert [child["name"] for child in retrieval["children"]] == ["query.embedding", "query.index"]
+    assert [child["name"] for child in trace["children"][1]["children"]] == ["quote.features", "quote.rules"]
+
+
+def test_jsonl_and_log_exporters(temp_dir, caplog):
+    path = os.path.join(temp_dir, "traces", "traces.jsonl")
+    tracing.configure([tracing.JSONLExporter(path), tracing.LogExporter()])
+    with caplog.at_level(logging.INFO, logger="quoting_assistant.trace"):
+        for _ in range(2):
+            with tracing.span("quote"):
+                with tracing.span("quote.rules"):
+                    tracing.add("api_calls")
+    with open(path, encoding="utf-8") as f:
+        traces = [json.loads(line) for line in f]
+    assert len(traces) == 2
+    assert traces[0]["children"][0]["name"] == "quote.rules"
+    assert traces[0]["trace_id"] != traces[1]["trace_id"]
+    assert "quote.rules" in caplog.records[0].getMessage()
+    assert "api_calls=1" in caplog.records[0].getMessage()
+
+
+def test_failing_exporter_does_not_break_requests():
+    class Broken:
+        def export(self, trace):
+            raise OSError("disk full")
+
+    tracing.configure([Broken()])
+    with tracing.span("quote"):
+        pass
+    assert tracing.last_trace()["name"] == "quote"
+
+
+def test_configure_from_env(temp_dir, monkeypatch):
+    path = os.path.join(temp_dir, "t.jsonl")
+    monkeypatch.setenv("TRACE_EXPORTER", "log, jsonl")
+    monkeypatch.setenv("TRACE_FILE", path)
+    exporters = tracing.configure_from_env()
+    assert [type(e) for e in exporters] == [tracing.LogExporter, tracing.JSONLExporter]
+    assert exporters[1].path == path
+    monkeypatch.setenv("TRACE_EXPORTER", "nope")
+    assert tracing.configure_from_env() == exporters
+    with pytest.raises(ValueError):
+        tracing.configure_from_env(force=True)
+
+
+def test_opentelemetry_exporter():
+    sdk = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    memory = InMemorySpanExporter()
+    provider = sdk.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(memory))
+    tracing.configure([tracing.OpenTelemetryExporter(tracer_provider=provider)])
+    with tracing.span("quote", engine="rules"):
+        with tracing.span("quote.rules"):
+            tracing.add("api_calls")
+    spans = {s.name: s for s in memory.get_finished_spans()}
+    assert set(spans) == {"quote", "quote.rules"}
+    assert spans["quote.rules"].parent.span_id == spans["quote"].context.span_id
+    assert spans["quote"].attributes["engine"] == "rules"
+    assert spans["quote.rules"].attributes["api_calls"] == 1
+    assert spans["quote"].end_time >= spans["quote.rules"].end_time